@@ -1,7 +1,19 @@
 from django.contrib import admin
 from django.contrib.admin import display
 
-from .models import Game, Round, League, GameRule, Standing, GameResult, LeagueEvent, RoundResult
+from .models import (
+    Game,
+    Round,
+    League,
+    GameRule,
+    Standing,
+    GameResult,
+    LeagueEvent,
+    RoundResult,
+    LeagueSummary,
+    IdempotencyKey,
+    StandingSnapshot,
+)
 
 
 @admin.register(Game)
@@ -31,7 +43,7 @@ class GameRuleAdmin(admin.ModelAdmin):
 @admin.register(League)
 class LeagueAdmin(admin.ModelAdmin):
     list_display_links = ("id", "label")
-    list_display = ("id", "label", "name", "rule", "owner", "start_dt", "end_dt", "created", "updated")
+    list_display = ("id", "label", "name", "rule", "owner", "rank_mode", "start_dt", "end_dt", "created", "updated")
     list_select_related = ["owner"]
 
 
@@ -66,3 +78,22 @@ class RoundResult(admin.ModelAdmin):
 class Standing(admin.ModelAdmin):
     list_display = ("id", "league", "rank", "player", "score", "mvp_count", "created", "updated")
     list_select_related = ("league", "player")
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ("id", "key", "player", "origin", "status_code", "created")
+    date_hierarchy = "created"
+
+
+@admin.register(StandingSnapshot)
+class StandingSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("id", "league", "round", "updated")
+    list_select_related = ("league", "round__league")
+    exclude = ("player_ids", "ranks", "scores")
+
+
+@admin.register(LeagueSummary)
+class LeagueSummaryAdmin(admin.ModelAdmin):
+    list_display = ("league", "updated")
+    list_select_related = ("league",)
@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class RankieConfig(AppConfig):
     name = "apps.rankie"
+
+    def ready(self):
+        from . import routers, slow_queries
+
+        connection_created.connect(slow_queries.install, dispatch_uid="rankie_slow_queries")
+        connection_created.connect(routers.install, dispatch_uid="rankie_replica_writes")
@@ -0,0 +1,118 @@
+"""Consistency checks of the denormalized league state against a from-scratch recomputation.
+
+Round results are the source of truth: round statistics and mvp, standing scores, mvp counts and ranks maintained by
+`register_game_result` must agree with what is computed from them. Checks return human-readable violations, an empty
+list means the league is consistent.
+"""
+import math
+
+from collections import defaultdict
+
+from django.db.models import F
+
+from .models import Round, League, Standing, RoundResult
+from .scorers import get_scorer
+
+
+def is_close(a, b):
+    # Standing scores are aggregated in a different order on registration, float sums may differ in the last digits
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def check_rounds(league: League, results: dict) -> list[str]:
+    """Round statistics must match the round results, mvp must be a player with the best score."""
+
+    violations = []
+    for round_ in Round.objects.filter(league=league).order_by("label"):
+        scores = {player_id: score for player_id, score in results.get(round_.pk, [])}
+        expected = Round(league=league, label=round_.label)
+        expected.set_score_stats(scores.values())
+        for field in ("result_count", "mvp_score", "avg_score", "median_score"):
+            if not is_close(getattr(round_, field), getattr(expected, field)):
+                violations.append(
+                    f"round {round_.label}: {field} {getattr(round_, field)} != {getattr(expected, field)}"
+                )
+        if scores and scores.get(round_.mvp_id) != max(scores.values()):
+            violations.append(f"round {round_.label}: mvp {round_.mvp_id} hasn't got the best score")
+        if not scores and round_.mvp_id is not None:
+            violations.append(f"round {round_.label}: mvp {round_.mvp_id} without results")
+    return violations
+
+
+def get_rank_key(standing: Standing) -> tuple:
+    return -standing.score, -standing.mvp_count, standing.created
+
+
+def check_standings(league: League, results: dict) -> list[str]:
+    """Scores and mvp counts must match the round results, ranks must be 1..n in the standings tie-break order."""
+
+    scorer = get_scorer(league)
+    player_results = defaultdict(list)
+    # Rounds are ordered by label, the way registration aggregates them
+    for _, round_results in sorted(results.items(), key=lambda item: item[0][1]):
+        for player_id, score in round_results:
+            player_results[player_id].append(RoundResult(score=score))
+    mvp_counts = defaultdict(int)
+    for mvp_id in Round.objects.filter(league=league, mvp__isnull=False).values_list("mvp_id", flat=True):
+        mvp_counts[mvp_id] += 1
+
+    violations = []
+    standings = list(
+        Standing.objects.filter(league=league).order_by(F("score").desc(nulls_last=True), "-mvp_count", "created")
+    )
+    for standing in standings:
+        player_id = standing.player_id
+        expected_score = scorer.get_standing_score(player_results[player_id]) if player_results[player_id] else None
+        if not is_close(standing.score, expected_score):
+            violations.append(f"player {player_id}: score {standing.score} != {expected_score}")
+        if standing.mvp_count != mvp_counts[player_id]:
+            violations.append(f"player {player_id}: mvp_count {standing.mvp_count} != {mvp_counts[player_id]}")
+        if standing.score is None and standing.rank is not None:
+            violations.append(f"player {player_id}: rank {standing.rank} without score")
+
+    # Ranks follow the order standings are fetched in for registration, ties of score are broken by mvp count and then
+    # by the earlier joined player
+    ranked = [standing for standing in standings if standing.score is not None]
+    if league.rank_mode == League.RANK_MODE.DERIVED:
+        # Derived ranks are computed in this very order, they're never stored
+        for standing in ranked:
+            if standing.rank is not None:
+                violations.append(f"player {standing.player_id}: stored rank {standing.rank} of derived ranks")
+        return violations
+    ranks = [standing.rank for standing in ranked]
+    if sorted(ranks, key=lambda rank: (rank is None, rank)) != list(range(1, len(ranked) + 1)):
+        violations.append(f"ranks {sorted(ranks, key=lambda rank: (rank is None, rank))} aren't 1..{len(ranked)}")
+    else:
+        by_rank = sorted(ranked, key=lambda standing: standing.rank)
+        for higher, lower in zip(by_rank, by_rank[1:]):
+            if get_rank_key(higher) > get_rank_key(lower):
+                violations.append(
+                    f"rank {higher.rank} (score {higher.score}, mvps {higher.mvp_count}, joined {higher.created}) "
+                    f"is behind rank {lower.rank} (score {lower.score}, mvps {lower.mvp_count}, "
+                    f"joined {lower.created})"
+                )
+    return violations
+
+
+def check_league(league: League) -> list[str]:
+    # {(round id, round label): [(player id, score)]}
+    results = defaultdict(list)
+    for round_id, round_label, player_id, score in (
+        RoundResult.objects.filter(round__league=league)
+        .order_by("created", "pk")
+        .values_list("round_id", "round__label", "player_id", "score")
+    ):
+        results[(round_id, round_label)].append((player_id, score))
+    rounds_results = {round_id: round_results for (round_id, _), round_results in results.items()}
+    return [f"league {league.label}: {violation}" for violation in check_rounds(league, rounds_results)] + [
+        f"league {league.label}: {violation}" for violation in check_standings(league, results)
+    ]
+
+
+def check_leagues(leagues=None) -> list[str]:
+    """Check the given leagues, all of them by default."""
+
+    leagues = League.objects.select_related("rule__game").order_by("pk") if leagues is None else leagues
+    return [violation for league in leagues for violation in check_league(league)]
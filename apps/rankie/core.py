@@ -1,70 +1,291 @@
+import time
+import array
 import logging
 
+from typing import Iterable
+from collections import defaultdict
+
 from django.db import transaction
 from django.utils import timezone
 from django.db.models import F, Q, Prefetch, QuerySet
 from django.contrib.auth import get_user_model
 
-from .models import Game, Round, League, Standing, GameResult, LeagueEvent, RoundResult
+from .models import Game, Round, League, Standing, GameResult, LeagueEvent, RoundResult, LeagueSummary, StandingSnapshot
+from .timing import Spans
+from .metrics import REGISTRATION_ROWS, REGISTRATION_LATENCY
 from .scorers import get_scorer
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
-def get_league_queryset_for_standings_update(player: User, game: Game) -> QuerySet[League]:
-    """Get active leagues for given user and game;
+class ResultRow:
+    """Round result as registration reads it: player id and score only."""
+
+    __slots__ = ("player_id", "score")
+
+    def __init__(self, player_id, score):
+        self.player_id = player_id
+        self.score = score
+
+
+class StandingRow:
+    """Standing as registration reads and updates it, turned into a `Standing` only when it's written."""
+
+    FIELDS = ("pk", "league_id", "player_id", "rank", "score", "mvp_count", "created")
+    __slots__ = FIELDS
+
+    def __init__(self, pk, league_id, player_id, rank, score, mvp_count, created):
+        self.pk = pk
+        self.league_id = league_id
+        self.player_id = player_id
+        self.rank = rank
+        self.score = score
+        self.mvp_count = mvp_count
+        self.created = created
+
+    def to_standing(self) -> Standing:
+        return Standing(
+            pk=self.pk,
+            league_id=self.league_id,
+            player_id=self.player_id,
+            rank=self.rank,
+            score=self.score,
+            mvp_count=self.mvp_count,
+            created=self.created,
+            updated=timezone.now(),
+        )
+
 
-    This method mainly used for registering player's results. We fetch all the necessary related objects at once to
-    minimize the number of database interactions/queries. All sort operations here are important.
+def get_league_queryset_for_standings_update(player: User, game: Game, league_ids=None) -> QuerySet[League]:
+    """Get active leagues for given user and game, optionally only the given ones, with their rounds locked.
+
+    This method mainly used for registering player's results, round results and standings are fetched as compact rows
+    by `fetch_round_results` and `fetch_standings` once the current rounds are known. All sort operations are important.
     """
 
-    return (
-        player.leagues.active()
-        .filter(rule__game=game)
-        .select_related("rule")
-        .prefetch_related(
-            Prefetch(
-                "rounds",
-                Round.objects.order_by("label")
-                .select_for_update()
-                .prefetch_related(
-                    Prefetch(
-                        "round_results",
-                        RoundResult.objects.order_by(F("score").desc(nulls_last=True), "created"),
-                        to_attr="fetched_round_results",
-                    )
-                ),
-                to_attr="fetched_rounds",
-            ),
-            Prefetch(
-                "standings",
-                Standing.objects.filter(Q(player=player) | Q(score__isnull=False))
-                .order_by(F("score").desc(nulls_last=True), "-mvp_count", "created")
-                .select_related("player")
-                .select_for_update(no_key=True),
-                to_attr="fetched_standings",
-            ),
+    leagues = player.leagues.active().filter(rule__game=game)
+    if league_ids is not None:
+        leagues = leagues.filter(pk__in=league_ids)
+    return leagues.select_related("rule__game").prefetch_related(
+        Prefetch("rounds", Round.objects.order_by("label").select_for_update(), to_attr="fetched_rounds"),
+    )
+
+
+def fetch_round_results(player: User, league_ids, round_ids) -> dict[int, list[ResultRow]]:
+    """Return {round id: result rows ordered by score} of the given rounds and the player's results in the leagues.
+
+    Other players' results are only needed in the rounds the result is registered in, the rest of the league history
+    isn't read.
+    """
+
+    results = defaultdict(list)
+    for round_id, player_id, score in (
+        RoundResult.objects.filter(Q(round__in=round_ids) | Q(round__league__in=league_ids, player=player))
+        .order_by(F("score").desc(nulls_last=True), "created")
+        .values_list("round_id", "player_id", "score")
+    ):
+        results[round_id].append(ResultRow(player_id, score))
+    return results
+
+
+def fetch_standings(player: User, leagues: list[League]) -> dict[int, list[StandingRow]]:
+    """Return {league id: standing rows in the rank order}, scored ones and the player's.
+
+    Player's standings are locked for update, so are the others of leagues storing ranks, since they're rewritten.
+    Leagues deriving ranks read the others without a lock, the old mvp's is locked once it's known to change.
+    """
+
+    # Leagues shifting ranks with an UPDATE don't need the other standings
+    stored_league_ids = [league.pk for league in leagues if league.rank_mode == League.RANK_MODE.STORED]
+    derived_league_ids = [league.pk for league in leagues if league.rank_mode == League.RANK_MODE.DERIVED]
+    standings = defaultdict(list)
+    for values in (
+        Standing.objects.filter(
+            Q(player=player, league__in=[league.pk for league in leagues])
+            | Q(score__isnull=False, league__in=stored_league_ids)
         )
+        .order_by("league_id", *Standing.RANK_ORDERING)
+        .select_for_update(no_key=True)
+        .values_list(*StandingRow.FIELDS)
+    ):
+        standings[values[1]].append(StandingRow(*values))
+    if derived_league_ids:
+        for values in (
+            Standing.objects.filter(score__isnull=False, league__in=derived_league_ids)
+            .exclude(player=player)
+            .values_list(*StandingRow.FIELDS)
+        ):
+            standings[values[1]].append(StandingRow(*values))
+        for league_id in derived_league_ids:
+            standings[league_id].sort(key=get_rank_key)
+    return standings
+
+
+def get_rank_key(standing: StandingRow) -> tuple:
+    """Sort key of `Standing.RANK_ORDERING`, unscored standings go last."""
+
+    return standing.score is None, -(standing.score or 0), -standing.mvp_count, standing.created
+
+
+def shift_rank(standing: StandingRow, prev_rank: int | None) -> tuple[int, int]:
+    """Save the standing at the rank of its new score and mvp count, shifting the ranks in between by one.
+
+    The rank is found with a count of the standings ahead and the others are moved with a single range UPDATE, the
+    league must be locked. Returns the new rank and the number of shifted standings.
+    """
+
+    others = Standing.objects.filter(league_id=standing.league_id).exclude(pk=standing.pk)
+    rank = others.ahead_of(standing).count() + 1
+    if prev_rank is None:
+        shifted = others.filter(rank__gte=rank).update(rank=F("rank") + 1)
+    elif rank < prev_rank:
+        shifted = others.filter(rank__gte=rank, rank__lt=prev_rank).update(rank=F("rank") + 1)
+    elif rank > prev_rank:
+        shifted = others.filter(rank__gt=prev_rank, rank__lte=rank).update(rank=F("rank") - 1)
+    else:
+        shifted = 0
+    standing.rank = rank
+    Standing.objects.filter(pk=standing.pk).update(
+        rank=rank, score=standing.score, mvp_count=standing.mvp_count, updated=timezone.now()
     )
+    return rank, shifted
+
 
+def build_shifted_snapshot(league: League, round_: Round, rank_changes) -> StandingSnapshot:
+    """Build snapshot of a league shifting ranks from its latest snapshot and the changed range of ranks only.
+
+    Registration moves standings from their old to new ranks (`rank_changes`, old one is None for a player ranked for
+    the first time) and shifts the ones in between by one. Standings ahead of the range are kept, the ones behind it
+    move a rank lower per newly ranked player. The whole league is read if there's no snapshot yet or a player has left
+    the league since.
+    """
 
-def register_game_result(game_result: GameResult):
-    """Create round/round_result and update corresponding standings for every active league the player competes in."""
+    ranks = [rank for change in rank_changes for rank in change if rank is not None]
+    low, high = min(ranks), max(ranks)
+    inserted = sum(1 for prev_rank, _ in rank_changes if prev_rank is None)
+    latest = StandingSnapshot.objects.filter(league=league).order_by("-updated", "-pk").first()
+    if (
+        latest is None
+        or league.events.filter(ev_type=LeagueEvent.EV_TYPE.PLAYER_LEFT, created__gte=latest.updated).exists()
+    ):
+        rows = Standing.objects.filter(league=league, rank__isnull=False).order_by("rank")
+        return StandingSnapshot.from_rows(league, round_, rows.values_list("player_id", "rank", "score").iterator())
+
+    player_ids = latest.unpack(StandingSnapshot.PLAYER_IDS_TYPE, latest.player_ids)
+    scores = latest.unpack(StandingSnapshot.SCORES_TYPE, latest.scores)
+    changed = Standing.objects.filter(league=league, rank__gte=low, rank__lte=high).order_by("rank")
+    changed_ids, changed_scores = zip(*changed.values_list("player_id", "score"))
+    player_ids[low - 1 : high - inserted] = array.array(StandingSnapshot.PLAYER_IDS_TYPE, changed_ids)
+    scores[low - 1 : high - inserted] = array.array(StandingSnapshot.SCORES_TYPE, changed_scores)
+    return StandingSnapshot.from_rows(league, round_, zip(player_ids, range(1, len(player_ids) + 1), scores))
+
+
+def build_snapshots_since(league: League, scorer, since_label: str) -> list[StandingSnapshot]:
+    """Replay results of the league round by round, return snapshots of the round `since_label` and the later ones.
+
+    Standings as of an older round can't be told from the current ones, a late result changes snapshots of its round and
+    every round after it. Players who left the league are skipped, as they're missing from the current standings too.
+    """
+
+    created = dict(Standing.objects.filter(league=league).values_list("player_id", "created"))
+    round_results = defaultdict(list)
+    for round_id, player_id, score in RoundResult.objects.filter(round__league=league).values_list(
+        "round_id", "player_id", "score"
+    ):
+        if player_id in created:
+            round_results[round_id].append(ResultRow(player_id, score))
+
+    player_results = defaultdict(list)
+    mvp_counts = defaultdict(int)
+    snapshots = []
+    rounds = sorted(
+        Round.objects.filter(league=league).values_list("pk", "label", "mvp_id"),
+        key=lambda row: Round.get_label_key(row[1]),
+    )
+    since_key = Round.get_label_key(since_label)
+    for round_id, label, mvp_id in rounds:
+        for result in round_results[round_id]:
+            player_results[result.player_id].append(result)
+        if mvp_id in created:
+            mvp_counts[mvp_id] += 1
+        if Round.get_label_key(label) < since_key:
+            continue
+        scores = {player_id: scorer.get_standing_score(results) for player_id, results in player_results.items()}
+        ranked = sorted(scores, key=lambda player_id: (-scores[player_id], -mvp_counts[player_id], created[player_id]))
+        snapshots.append(
+            StandingSnapshot.from_rows(
+                league,
+                Round(pk=round_id, league=league),
+                [(player_id, rank, scores[player_id]) for rank, player_id in enumerate(ranked, 1)],
+            )
+        )
+    return snapshots
+
+
+def register_game_result(game_result: GameResult, league_ids=None) -> list[dict]:
+    """Create round/round_result and update corresponding standings for every active league the player competes in.
+
+    Registration can be limited to some of the leagues with `league_ids` (see `apps.rankie.workers`). Returns a summary
+    for every league the result was registered in: new score, rank and whether the player became round MVP or league
+    leader. Phases are timed and logged by `apps.rankie.timing` logger.
+    """
 
     player = game_result.player
     game = game_result.game
-    active_leagues = get_league_queryset_for_standings_update(player, game)
+    active_leagues = get_league_queryset_for_standings_update(player, game, league_ids)
+    spans = Spans("register_game_result", game_result=game_result.pk)
+    started = time.perf_counter()
 
     standings_to_update = []
     rounds_to_update = []
     round_results_to_create = []
     events_to_create = []
+    snapshots_to_create = []
+    late_registrations = []
+    registrations = []
+    registered_leagues = []
+    # Leagues of the same rule parse and score the result the same way, it's done once per rule
+    parsed_by_rule = {}
 
     with transaction.atomic():
+        with spans.span("fetch"):
+            active_leagues = list(active_leagues)
+        spans.tag(leagues=len(active_leagues))
+
+        # Round label is needed to know which round results to fetch
+        curr_round_ids = []
+        for league in active_leagues:
+            with spans.span("parse_score", f"league.{league.pk}"):
+                if league.rule_id not in parsed_by_rule:
+                    scorer = get_scorer(league)
+                    parsed_by_rule[league.rule_id] = {
+                        "scorer": scorer,
+                        "round_label": scorer.get_round_label(game_result),
+                    }
+            curr_round_label = parsed_by_rule[league.rule_id]["round_label"]
+            curr_round_ids.extend(
+                fetched_round.pk for fetched_round in league.fetched_rounds if fetched_round.label == curr_round_label
+            )
+
+        with spans.span("fetch"):
+            # Ranks of the whole league are shifted, concurrent registrations and leaves wait for this one. League is
+            # locked before its standings, the way leaving does it.
+            shifted_league_ids = [
+                league.pk for league in active_leagues if league.rank_mode == League.RANK_MODE.SHIFTED
+            ]
+            if shifted_league_ids:
+                list(League.objects.select_for_update().filter(pk__in=shifted_league_ids).order_by("pk").values("pk"))
+            round_results = fetch_round_results(player, [league.pk for league in active_leagues], curr_round_ids)
+            standings = fetch_standings(player, active_leagues)
+
         for league in active_leagues:
-            scorer = get_scorer(league)
-            curr_round_label = scorer.get_round_label(game_result)
+            league.fetched_standings = standings[league.pk]
+            scope = f"league.{league.pk}"
+            spans.tag(scope, players=len(league.fetched_standings), rounds=len(league.fetched_rounds))
+            parsed = parsed_by_rule[league.rule_id]
+            scorer = parsed["scorer"]
+            curr_round_label = parsed["round_label"]
 
             # Find/create corresponding Round and RoundResult
             curr_round = None
@@ -77,8 +298,8 @@ def register_game_result(game_result: GameResult):
                 if fetched_round.label == curr_round_label:
                     curr_round = fetched_round
 
-                for fetched_result in fetched_round.fetched_round_results:
-                    if fetched_result.player == player:
+                for fetched_result in round_results.get(fetched_round.pk, ()):
+                    if fetched_result.player_id == player.pk:
                         if curr_round == fetched_round:
                             curr_round_result = fetched_result
                         else:
@@ -86,11 +307,15 @@ def register_game_result(game_result: GameResult):
                     elif curr_round == fetched_round:
                         curr_round_other_results.append(fetched_result)
 
-            if curr_round is None:
+            round_is_new = curr_round is None
+            if round_is_new:
                 curr_round = Round(league=league, label=curr_round_label, mvp=player)
 
             if curr_round_result is None:
-                curr_score = scorer.get_round_score(game_result)
+                with spans.span("parse_score", scope):
+                    if "score" not in parsed:
+                        parsed["score"] = scorer.get_round_score(game_result)
+                    curr_score = parsed["score"]
                 curr_round_result = RoundResult(round=curr_round, player=player, score=curr_score, raw=game_result)
                 round_results_to_create.append(curr_round_result)
                 events_to_create.append(
@@ -105,72 +330,204 @@ def register_game_result(game_result: GameResult):
                 # This league is updated
                 continue
 
+            curr_round.set_score_stats(
+                [result.score for result in curr_round_other_results] + [curr_round_result.score]
+            )
+
             # Mvp condition
             # Current round other results must be sorted in queryset
             mvp_needs_change = (
-                player != curr_round.mvp
+                curr_round.mvp_id != player.pk
                 and len(curr_round_other_results) > 0
                 and curr_round_result.score > curr_round_other_results[0].score
             )
 
             # Change standings
             # Assume standings are sorted and filtered in queryset (all have scores or from current player)
-            curr_rank = 1
-            prev_rank = len(league.fetched_standings)
-            curr_standing_score = scorer.get_standing_score(other_rounds_results + [curr_round_result])
-
-            for rank, standing in enumerate(league.fetched_standings, 1):
-                need_update = False
-
-                if standing.player == player:
-                    need_update = True
-                    if standing.rank:
-                        prev_rank = rank
-                    # Assume other_rounds_results are sorted by round label in queryset
-                    standing.score = curr_standing_score
-                    standing.rank = curr_rank
-                    if mvp_needs_change or curr_round.pk is None:
-                        standing.mvp_count += 1
-                        curr_round.save()
-                        events_to_create.append(
-                            LeagueEvent(
-                                league=league,
-                                ev_type=LeagueEvent.EV_TYPE.NEW_MVP,
-                                context={"username": player.username, "round_label": curr_round_label},
-                            )
+            with spans.span("parse_score", scope):
+                curr_standing_score = scorer.get_standing_score(other_rounds_results + [curr_round_result])
+            registration = {
+                "league": league.label,
+                "round": curr_round_label,
+                "score": curr_round_result.score,
+                "standing_score": curr_standing_score,
+                "rank": None,
+                "prev_rank": None,
+                "mvp": False,
+                "new_leader": False,
+            }
+
+            with spans.span("rank_shift", scope):
+                derived = league.rank_mode == League.RANK_MODE.DERIVED
+                shifted = league.rank_mode == League.RANK_MODE.SHIFTED
+                if (shifted or derived) and mvp_needs_change:
+                    # Old mvp's standing wasn't locked when fetched (if at all) and might have left the league since
+                    old_mvp = (
+                        Standing.objects.select_for_update(no_key=True)
+                        .values_list(*StandingRow.FIELDS)
+                        .filter(league=league, player=curr_round.mvp_id)
+                        .first()
+                    )
+                    league.fetched_standings = [
+                        standing for standing in league.fetched_standings if standing.player_id != curr_round.mvp_id
+                    ]
+                    if old_mvp is not None:
+                        league.fetched_standings.append(StandingRow(*old_mvp))
+                        if derived:
+                            league.fetched_standings.sort(key=get_rank_key)
+                # Fetched standings are still in the order of the previous ranks
+                ranks = None
+                if derived:
+                    ranks = {
+                        standing.pk: rank
+                        for rank, standing in enumerate(
+                            (standing for standing in league.fetched_standings if standing.score is not None), 1
                         )
-                    if curr_rank == 1 and prev_rank != 1:
-                        events_to_create.append(
-                            LeagueEvent(
-                                league=league,
-                                ev_type=LeagueEvent.EV_TYPE.NEW_LEADER,
-                                context={"username": player.username},
+                    }
+                changed_standings = []
+                for standing in league.fetched_standings:
+                    if standing.player_id == player.pk:
+                        registration["prev_rank"] = ranks.get(standing.pk) if derived else standing.rank
+                        # Assume other_rounds_results are sorted by round label in queryset
+                        standing.score = curr_standing_score
+                        if mvp_needs_change or curr_round.pk is None:
+                            registration["mvp"] = True
+                            standing.mvp_count += 1
+                            curr_round.save()
+                            events_to_create.append(
+                                LeagueEvent(
+                                    league=league,
+                                    ev_type=LeagueEvent.EV_TYPE.NEW_MVP,
+                                    context={"username": player.username, "round_label": curr_round_label},
+                                )
                             )
-                        )
+                        changed_standings.append(standing)
+
+                    # Old mvp standing
+                    elif mvp_needs_change and standing.player_id == curr_round.mvp_id:
+                        standing.mvp_count -= 1
+                        changed_standings.append(standing)
 
-                elif curr_standing_score > standing.score and (curr_rank <= standing.rank < prev_rank):
-                    standing.rank += 1
-                    need_update = True
+                if shifted:
+                    # Player is moved first, the old mvp's rank might have been shifted by that. Old and new ranks are
+                    # kept for the snapshot.
+                    others_ranked = False
+                    rank_changes = []
+                    for standing in changed_standings:
+                        if standing.player_id == player.pk:
+                            prev_rank = standing.rank
+                            registration["rank"], count = shift_rank(standing, prev_rank)
+                            others_ranked = bool(count)
+                        else:
+                            prev_rank = Standing.objects.values_list("rank", flat=True).get(pk=standing.pk)
+                            shift_rank(standing, prev_rank)
+                        rank_changes.append((prev_rank, standing.rank))
                 else:
-                    curr_rank += 1
+                    # Both score and mvp counts might have changed, so ranks are reassigned in the tie-break order
+                    ranked_standings = sorted(
+                        (standing for standing in league.fetched_standings if standing.score is not None),
+                        key=get_rank_key,
+                    )
+                    others_ranked = len(ranked_standings) > 1
+                    if derived:
+                        ranks = {standing.pk: rank for rank, standing in enumerate(ranked_standings, 1)}
+                    for rank, standing in enumerate(ranked_standings, 1):
+                        # Derived ranks aren't stored, other players' standings are left intact
+                        if not derived and standing.rank != rank:
+                            standing.rank = rank
+                            changed_standings.append(standing)
+                        if standing.player_id == player.pk:
+                            registration["rank"] = rank
 
-                # Old mvp standing
-                if mvp_needs_change and standing.player == curr_round.mvp:
-                    standing.mvp_count -= 1
-                    need_update = True
+                    for standing in {standing.pk: standing for standing in changed_standings}.values():
+                        standings_to_update.append(standing.to_standing())
 
-                if need_update:
-                    standing.updated = timezone.now()
-                    standings_to_update.append(standing)
+                # Unranked player is counted as the last one, the only player of a league isn't a new leader
+                if registration["rank"] == 1 and registration["prev_rank"] != 1 and others_ranked:
+                    registration["new_leader"] = True
+                    events_to_create.append(
+                        LeagueEvent(
+                            league=league,
+                            ev_type=LeagueEvent.EV_TYPE.NEW_LEADER,
+                            context={"username": player.username},
+                        )
+                    )
 
-            # Updating mvp
+            # Updating mvp and round statistics, new round is already saved within standings loop
             if mvp_needs_change:
                 curr_round.mvp = player
                 curr_round.updated = timezone.now()
+            if not round_is_new:
                 rounds_to_update.append(curr_round)
+            curr_round_key = Round.get_label_key(curr_round_label)
+            if any(
+                Round.get_label_key(fetched_round.label) > curr_round_key for fetched_round in league.fetched_rounds
+            ):
+                # Late result of an older round, snapshots since that round are replayed once everything is saved
+                late_registrations.append((league, scorer, curr_round_label))
+            elif shifted:
+                with spans.span("shift_snapshot", scope):
+                    snapshots_to_create.append(build_shifted_snapshot(league, curr_round, rank_changes))
+            else:
+                snapshots_to_create.append(
+                    StandingSnapshot.from_standings(league, curr_round, league.fetched_standings, ranks)
+                )
+            registrations.append(registration)
+            registered_leagues.append(league)
 
         # Perform bulk db operations
-        RoundResult.objects.bulk_create(round_results_to_create)
-        Round.objects.bulk_update(rounds_to_update, ["mvp"])
-        Standing.objects.bulk_update(standings_to_update, ["updated", "mvp_count", "rank", "score"])
-        LeagueEvent.objects.bulk_create(events_to_create)
+        with spans.span("create_round_results"):
+            RoundResult.objects.bulk_create(round_results_to_create)
+        with spans.span("update_rounds"):
+            Round.objects.bulk_update(
+                rounds_to_update, ["mvp", "mvp_score", "avg_score", "median_score", "result_count"]
+            )
+        with spans.span("update_standings"):
+            Standing.objects.bulk_update(standings_to_update, ["updated", "mvp_count", "rank", "score"])
+        with spans.span("create_events"):
+            LeagueEvent.objects.bulk_create(events_to_create)
+        # Snapshots of the touched rounds are replaced with the fresh ones
+        with spans.span("replace_snapshots"):
+            for league, scorer, curr_round_label in late_registrations:
+                snapshots_to_create.extend(build_snapshots_since(league, scorer, curr_round_label))
+            StandingSnapshot.objects.filter(round__in=[snapshot.round_id for snapshot in snapshots_to_create]).delete()
+            StandingSnapshot.objects.bulk_create(snapshots_to_create)
+        with spans.span("rebuild_summaries"):
+            for league in registered_leagues:
+                LeagueSummary.rebuild(league)
+
+    spans.tag(standings_updated=len(standings_to_update), rounds_updated=len(rounds_to_update))
+    spans.emit()
+    REGISTRATION_LATENCY.observe(time.perf_counter() - started)
+    # New rounds are saved one by one within the standings loop
+    for kind, count in (
+        ("round_results", len(round_results_to_create)),
+        ("rounds", len(registrations)),
+        ("standings", len(standings_to_update)),
+        ("events", len(events_to_create)),
+        ("snapshots", len(snapshots_to_create)),
+        ("summaries", len(registered_leagues)),
+    ):
+        if count:
+            REGISTRATION_ROWS.inc(count, kind=kind)
+    return registrations
+
+
+def register_game_results(game_results: Iterable[GameResult]) -> int:
+    """Register game results one by one in the given order within a single transaction.
+
+    Meant for batches (imports, replays), saves a commit per result. Results failed to register are logged and skipped,
+    returns the number of registered ones.
+    """
+
+    count = 0
+    with transaction.atomic():
+        for game_result in game_results:
+            try:
+                with transaction.atomic():
+                    register_game_result(game_result)
+            except Exception:  # noqa
+                logger.exception(f"Failed to register game result {game_result.pk}")
+                continue
+            count += 1
+    return count
@@ -0,0 +1,122 @@
+import csv
+import zlib
+
+from django.db.models import F
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Round, Standing, RoundResult
+
+# Exported kinds: model, league lookup, columns (name -> lookup) and rows ordering
+EXPORTS = {
+    "standings": (
+        Standing,
+        "league_id",
+        {
+            "league": "league__label",
+            "rank": "current_rank",
+            "player": "player__username",
+            "score": "score",
+            "mvp_count": "mvp_count",
+            "updated": "updated",
+        },
+        ("league_id", F("current_rank").asc(nulls_last=True), "id"),
+    ),
+    "rounds": (
+        Round,
+        "league_id",
+        {
+            "league": "league__label",
+            "round": "label",
+            "mvp": "mvp__username",
+            "mvp_score": "mvp_score",
+            "avg_score": "avg_score",
+            "median_score": "median_score",
+            "result_count": "result_count",
+        },
+        ("league_id", "label"),
+    ),
+    "round_results": (
+        RoundResult,
+        "round__league_id",
+        {
+            "league": "round__league__label",
+            "round": "round__label",
+            "player": "player__username",
+            "score": "score",
+            "created": "created",
+        },
+        ("round__league_id", "round__label", "-score", "created"),
+    ),
+}
+EXPORT_FORMATS = ("csv", "ndjson")
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def get_export_rows(kind, league=None, chunk_size=2000, leagues=None):
+    """Return column names and iterator over rows of the given kind for one or all the leagues.
+
+    All the leagues might be limited to the `leagues` queryset, e.g. those visible to the user.
+    """
+
+    model, league_lookup, columns, ordering = EXPORTS[kind]
+    # Leagues may derive ranks instead of storing them
+    queryset = model.objects.with_rank() if model is Standing else model.objects.all()
+    if league is not None:
+        queryset = queryset.filter(**{league_lookup: league.pk})
+    elif leagues is not None:
+        queryset = queryset.filter(**{f"{league_lookup}__in": leagues.values("pk")})
+    rows = queryset.order_by(*ordering).values_list(*columns.values()).iterator(chunk_size=chunk_size)
+    return list(columns), rows
+
+
+def iter_export(kind, fmt, league=None, gzip=False, leagues=None):
+    """Encode rows of the given kind as CSV or newline delimited json chunks, optionally compressed with gzip."""
+
+    columns, rows = get_export_rows(kind, league, leagues=leagues)
+    if fmt == "csv":
+        chunks = iter_csv(columns, rows)
+    else:
+        chunks = iter_ndjson(dict(zip(columns, row)) for row in rows)
+    return iter_gzip(chunks) if gzip else chunks
+
+
+class Echo:
+    """File-like object returning written value, lets csv.writer encode rows one by one."""
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+def iter_csv(columns, rows, chunk_size=500):
+    writer = csv.writer(Echo())
+    chunk = [writer.writerow(columns)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def iter_ndjson(rows, chunk_size=500):
+    """Encode dicts as newline delimited json, joining them into chunks to keep the number of writes low."""
+
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    chunk = []
+    for row in rows:
+        chunk.append(encoder.encode(row))
+        if len(chunk) >= chunk_size:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        if data := compressor.compress(chunk.encode()):
+            yield data
+    yield compressor.flush()
@@ -2,7 +2,7 @@ import django_filters as filters
 
 from django.contrib.auth import get_user_model
 
-from apps.rankie.models import Game, League
+from apps.rankie.models import Game, League, GameResult
 
 
 class LeagueFilter(filters.FilterSet):
@@ -30,3 +30,14 @@ class LeagueFilter(filters.FilterSet):
         elif value is False:
             return queryset.inactive()
         return queryset
+
+
+class GameResultFilter(filters.FilterSet):
+    player = filters.CharFilter(field_name="player__username")
+    game = filters.CharFilter(field_name="game__label")
+    origin = filters.ChoiceFilter(choices=GameResult.ORIGIN.choices)
+    created = filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = GameResult
+        fields = ("player", "game", "origin", "created")
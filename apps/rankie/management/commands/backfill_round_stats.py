@@ -0,0 +1,53 @@
+from itertools import groupby
+
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from apps.rankie.models import Round, League, RoundResult, LeagueSummary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate denormalized round statistics (mvp score, result count, average and median scores) and rebuild "
+        "summaries of the leagues."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--league", help="Label of the only league to backfill")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Number of rounds updated at once")
+
+    def handle(self, *args, **options):
+        rounds = Round.objects.order_by("pk")
+        if options["league"]:
+            rounds = rounds.filter(league__label=options["league"])
+
+        chunk_size = options["chunk_size"]
+        round_ids = list(rounds.values_list("pk", flat=True))
+        for start in range(0, len(round_ids), chunk_size):
+            self.backfill(round_ids[start : start + chunk_size])
+
+        # Summaries show mvp scores of the latest rounds
+        for league in League.objects.filter(pk__in=rounds.values("league_id")):
+            with transaction.atomic():
+                LeagueSummary.rebuild(league)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled statistics of {len(round_ids)} round(s)"))
+
+    @staticmethod
+    def backfill(round_ids):
+        scores = (
+            RoundResult.objects.filter(round_id__in=round_ids).order_by("round_id").values_list("round_id", "score")
+        )
+        round_scores = {
+            round_id: [score for _, score in group] for round_id, group in groupby(scores, key=lambda row: row[0])
+        }
+
+        rounds = []
+        for round_id in round_ids:
+            # Only statistics fields are updated, so there is no need to fetch the whole row
+            curr_round = Round(pk=round_id)
+            curr_round.set_score_stats(round_scores.get(round_id, []))
+            rounds.append(curr_round)
+
+        with transaction.atomic():
+            Round.objects.bulk_update(rounds, ["mvp_score", "avg_score", "median_score", "result_count"])
@@ -0,0 +1,185 @@
+import sys
+import json
+import time
+import random
+import platform
+import itertools
+import subprocess
+import tracemalloc
+
+import django
+
+from django.db import connection
+from django.conf import settings
+from django.db.models import Q
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.rankie.core import register_game_result
+from apps.rankie.models import Round, League, Standing, GameResult
+from apps.rankie.metrics import QueryCounter, percentiles
+from apps.rankie.synthetic import make_result_text, create_synthetic_leagues
+
+
+def int_list(value):
+    try:
+        return [int(item) for item in value.split(",")]
+    except ValueError:
+        raise CommandError(f"Expected comma separated integers, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark register_game_result on synthetic leagues of growing scale in a throwaway test database. "
+        "Reports latency percentiles, query count, locked rows and peak memory per scale and writes them as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int_list, default=[10, 100, 1000], help="Players per league, e.g. 10,100")
+        parser.add_argument("--rounds", type=int_list, default=[10, 100], help="Rounds already played, e.g. 10,100")
+        parser.add_argument("--leagues-per-player", type=int_list, default=[1, 3], help="Leagues every player is in")
+        parser.add_argument(
+            "--rank-mode", choices=League.RANK_MODE.values, default=League.RANK_MODE.STORED, help="Rank mode of leagues"
+        )
+        parser.add_argument("--samples", type=int, default=100, help="Registrations measured per scale")
+        parser.add_argument("--memory-samples", type=int, default=5, help="Registrations traced for peak memory")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Path to write JSON results to")
+        parser.add_argument("--compare", help="Path to JSON results of a previous run to compare with")
+        parser.add_argument(
+            "--in-place", action="store_true", help="Use the configured database instead of a test one, it's flushed!"
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = {self.get_scale_key(result): result for result in json.load(f)["results"]}
+
+        old_name = None
+        if not options["in_place"]:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            results = []
+            scales = itertools.product(options["players"], options["rounds"], options["leagues_per_player"])
+            for players, rounds, leagues_per_player in scales:
+                result = self.run_scale(players, rounds, leagues_per_player, options)
+                self.report(result, baseline)
+                results.append(result)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = {"meta": self.get_meta(options), "results": results}
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(output, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results are written to {options['output']}"))
+
+    def run_scale(self, players, rounds, leagues_per_player, options):
+        rng = random.Random(options["seed"])
+        call_command("flush", interactive=False, verbosity=0)
+        leagues = create_synthetic_leagues(players, rounds, leagues_per_player, rng)
+        League.objects.update(rank_mode=options["rank_mode"])
+        if options["rank_mode"] == League.RANK_MODE.DERIVED:
+            Standing.objects.update(rank=None)
+        game = leagues[0].rule.game
+        player_ids = list(Standing.objects.filter(league=leagues[0]).values_list("player_id", flat=True))
+
+        latencies, queries, rows_locked = [], [], []
+        for game_result in self.iter_game_results(game, player_ids, rounds, options["samples"], rng):
+            rows_locked.append(self.count_locked_rows(game_result))
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                register_game_result(game_result)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count)
+
+        # Tracing slows allocations down, so memory is measured on separate registrations
+        peaks = []
+        offset = rounds + options["samples"] // len(player_ids) + 1
+        for game_result in self.iter_game_results(game, player_ids, offset, options["memory_samples"], rng):
+            tracemalloc.start()
+            register_game_result(game_result)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+
+        return {
+            "players": players,
+            "rounds": rounds,
+            "leagues_per_player": leagues_per_player,
+            "samples": len(latencies),
+            "latency_ms": percentiles(latencies),
+            "queries": percentiles(queries),
+            "rows_locked": percentiles(rows_locked),
+            "peak_memory_kb": max(peaks) if peaks else None,
+        }
+
+    @staticmethod
+    def iter_game_results(game, player_ids, last_round, count, rng):
+        """Yield new results: every player in turn plays the next round after the already played ones."""
+
+        for i in range(count):
+            round_label = str(last_round + 1 + i // len(player_ids))
+            text, _ = make_result_text(round_label, rng)
+            game_result = GameResult.objects.create(
+                player_id=player_ids[i % len(player_ids)], game=game, origin=GameResult.ORIGIN.CUSTOM, text=text
+            )
+            yield GameResult.objects.select_related("player", "game").get(pk=game_result.pk)
+
+    @staticmethod
+    def count_locked_rows(game_result):
+        """Number of rounds and standings registration selects for update."""
+
+        league_ids = list(
+            League.objects.active()
+            .filter(players=game_result.player, rule__game=game_result.game)
+            .values_list("pk", flat=True)
+        )
+        return (
+            Round.objects.filter(league__in=league_ids).count()
+            + Standing.objects.filter(
+                Q(player=game_result.player) | Q(score__isnull=False) & ~Q(league__rank_mode=League.RANK_MODE.SHIFTED),
+                league__in=league_ids,
+            ).count()
+        )
+
+    @staticmethod
+    def get_scale_key(result):
+        return result["players"], result["rounds"], result["leagues_per_player"]
+
+    def report(self, result, baseline):
+        latency = result["latency_ms"]
+        line = (
+            f"players={result['players']} rounds={result['rounds']} leagues={result['leagues_per_player']}: "
+            f"p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms "
+            f"queries={result['queries']['max']} rows_locked={result['rows_locked']['max']} "
+            f"peak_memory={result['peak_memory_kb'] or 0:.0f}KiB"
+        )
+        previous = (baseline or {}).get(self.get_scale_key(result))
+        if previous:
+            deltas = [
+                f"{name} {(latency[name] / previous['latency_ms'][name] - 1) * 100:+.1f}%" for name in ("p50", "p95")
+            ]
+            line += f" ({', '.join(deltas)} vs baseline)"
+        self.stdout.write(line)
+
+    @staticmethod
+    def get_meta(options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR
+            ).stdout.strip()
+        except OSError:
+            commit = None
+        return {
+            "commit": commit or None,
+            "vendor": connection.vendor,
+            "python": sys.version.split()[0],
+            "django": django.get_version(),
+            "platform": platform.platform(),
+            "seed": options["seed"],
+            "rank_mode": options.get("rank_mode"),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
@@ -0,0 +1,89 @@
+import json
+import time
+import random
+
+from django.db import connection
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from apps.rankie.core import register_game_results
+from apps.rankie.models import Standing
+from apps.rankie.workers import RegistrationPool
+from apps.rankie.synthetic import create_test_db, create_game_results, create_synthetic_leagues
+from apps.rankie.consistency import check_leagues
+from apps.rankie.management.commands.benchmark_registration import Command as BenchmarkCommand
+from apps.rankie.management.commands.benchmark_registration import int_list
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark throughput of partitioned registration by worker count on synthetic leagues in a throwaway test "
+        "database, 0 workers stands for registration in this process. Scaling needs a database with row locks "
+        "(PostgreSQL), SQLite serializes writers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int_list, default=[0, 1, 2, 4, 8], help="Worker counts, e.g. 0,2,4")
+        parser.add_argument("--players", type=int, default=100, help="Players of every league")
+        parser.add_argument("--leagues-per-player", type=int, default=8, help="Leagues every player is in")
+        parser.add_argument("--rounds", type=int, default=5, help="Rounds already played")
+        parser.add_argument("--new-rounds", type=int, default=5, help="Rounds every player registers a result of")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Path to write JSON results to")
+        parser.add_argument(
+            "--in-place", action="store_true", help="Use the configured database instead of a test one, it's flushed!"
+        )
+
+    def handle(self, *args, **options):
+        old_name = None
+        if not options["in_place"]:
+            old_name = create_test_db("rankie_benchmark_workers")
+        try:
+            results = []
+            for workers in options["workers"]:
+                result = self.run_workers(workers, options)
+                baseline = results[0]["results_per_second"] if results else result["results_per_second"]
+                result["speedup"] = result["results_per_second"] / baseline if baseline else None
+                self.stdout.write(
+                    f"workers={workers}: {result['results']} results in {result['elapsed_s']:.2f}s, "
+                    f"{result['results_per_second']:.1f} results/s, x{result['speedup']:.2f}, "
+                    f"failed={result['failed']} violations={result['violations']}"
+                )
+                results.append(result)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({"meta": BenchmarkCommand.get_meta(options), "results": results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results are written to {options['output']}"))
+
+    @staticmethod
+    def run_workers(workers, options):
+        rng = random.Random(options["seed"])
+        call_command("flush", interactive=False, verbosity=0)
+        leagues = create_synthetic_leagues(options["players"], options["rounds"], options["leagues_per_player"], rng)
+        player_ids = list(Standing.objects.filter(league=leagues[0]).values_list("player_id", flat=True))
+        round_labels = [str(options["rounds"] + 1 + i) for i in range(options["new_rounds"])]
+        game_results = create_game_results(leagues[0].rule.game, player_ids, round_labels, rng)
+
+        started = time.perf_counter()
+        if workers:
+            with RegistrationPool(workers) as pool:
+                pool.submit(game_results)
+            _, failed = pool.result
+        else:
+            failed = len(game_results) - register_game_results(game_results)
+        elapsed = time.perf_counter() - started
+
+        return {
+            "workers": workers,
+            "players": options["players"],
+            "leagues": len(leagues),
+            "results": len(game_results),
+            "elapsed_s": elapsed,
+            "results_per_second": len(game_results) / elapsed if elapsed else None,
+            "failed": failed,
+            "violations": len(check_leagues()),
+        }
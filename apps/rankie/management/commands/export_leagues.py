@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.rankie.models import League
+from apps.rankie.exports import EXPORTS, EXPORT_FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = "Stream standings, rounds or round results of one or all the leagues as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(EXPORTS))
+        parser.add_argument("--league", help="Label of the league to export, all the leagues if omitted")
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--gzip", action="store_true", help="Compress output with gzip")
+        parser.add_argument("--output", help="Path to write to, stdout if omitted")
+
+    def handle(self, *args, **options):
+        league = None
+        if options["league"]:
+            league = League.objects.filter(label=options["league"]).first()
+            if league is None:
+                raise CommandError(f"League {options['league']!r} does not exist")
+
+        chunks = iter_export(options["kind"], options["format"], league, options["gzip"])
+        if options["output"]:
+            mode = "wb" if options["gzip"] else "w"
+            with open(
+                options["output"], mode, **({} if options["gzip"] else {"encoding": "utf-8", "newline": ""})
+            ) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        elif options["gzip"]:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
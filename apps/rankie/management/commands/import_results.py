@@ -0,0 +1,155 @@
+import csv
+import sys
+import json
+import time
+
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.rankie.core import register_game_results
+from apps.rankie.models import Game, GameResult
+from apps.rankie.workers import RegistrationPool
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Import game results from CSV or JSONL stream with `player`, `game`, `text` and optional `origin` columns. "
+        "Players and games are referenced by username and label, rejected rows are written to a side file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to CSV/JSONL file, `-` for stdin")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format, guessed by extension if omitted")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Number of rows inserted/registered at once")
+        parser.add_argument("--rejects", help="Path to write rejected rows to, defaults to `<path>.rejected.jsonl`")
+        parser.add_argument("--origin", default=GameResult.ORIGIN.CUSTOM, choices=GameResult.ORIGIN.values)
+        parser.add_argument("--no-register", action="store_true", help="Only insert results, don't register them")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Register by a pool of worker processes partitioned by league, in this process if 0",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        if path == "-" and options["format"] is None:
+            raise CommandError("--format is required when reading from stdin")
+        rejects_path = options["rejects"] or ("rejected.jsonl" if path == "-" else f"{path}.rejected.jsonl")
+        chunk_size = options["chunk_size"]
+
+        self.default_origin = options["origin"]
+        self.players = dict(User.objects.values_list("username", "id"))
+        self.games = dict(Game.objects.values_list("label", "id"))
+        last_pk = GameResult.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+        started = time.perf_counter()
+        read = rejected = 0
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        with stream, open(rejects_path, "w", encoding="utf-8") as rejects:
+            rows = self.read_rows(stream, fmt)
+            while chunk := list(islice(rows, chunk_size)):
+                game_results = []
+                for line_no, row, error in chunk:
+                    game_result, error = (None, error) if error else self.build(row)
+                    if error:
+                        rejects.write(json.dumps({"line": line_no, "reason": error, "row": row}) + "\n")
+                        rejected += 1
+                    else:
+                        game_results.append(game_result)
+                # Already imported results violate the unique constraint and are skipped
+                GameResult.objects.bulk_create(game_results, ignore_conflicts=True)
+                read += len(chunk)
+                self.report("Read", read, started)
+
+        inserted = GameResult.objects.filter(pk__gt=last_pk).count()
+        self.stdout.write(f"Inserted {inserted} new result(s), skipped {read - rejected - inserted} existing one(s)")
+        if rejected:
+            self.stdout.write(self.style.WARNING(f"Rejected {rejected} row(s), see {rejects_path}"))
+
+        if not options["no_register"]:
+            self.register(last_pk, chunk_size, options["workers"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s"))
+
+    @staticmethod
+    def read_rows(stream, fmt):
+        """Yield (line number, row, parse error) without reading the whole stream."""
+
+        if fmt == "csv":
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row, None
+            return
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_no, line, f"invalid json: {exc}"
+                continue
+            if not isinstance(row, dict):
+                yield line_no, row, "row is not an object"
+                continue
+            yield line_no, row, None
+
+    def build(self, row):
+        """Return game result built from a row or the reason it's rejected."""
+
+        player_id = self.players.get(row.get("player"))
+        if player_id is None:
+            return None, f"unknown player {row.get('player')!r}"
+        game_id = self.games.get(row.get("game"))
+        if game_id is None:
+            return None, f"unknown game {row.get('game')!r}"
+        if not row.get("text"):
+            return None, "empty text"
+        origin = row.get("origin") or self.default_origin
+        if origin not in GameResult.ORIGIN.values:
+            return None, f"unknown origin {origin!r}"
+        return GameResult(player_id=player_id, game_id=game_id, origin=origin, text=row["text"]), None
+
+    def register(self, last_pk, chunk_size, workers):
+        started = time.perf_counter()
+        registered = 0
+        pool = RegistrationPool(workers) if workers else None
+        try:
+            # Keyset pagination keeps memory constant and doesn't hold a cursor open while registering
+            while True:
+                game_results = list(
+                    GameResult.objects.filter(pk__gt=last_pk)
+                    .select_related("player", "game")
+                    .order_by("pk")[:chunk_size]
+                )
+                if not game_results:
+                    break
+                if pool is None:
+                    registered += register_game_results(game_results)
+                    self.report("Registered", registered, started)
+                else:
+                    registered += len(game_results)
+                    pool.submit(game_results)
+                    self.report("Queued", registered, started)
+                last_pk = game_results[-1].pk
+        finally:
+            # Queued results are registered before exit, interrupted import included
+            if pool is not None:
+                tasks, failed = pool.close()
+                self.stdout.write(f"Registered {tasks} league partition(s) of results by {workers} worker(s)")
+                for game_result_id, league_ids in pool.failed:
+                    self.stdout.write(
+                        self.style.WARNING(f"Game result {game_result_id} failed to register in leagues {league_ids}")
+                    )
+                if failed:
+                    self.stdout.write(self.style.WARNING(f"{failed} partition(s) failed to register, see logs"))
+                self.report("Registered", registered, started)
+
+    def report(self, action, count, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{action} {count} row(s), {count / elapsed if elapsed else 0:.0f} rows/s")
@@ -0,0 +1,252 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import threading
+import subprocess
+
+from collections import Counter, defaultdict
+
+import httpx
+
+from django.db import connection, connections
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.rankie.models import Game, Round, League, Standing, GameResult
+from apps.rankie.metrics import percentiles
+from apps.rankie.synthetic import GAMES, make_result_text
+
+
+class LockSampler(threading.Thread):
+    """Samples PostgreSQL backends waiting for locks, lock wait time is number of waiting backends times interval."""
+
+    def __init__(self, interval=0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.lock_wait_seconds = 0.0
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self.stopped.wait(self.interval):
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() "
+                        "AND wait_event_type = 'Lock'"
+                    )
+                    self.lock_wait_seconds += cursor.fetchone()[0] * self.interval
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test game result submissions over HTTP. Virtual users are players of active leagues, every one submits "
+        "a result per round in turn, arrivals follow the inter-arrival times of stored game results scaled to the "
+        "target rate. Needs a seeded database (see seed_rankie), starts the app against it unless --url is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Base URL of a running app, a local server is started if omitted")
+        parser.add_argument("--rate", type=float, default=20, help="Target submissions per second")
+        parser.add_argument("--duration", type=float, default=30, help="Test duration in seconds")
+        parser.add_argument("--users", type=int, default=200, help="Number of virtual users")
+        parser.add_argument(
+            "--mode",
+            choices=["pair", "submit"],
+            default="pair",
+            help="`pair` creates a result and registers it with two requests, `submit` uses the single endpoint",
+        )
+        parser.add_argument("--concurrency", type=int, default=100, help="Maximum number of requests in flight")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Path to write JSON report to")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        users = self.get_virtual_users(options["users"], rng)
+        schedule = self.get_schedule(users, options["rate"], options["duration"], rng)
+        self.stdout.write(f"{len(schedule)} submission(s) of {len(users)} virtual user(s) scheduled")
+
+        server = None
+        url = options["url"]
+        if url is None:
+            server, url = self.start_server()
+        sampler = LockSampler() if connection.vendor == "postgresql" else None
+        deadlocks = self.get_deadlocks()
+        try:
+            if sampler is not None:
+                sampler.start()
+            started = time.perf_counter()
+            results = asyncio.run(self.run(url, schedule, options))
+            elapsed = time.perf_counter() - started
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        report = self.get_report(results, elapsed, options)
+        report["deadlocks"] = None if deadlocks is None else self.get_deadlocks() - deadlocks
+        report["lock_wait_seconds"] = None if sampler is None else sampler.lock_wait_seconds
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def get_virtual_users(count, rng):
+        """Return (username, game label) pairs of players of active leagues, players of several leagues included."""
+
+        pairs = sorted(
+            Standing.objects.filter(league__in=League.objects.active(), league__rule__game__label__in=list(GAMES))
+            .values_list("player__username", "league__rule__game__label")
+            .distinct()
+        )
+        if not pairs:
+            raise CommandError("No players in active leagues of known games, seed the database first")
+        return rng.sample(pairs, min(count, len(pairs)))
+
+    @staticmethod
+    def get_interarrivals(limit=10000):
+        """Return gaps between the most recent stored results normalized to the mean of 1, None if they're unusable."""
+
+        created = list(GameResult.objects.order_by("-created").values_list("created", flat=True)[:limit])
+        # Bulk created (seeded, imported) results carry no timing
+        if len(created) < 100 or (created[0] - created[-1]).total_seconds() < 60:
+            return None
+        gaps = sorted((newer - older).total_seconds() for newer, older in zip(created, created[1:]))
+        # Long pauses (nights, outages) would stretch the test, so the longest percent of gaps is dropped
+        gaps = gaps[: int(len(gaps) * 0.99)]
+        mean = sum(gaps) / len(gaps)
+        return [gap / mean for gap in gaps] if mean > 0 else None
+
+    def get_schedule(self, users, rate, duration, rng):
+        """Return (offset, username, game label, text) of every submission.
+
+        Every user submits once per round in shuffled order, then all of them go on with the next round, so the
+        current rounds of all leagues are contended the way they're in the morning of a new game day.
+        """
+
+        interarrivals = self.get_interarrivals()
+        if interarrivals is None:
+            self.stdout.write(self.style.WARNING("Stored results have no timing spread, using Poisson arrivals"))
+
+        next_rounds = {}
+        for game in Game.objects.filter(label__in={game_label for _, game_label in users}):
+            labels = set(Round.objects.filter(league__rule__game=game).values_list("label", flat=True).distinct())
+            # Results of previous runs might have never been registered
+            pattern = re.compile(game.parser_regex)
+            for text in GameResult.objects.filter(game=game).order_by("-id").values_list("text", flat=True)[:1000]:
+                if match := pattern.search(text):
+                    labels.add(match.group(Game.RE_ROUND_GROUP))
+            next_rounds[game.label] = max((int(label) for label in labels if label.isdigit()), default=0) + 1
+
+        schedule = []
+        offset = 0.0
+        order = []
+        rounds = defaultdict(int)
+        while True:
+            offset += (rng.choice(interarrivals) if interarrivals else rng.expovariate(1)) / rate
+            if offset >= duration:
+                return schedule
+            if not order:
+                order = rng.sample(users, len(users))
+            username, game_label = order.pop()
+            round_label = str(next_rounds[game_label] + rounds[(username, game_label)])
+            rounds[(username, game_label)] += 1
+            text, _ = make_result_text(round_label, rng, game_label)
+            schedule.append((offset, username, game_label, text))
+
+    @staticmethod
+    def start_server():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        # Throttling would reject most of the load, production settings only allow the public host over HTTPS
+        env = {
+            **os.environ,
+            "DEBUG": "True",
+            "RANKIE_THROTTLE_PLAYER_RATE": "1000000/s",
+            "RANKIE_THROTTLE_ORIGIN_RATE": "1000000/s",
+        }
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / "manage.py"), "runserver", "--noreload", f"127.0.0.1:{port}"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f"{url}/api/games/").status_code == 200:
+                    return server, url
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        server.terminate()
+        raise CommandError("Server didn't start in 30 seconds")
+
+    async def run(self, url, schedule, options):
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            tasks = []
+            for offset, username, game_label, text in schedule:
+                delay = started + offset - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                data = {"player": username, "game": game_label, "origin": GameResult.ORIGIN.CUSTOM, "text": text}
+                tasks.append(asyncio.create_task(self.submit(client, semaphore, data, started + offset, options)))
+            return await asyncio.gather(*tasks)
+
+    @staticmethod
+    async def submit(client, semaphore, data, scheduled, options):
+        """Return latency counted from the scheduled time, so waiting for a free connection is accounted for."""
+
+        async with semaphore:
+            try:
+                if options["mode"] == "submit":
+                    response = await client.post("/api/gameresults/submit/", json=data)
+                else:
+                    response = await client.post("/api/gameresults/", json=data)
+                    if response.status_code == 201:
+                        response = await client.get(f"/api/gameresults/{response.json()['id']}/register/")
+                outcome = str(response.status_code)
+            except httpx.HTTPError as exc:
+                outcome = type(exc).__name__
+        return asyncio.get_running_loop().time() - scheduled, outcome
+
+    @staticmethod
+    def get_report(results, elapsed, options):
+        outcomes = Counter(outcome for _, outcome in results)
+        succeeded = [latency * 1000 for latency, outcome in results if outcome in ("200", "201")]
+        return {
+            "mode": options["mode"],
+            "target_rate": options["rate"],
+            "submissions": len(results),
+            "throughput": len(succeeded) / elapsed if elapsed else None,
+            "latency_ms": percentiles(succeeded),
+            "outcomes": dict(outcomes),
+            "errors": len(results) - len(succeeded),
+        }
+
+    @staticmethod
+    def get_deadlocks():
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+            return cursor.fetchone()[0]
@@ -0,0 +1,85 @@
+import time
+import random
+
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.rankie.models import Round, League, Standing, GameResult, RoundResult
+from apps.rankie.synthetic import GAMES, create_league, create_players, create_results, get_or_create_game
+
+User = get_user_model()
+
+USERNAME_PREFIX = "seed_user"
+USERS_PER_SCALE = 1000
+LEAGUES_PER_SCALE = 25
+GAME_WEIGHTS = {"wordle_eng": 60, "wordle_ru": 25, "reversle_eng": 15}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the database with deterministic synthetic users, games, leagues and their history for profiling. "
+        f"Every scale unit adds {USERS_PER_SCALE} users and {LEAGUES_PER_SCALE} leagues, `--scale 7` makes about a "
+        "million rows. The same seed always gives the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--rounds", type=int, default=60, help="Rounds (days) played in every game")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Number of rows inserted at once")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError("Database is already seeded, flush it first")
+
+        rng = random.Random(options["seed"])
+        chunk_size = options["chunk_size"]
+        users_count = max(2, int(USERS_PER_SCALE * options["scale"]))
+        leagues_count = max(1, int(LEAGUES_PER_SCALE * options["scale"]))
+        round_labels = [str(100 + i) for i in range(options["rounds"])]
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = create_players(users_count, prefix=USERNAME_PREFIX, chunk_size=chunk_size)
+            # Most players are casual ones skipping many rounds
+            activity = {user.pk: rng.betavariate(2, 1.5) for user in users}
+
+            leagues = [
+                (rng.choices(list(GAME_WEIGHTS), list(GAME_WEIGHTS.values()))[0], members)
+                for members in self.get_members(users, leagues_count, rng)
+            ]
+            for label in GAMES:
+                game_leagues = [(i, members) for i, (game_label, members) in enumerate(leagues) if game_label == label]
+                if not game_leagues:
+                    continue
+                game, rule = get_or_create_game(label)
+                players = sorted({user for _, members in game_leagues for user in members}, key=lambda user: user.pk)
+                results = create_results(game, players, round_labels, rng, activity, chunk_size)
+                for i, members in game_leagues:
+                    league_label = f"{label.replace('_', '-')}-{i}"
+                    create_league(rule, members[0], league_label, members, round_labels, results, chunk_size=chunk_size)
+                self.stdout.write(f"Seeded {len(game_leagues)} {label} league(s), {time.perf_counter() - started:.1f}s")
+
+        self.report(started)
+
+    @staticmethod
+    def get_members(users, count, rng):
+        """Yield league members with realistic skew: a few whale leagues and a long tail of tiny ones."""
+
+        whales = max(1, count // 50)
+        for i in range(count):
+            if i < whales:
+                size = len(users) // rng.randint(2, 4)
+            else:
+                size = int(2 * rng.paretovariate(1.2))
+            yield rng.sample(users, min(len(users), max(2, size)))
+
+    def report(self, started):
+        elapsed = time.perf_counter() - started
+        counts = {
+            model.__name__: model.objects.count() for model in (User, League, GameResult, Round, RoundResult, Standing)
+        }
+        rows = sum(counts.values())
+        self.stdout.write(", ".join(f"{name}: {count}" for name, count in counts.items()))
+        self.stdout.write(self.style.SUCCESS(f"Seeded {rows} rows in {elapsed:.1f}s, {rows / elapsed:.0f} rows/s"))
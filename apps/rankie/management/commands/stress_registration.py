@@ -0,0 +1,115 @@
+import time
+import queue
+import random
+import threading
+
+from collections import Counter
+
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.rankie.core import register_game_result
+from apps.rankie.models import Standing, RoundResult
+from apps.rankie.synthetic import create_test_db, create_game_results, create_synthetic_leagues
+from apps.rankie.consistency import check_leagues
+
+
+class Command(BaseCommand):
+    help = (
+        "Register results of synthetic leagues from many threads at once in a throwaway test database, then check "
+        "rounds and standings against a recomputation from round results (see apps.rankie.consistency). "
+        "Concurrency bugs show up on PostgreSQL, SQLite serializes writers and most conflicts end up in retries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--players", type=int, default=50, help="Players of every league")
+        parser.add_argument("--leagues-per-player", type=int, default=3, help="Leagues every player is in")
+        parser.add_argument("--rounds", type=int, default=5, help="Rounds already played")
+        parser.add_argument("--new-rounds", type=int, default=20, help="Rounds every player registers a result of")
+        parser.add_argument("--retries", type=int, default=20, help="Attempts of a registration failed on conflict")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--in-place", action="store_true", help="Use the configured database instead of a test one, it's flushed!"
+        )
+
+    def handle(self, *args, **options):
+        old_name = None
+        if not options["in_place"]:
+            # In-memory SQLite shares a single lock between threads and fails instead of waiting
+            old_name = create_test_db("rankie_stress")
+        try:
+            self.stress(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def stress(self, options):
+        rng = random.Random(options["seed"])
+        leagues = create_synthetic_leagues(options["players"], options["rounds"], options["leagues_per_player"], rng)
+        player_ids = list(Standing.objects.filter(league=leagues[0]).values_list("player_id", flat=True))
+        round_labels = [str(options["rounds"] + 1 + i) for i in range(options["new_rounds"])]
+        # Results of a round are still being registered while the next one is started
+        game_results = create_game_results(leagues[0].rule.game, player_ids, round_labels, rng, jitter=2)
+        results_before = RoundResult.objects.count()
+
+        pending = queue.SimpleQueue()
+        for game_result in game_results:
+            pending.put(game_result)
+        stats = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(options["threads"])
+        threads = [
+            threading.Thread(target=self.work, args=(pending, barrier, stats, lock, options["retries"], i))
+            for i in range(options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        violations = check_leagues()
+        missing = stats["registered"] * len(leagues) - (RoundResult.objects.count() - results_before)
+        if missing:
+            violations.append(f"{missing} round result(s) of registered results are missing")
+        retries = ", ".join(f"{name}: {count}" for name, count in stats.items() if name not in ("registered", "failed"))
+        self.stdout.write(
+            f"Registered {stats['registered']} of {len(game_results)} results from {options['threads']} threads in "
+            f"{elapsed:.1f}s, {stats['failed']} failed, retries: {retries or 'none'}"
+        )
+        if stats["failed"]:
+            self.stdout.write(self.style.WARNING(f"{stats['failed']} result(s) failed to register, raise --retries"))
+        if violations:
+            for violation in violations:
+                self.stderr.write(violation)
+            raise CommandError(f"{len(violations)} consistency violation(s)")
+        self.stdout.write(self.style.SUCCESS(f"{len(leagues)} league(s) are consistent"))
+
+    @staticmethod
+    def work(pending, barrier, stats, lock, retries, seed):
+        rng = random.Random(seed)
+        try:
+            barrier.wait()
+            while True:
+                try:
+                    game_result = pending.get_nowait()
+                except queue.Empty:
+                    return
+                for attempt in range(retries):
+                    try:
+                        register_game_result(game_result)
+                        outcome = "registered"
+                        break
+                    # Deadlocks, lock timeouts and rounds created by a concurrent registration are retried
+                    except (OperationalError, IntegrityError) as exc:
+                        with lock:
+                            stats[type(exc).__name__] += 1
+                        time.sleep(rng.random() * 0.001 * 2 ** min(attempt, 8))
+                else:
+                    outcome = "failed"
+                with lock:
+                    stats[outcome] += 1
+        finally:
+            connections.close_all()
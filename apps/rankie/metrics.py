@@ -0,0 +1,207 @@
+"""In-process metrics exposed in Prometheus text format at `/metrics`.
+
+Every process keeps its own samples in memory and dumps them into its own file in `RANKIE_METRICS_DIR` at most once per
+`RANKIE_METRICS_FLUSH_INTERVAL` seconds, so the endpoint served by any worker sums samples of all of them. Files of
+stopped workers are kept for `RANKIE_METRICS_MAX_AGE` seconds since their last flush, so counters and histograms stay
+cumulative across restarts of workers for a while. Removed files drop out of the sums, which Prometheus takes as a
+counter reset.
+"""
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+import statistics
+
+from collections import defaultdict
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def get_sort_key(labels):
+    """Sort samples by labels and buckets by their bounds."""
+
+    le = dict(labels).get("le")
+    return [label for label in labels if label[0] != "le"], float("inf") if le == "+Inf" else float(le or 0)
+
+
+def percentiles(values):
+    """Summary of measurements for reports of benchmarks and load tests."""
+
+    if len(values) < 2:
+        value = values[0] if values else None
+        return {"p50": value, "p95": value, "p99": value, "mean": value, "max": value}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "mean": statistics.fmean(values), "max": max(values)}
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries, unlike captured queries log it's not limited in size."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Registry:
+    def __init__(self, path=None, flush_interval=5.0, max_age=24 * 60 * 60):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start over with empty samples and a new file, called in the new process after fork as well."""
+
+        self.pid = os.getpid()
+        self.samples = defaultdict(float)
+        self.filename = f"{self.pid}-{uuid.uuid4().hex[:8]}.json"
+        self.flushed = 0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def add(self, key, value):
+        with self.lock:
+            if os.getpid() != self.pid:
+                self.reset()
+            self.samples[key] += value
+        if self.path is not None and time.monotonic() - self.flushed > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.path is None:
+            return
+        with self.lock:
+            self.flushed = time.monotonic()
+            data = json.dumps(list(self.samples.items()))
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, f".{self.filename}")
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.path, self.filename))
+
+    def collect(self):
+        """Sum samples of all the processes, the current one's are taken from memory.
+
+        Files not flushed for `max_age` seconds are removed on the way, an idle worker that's still running writes its
+        file again with the next sample.
+        """
+
+        totals = defaultdict(float)
+        if self.path is not None and os.path.isdir(self.path):
+            expired = time.time() - self.max_age
+            for entry in os.scandir(self.path):
+                if not entry.name.endswith(".json") or entry.name == self.filename:
+                    continue
+                try:
+                    if entry.stat().st_mtime < expired:
+                        os.remove(entry.path)
+                        continue
+                    with open(entry.path) as f:
+                        samples = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for key, value in samples:
+                    totals[tuple(key)] += value
+        with self.lock:
+            for (name, labels), value in self.samples.items():
+                totals[(name, labels)] += value
+        return totals
+
+    def render(self):
+        samples = defaultdict(list)
+        for (name, labels), value in self.collect().items():
+            samples[name].append((json.loads(labels), value))
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name in metric.get_sample_names():
+                for labels, value in sorted(samples.get(name, []), key=lambda sample: get_sort_key(sample[0])):
+                    lines.append(f"{name}{format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def get_labels(self, labels, **extra):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        # Labels are part of the key, json keeps them hashable and dumpable
+        return json.dumps([[name, labels[name]] for name in self.labelnames] + [[k, v] for k, v in extra.items()])
+
+    def get_sample_names(self):
+        return [self.name]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        self.registry.add((self.name, self.get_labels(labels)), value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        # Buckets are cumulative, value is counted in every bucket it fits in, empty ones are exposed as well
+        for bound in self.buckets:
+            self.registry.add((f"{self.name}_bucket", self.get_labels(labels, le=f"{bound:g}")), int(value <= bound))
+        self.registry.add((f"{self.name}_bucket", self.get_labels(labels, le="+Inf")), 1)
+        self.registry.add((f"{self.name}_sum", self.get_labels(labels)), value)
+        self.registry.add((f"{self.name}_count", self.get_labels(labels)), 1)
+
+    def get_sample_names(self):
+        return [f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count"]
+
+
+REGISTRY = Registry(
+    settings.RANKIE_METRICS_DIR, settings.RANKIE_METRICS_FLUSH_INTERVAL, settings.RANKIE_METRICS_MAX_AGE
+)
+atexit.register(REGISTRY.flush)
+
+REQUEST_LATENCY = Histogram(
+    "rankie_request_duration_seconds", "Request processing time by view.", ["view", "method", "status"]
+)
+REQUEST_QUERIES = Histogram(
+    "rankie_request_db_queries", "Number of database queries per request by view.", ["view"], buckets=COUNT_BUCKETS
+)
+REGISTRATION_LATENCY = Histogram("rankie_registration_duration_seconds", "Game result registration time.")
+REGISTRATION_ROWS = Counter(
+    "rankie_registration_rows_total", "Rows written by game result registrations by kind.", ["kind"]
+)
+SCORER_CACHE = Counter("rankie_scorer_cache_total", "Scorer cache lookups by result.", ["result"])
+SUBMISSIONS = Counter(
+    "rankie_submissions_total", "Game result submissions by origin and outcome.", ["origin", "outcome"]
+)
@@ -0,0 +1,75 @@
+import time
+
+from django.db import connections
+from django.conf import settings
+
+from .metrics import REQUEST_LATENCY, REQUEST_QUERIES, QueryCounter
+from .routers import has_replica, use_replica, replica_reads
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class MetricsMiddleware:
+    """Observe processing time and number of database queries of every request by the name of the view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        # Queries of the read replica are counted too. Connections opened within the request get their permanent
+        # wrappers installed meanwhile, so the counter is removed by identity instead of popping the last wrapper
+        wrapped = list(connections.all())
+        for connection in wrapped:
+            connection.execute_wrappers.append(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            for connection in wrapped:
+                connection.execute_wrappers.remove(counter)
+        elapsed = time.perf_counter() - started
+
+        # Unresolved paths are grouped together to keep the number of label values bounded
+        view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        REQUEST_LATENCY.observe(elapsed, view=view, method=request.method, status=f"{response.status_code // 100}xx")
+        REQUEST_QUERIES.observe(counter.count, view=view)
+        return response
+
+
+class ReplicaMiddleware:
+    """Serve read-only requests from the replica database, see `apps.rankie.routers`.
+
+    Views writing on safe requests turn replica reads off with `replica_reads = False`. A client that has written is
+    pinned to the primary for `RANKIE_REPLICA_PIN_SECONDS` with a cookie, so the page it's redirected to reads its own
+    writes despite the replication lag.
+    """
+
+    COOKIE = "rankie_primary"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not has_replica():
+            return self.get_response(request)
+
+        safe = request.method in SAFE_METHODS
+        allowed = safe and self.COOKIE not in request.COOKIES
+        with use_replica(allowed):
+            response = self.get_response(request)
+            # Router turns replica reads off on the first write
+            wrote = allowed and not replica_reads.get()
+        if not safe or wrote:
+            response.set_cookie(
+                self.COOKIE, "1", max_age=settings.RANKIE_REPLICA_PIN_SECONDS, httponly=True, samesite="Lax"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Django class based views expose the class as `view_class`, DRF viewsets as `cls`, whose actions may turn
+        # replica reads off with their own `replica_reads` kwarg
+        view = getattr(view_func, "view_class", None) or getattr(view_func, "cls", view_func)
+        enabled = getattr(view_func, "initkwargs", {}).get("replica_reads", getattr(view, "replica_reads", True))
+        if not enabled:
+            replica_reads.set(False)
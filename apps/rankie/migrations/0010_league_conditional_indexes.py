@@ -0,0 +1,21 @@
+# Generated by Django 4.0.6 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0009_alter_gamerule_py_kwargs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leagueevent',
+            index=models.Index(fields=['league', '-id'], name='league_event_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='standing',
+            index=models.Index(fields=['league', '-updated'], name='standing_latest_update_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.6 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0010_league_conditional_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='avg_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='median_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='mvp_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='result_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
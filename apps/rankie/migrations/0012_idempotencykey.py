@@ -0,0 +1,28 @@
+# Generated by Django 4.0.6 on 2026-10-19 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0011_round_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=128, unique=True)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('response', models.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Idempotency key',
+                'verbose_name_plural': 'Idempotency keys',
+                'db_table': 'idempotency_key',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.6 on 2026-10-19 12:47
+
+import apps.rankie.models
+from django.db import migrations, models
+
+
+# Patterns the telegram bot used to detect games with before they were stored in the database
+DETECT_REGEXES = {
+    'wordle_eng': r'^Wordle',
+    'wordle_ru': r'Wordle \(RU\)',
+    'reversle_eng': r'^Reversle',
+    'nerdle': r'^nerdlegame',
+}
+
+
+def set_detect_regexes(apps, schema_editor):
+    Game = apps.get_model('rankie', 'Game')
+    for label, detect_regex in DETECT_REGEXES.items():
+        Game.objects.filter(label=label, detect_regex='').update(detect_regex=detect_regex)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='detect_regex',
+            field=models.TextField(blank=True, default='', validators=[apps.rankie.models.GameParserValidator()]),
+        ),
+        migrations.RunPython(set_detect_regexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.0.6 on 2026-10-19 12:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0013_game_detect_regex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StandingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('player_ids', models.BinaryField()),
+                ('ranks', models.BinaryField()),
+                ('scores', models.BinaryField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rankie.league')),
+                ('round', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='standing_snapshot', to='rankie.round')),
+            ],
+            options={
+                'verbose_name': 'Standing snapshot',
+                'verbose_name_plural': 'Standing snapshots',
+                'db_table': 'standing_snapshot',
+                'default_related_name': 'standing_snapshots',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.0.6 on 2026-10-19 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0014_standingsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='league',
+            name='rank_mode',
+            field=models.CharField(choices=[('STORED', 'Stored'), ('DERIVED', 'Derived')], default='STORED', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='standing',
+            index=models.Index(fields=['league', '-score', '-mvp_count', 'created'], include=('player', 'rank'), name='standing_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0015_league_rank_mode'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='league',
+            name='rank_mode',
+            field=models.CharField(choices=[('STORED', 'Stored'), ('DERIVED', 'Derived'), ('SHIFTED', 'Shifted')], default='STORED', max_length=16),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.6 on 2026-10-19 14:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0016_league_rank_mode_shifted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeagueSummary',
+            fields=[
+                ('league', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='rankie.league')),
+                ('document', models.JSONField(default=dict)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'League summary',
+                'verbose_name_plural': 'League summaries',
+                'db_table': 'league_summary',
+            },
+        ),
+    ]
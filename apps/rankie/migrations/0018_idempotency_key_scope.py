@@ -0,0 +1,32 @@
+# Generated by Django 4.0.6 on 2026-10-19 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0017_league_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='origin',
+            field=models.CharField(default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='player',
+            field=models.CharField(default='', max_length=150),
+        ),
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='key',
+            field=models.CharField(max_length=128),
+        ),
+        migrations.AlterUniqueTogether(
+            name='idempotencykey',
+            unique_together={('key', 'player', 'origin')},
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.6 on 2026-10-19 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankie', '0018_idempotency_key_scope'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='standing',
+            name='standing_rank_idx',
+        ),
+        migrations.AddIndex(
+            model_name='standing',
+            index=models.Index(fields=['league', '-score', '-mvp_count', 'created'], name='standing_rank_idx'),
+        ),
+    ]
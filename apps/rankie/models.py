@@ -1,12 +1,19 @@
 import re
+import sys
+import array
+import statistics
+
+from datetime import datetime, timedelta
 
 from django.db import models
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import F, Q, Case, When, Window
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.utils.deconstruct import deconstructible
 from django.utils.translation import gettext_lazy as _
+from django.db.models.functions import Rank
 
 User = get_user_model()
 
@@ -50,6 +57,8 @@ class Game(models.Model):
     name = models.CharField(max_length=128, unique=True)
     url = models.URLField()
     parser_regex = models.TextField(validators=[GameParserValidator(RE_GROUPS)])
+    # Used by clients to tell the game from the result text, parser regex is used when empty
+    detect_regex = models.TextField(blank=True, default="", validators=[GameParserValidator()])
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -61,6 +70,9 @@ class Game(models.Model):
     def __str__(self):
         return self.name
 
+    def get_detect_regex(self):
+        return self.detect_regex or self.parser_regex
+
 
 class GameRule(models.Model):
     name = models.CharField(max_length=128)
@@ -117,6 +129,15 @@ class LeagueQuerySet(models.QuerySet):
 
 
 class League(models.Model):
+    # noinspection PyPep8Naming
+    class RANK_MODE(models.TextChoices):  # noqa: N801
+        # Ranks are stored in standings and shifted on every registration
+        STORED = "STORED"
+        # Ranks are computed on read, registration writes the player's standing (and the previous round mvp's) only
+        DERIVED = "DERIVED"
+        # Ranks are stored, registration counts the player's new rank and shifts the ranks in between with an UPDATE
+        SHIFTED = "SHIFTED"
+
     label = models.SlugField(max_length=32, unique=True)
     name = models.CharField(max_length=256, unique=True)
     owner = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name="owned_leagues")
@@ -125,6 +146,7 @@ class League(models.Model):
     players = models.ManyToManyField(to=User, through="Standing")
     start_dt = models.DateTimeField()
     end_dt = models.DateTimeField(null=True, blank=True)
+    rank_mode = models.CharField(max_length=16, choices=RANK_MODE.choices, default=RANK_MODE.STORED)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -150,6 +172,11 @@ class Round(models.Model):
     league = models.ForeignKey(to=League, on_delete=models.CASCADE)
     description = models.TextField(null=True, blank=True)
     mvp = models.ForeignKey(to=User, on_delete=models.SET_NULL, default=None, null=True, blank=True)
+    # Denormalized round results statistics, maintained on registration (mvp score is the best one)
+    mvp_score = models.FloatField(null=True, blank=True)
+    avg_score = models.FloatField(null=True, blank=True)
+    median_score = models.FloatField(null=True, blank=True)
+    result_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         db_table = "round"
@@ -161,6 +188,21 @@ class Round(models.Model):
     def __str__(self):
         return f"Round {self.label} of {self.league}"
 
+    @staticmethod
+    def get_label_key(label: str) -> tuple:
+        """Sort key of round labels, numbered rounds compare as numbers ("999" < "1000") and go before the others."""
+
+        return (0, int(label), "") if label.isdecimal() else (1, 0, label)
+
+    def set_score_stats(self, scores):
+        """Refresh denormalized statistics from the scores of all the round results."""
+
+        scores = list(scores)
+        self.result_count = len(scores)
+        self.mvp_score = max(scores) if scores else None
+        self.avg_score = statistics.fmean(scores) if scores else None
+        self.median_score = statistics.median(scores) if scores else None
+
 
 class RoundResult(models.Model):
     round = models.ForeignKey(to=Round, on_delete=models.CASCADE)
@@ -201,9 +243,40 @@ class LeagueEvent(models.Model):
         verbose_name = _("League event")
         verbose_name_plural = _("League events")
         default_related_name = "events"
+        indexes = [models.Index(fields=["league", "-id"], name="league_event_latest_idx")]
+
+
+class StandingQuerySet(models.QuerySet):
+    def ahead_of(self, standing):
+        """Filter standings ranked ahead of the given one: better score, more mvps or joined earlier."""
+
+        return self.filter(
+            Q(score__gt=standing.score)
+            | Q(score=standing.score, mvp_count__gt=standing.mvp_count)
+            | Q(score=standing.score, mvp_count=standing.mvp_count, created__lt=standing.created)
+        )
+
+    def with_rank(self):
+        """Annotate `current_rank`: stored rank or, in leagues deriving ranks, computed with a window over the league.
+
+        Window is computed after filtering, so leagues deriving ranks must not be narrowed down to some standings.
+        """
+
+        derived = Window(expression=Rank(), partition_by=[F("league_id")], order_by=list(Standing.RANK_ORDERING))
+        return self.annotate(
+            current_rank=Case(
+                When(score__isnull=True, then=None),
+                When(league__rank_mode=League.RANK_MODE.DERIVED, then=derived),
+                default=F("rank"),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
 
 
 class Standing(models.Model):
+    # Tie-break order of ranks: better score, more mvps, joined earlier
+    RANK_ORDERING = (F("score").desc(nulls_last=True), F("mvp_count").desc(), F("created").asc())
+
     league = models.ForeignKey(to=League, on_delete=models.CASCADE)
     rank = models.PositiveIntegerField(null=True, blank=True)
     player = models.ForeignKey(to=User, on_delete=models.CASCADE)
@@ -212,12 +285,257 @@ class Standing(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = StandingQuerySet.as_manager()
+
     class Meta:
         db_table = "standing"
         verbose_name = _("Standing")
         verbose_name_plural = _("Standings")
         unique_together = ("player", "league")
         default_related_name = "standings"
+        indexes = [
+            models.Index(fields=["league", "-updated"], name="standing_latest_update_idx"),
+            # Ranks are read in this order, the window computing derived ones walks it
+            models.Index(
+                fields=["league", "-score", "-mvp_count", "created"],
+                name="standing_rank_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.player}'s standing in league {self.league}"
+
+    def get_rank(self):
+        """Rank of the standing, counted from the league standings when the league derives ranks."""
+
+        if self.score is None:
+            return None
+        if self.league.rank_mode != League.RANK_MODE.DERIVED:
+            return self.rank
+        return Standing.objects.filter(league_id=self.league_id).ahead_of(self).count() + 1
+
+
+class StandingSnapshot(models.Model):
+    """Standings of the league as of the last result registered in the round.
+
+    Ranked players are packed into parallel arrays of player ids, ranks and scores ordered by rank, so the whole league
+    history is read with a single row per round.
+    """
+
+    # Arrays are stored little-endian regardless of the platform
+    PLAYER_IDS_TYPE, RANKS_TYPE, SCORES_TYPE = "q", "i", "d"
+
+    league = models.ForeignKey(to=League, on_delete=models.CASCADE)
+    round = models.OneToOneField(to=Round, on_delete=models.CASCADE, related_name="standing_snapshot")
+    player_ids = models.BinaryField()
+    ranks = models.BinaryField()
+    scores = models.BinaryField()
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "standing_snapshot"
+        verbose_name = _("Standing snapshot")
+        verbose_name_plural = _("Standing snapshots")
+        default_related_name = "standing_snapshots"
+
+    def __str__(self):
+        return f"Standings snapshot of {self.round}"
+
+    @staticmethod
+    def pack(typecode, values):
+        packed = array.array(typecode, values)
+        if sys.byteorder == "big":
+            packed.byteswap()
+        return packed.tobytes()
+
+    @staticmethod
+    def unpack(typecode, data):
+        unpacked = array.array(typecode)
+        unpacked.frombytes(bytes(data))
+        if sys.byteorder == "big":
+            unpacked.byteswap()
+        return unpacked
+
+    @classmethod
+    def from_standings(cls, league, round_, standings, ranks=None):
+        """Build snapshot of the ranked standings, unranked ones (players without results yet) are skipped.
+
+        Ranks of leagues deriving them are passed as {standing id: rank}, stored ones are used otherwise.
+        """
+
+        if ranks is None:
+            ranks = {standing.pk: standing.rank for standing in standings}
+        ranked = sorted(
+            (standing for standing in standings if ranks.get(standing.pk) is not None), key=lambda s: ranks[s.pk]
+        )
+        return cls.from_rows(
+            league, round_, [(standing.player_id, ranks[standing.pk], standing.score) for standing in ranked]
+        )
+
+    @classmethod
+    def from_rows(cls, league, round_, rows):
+        """Build snapshot of (player id, rank, score) rows ordered by rank, e.g. streamed with `values_list`."""
+
+        player_ids = array.array(cls.PLAYER_IDS_TYPE)
+        ranks = array.array(cls.RANKS_TYPE)
+        scores = array.array(cls.SCORES_TYPE)
+        for player_id, rank, score in rows:
+            player_ids.append(player_id)
+            ranks.append(rank)
+            scores.append(score)
+        return cls(
+            league=league,
+            round=round_,
+            player_ids=cls.pack(cls.PLAYER_IDS_TYPE, player_ids),
+            ranks=cls.pack(cls.RANKS_TYPE, ranks),
+            scores=cls.pack(cls.SCORES_TYPE, scores),
+        )
+
+    def get_rows(self):
+        """Return (player id, rank, score) tuples ordered by rank."""
+
+        return list(
+            zip(
+                self.unpack(self.PLAYER_IDS_TYPE, self.player_ids),
+                self.unpack(self.RANKS_TYPE, self.ranks),
+                self.unpack(self.SCORES_TYPE, self.scores),
+            )
+        )
+
+
+class LeagueSummary(models.Model):
+    """Everything the league detail page shows but the viewer's own standing, as a single document per league.
+
+    Top standings, latest events and rounds are rebuilt within every transaction changing them (registration, joining
+    and leaving the league), the page renders them from unsaved instances.
+    """
+
+    TOP_STANDINGS = 3
+    LATEST_EVENTS = 5
+    LATEST_ROUNDS = 4
+
+    league = models.OneToOneField(to=League, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    document = models.JSONField(default=dict)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "league_summary"
+        verbose_name = _("League summary")
+        verbose_name_plural = _("League summaries")
+
+    def __str__(self):
+        return f"Summary of {self.league}"
+
+    @classmethod
+    def build(cls, league):
+        # Top of the tie-break order is read from the index, leagues deriving ranks have them in the very order
+        standings = (
+            Standing.objects.filter(league=league, score__isnull=False)
+            .select_related("player")
+            .order_by(*Standing.RANK_ORDERING)[: cls.TOP_STANDINGS]
+        )
+        derived = league.rank_mode == League.RANK_MODE.DERIVED
+        events = LeagueEvent.objects.filter(league=league).order_by("-id")[: cls.LATEST_EVENTS]
+        rounds = Round.objects.filter(league=league).select_related("mvp").order_by("-label")[: cls.LATEST_ROUNDS]
+        return cls(
+            league=league,
+            document={
+                "standings": [
+                    {
+                        "rank": rank if derived else standing.rank,
+                        "player_id": standing.player_id,
+                        "username": standing.player.username,
+                        "score": standing.score,
+                        "mvp_count": standing.mvp_count,
+                    }
+                    for rank, standing in enumerate(standings, 1)
+                ],
+                "events": [
+                    {"ev_type": event.ev_type, "context": event.context, "created": event.created.isoformat()}
+                    for event in events
+                ],
+                "rounds": [
+                    {
+                        "label": round_.label,
+                        "mvp_id": round_.mvp_id,
+                        "mvp": round_.mvp.username if round_.mvp_id else None,
+                        "mvp_score": round_.mvp_score,
+                    }
+                    for round_ in rounds
+                ],
+            },
+        )
+
+    @classmethod
+    def rebuild(cls, league):
+        """Rewrite the summary of the league, must be called within the transaction changing it."""
+
+        summary = cls.build(league)
+        summary.save()
+        return summary
+
+    def get_standings(self):
+        standings = []
+        for row in self.document["standings"]:
+            standing = Standing(
+                league=self.league,
+                player=User(pk=row["player_id"], username=row["username"]),
+                rank=row["rank"],
+                score=row["score"],
+                mvp_count=row["mvp_count"],
+            )
+            standing.current_rank = row["rank"]
+            standings.append(standing)
+        return standings
+
+    def get_events(self):
+        return [
+            LeagueEvent(
+                league=self.league,
+                ev_type=row["ev_type"],
+                context=row["context"],
+                created=datetime.fromisoformat(row["created"]),
+            )
+            for row in self.document["events"]
+        ]
+
+    def get_rounds(self):
+        return [
+            Round(
+                league=self.league,
+                label=row["label"],
+                mvp=User(pk=row["mvp_id"], username=row["mvp"]) if row["mvp_id"] else None,
+                mvp_score=row["mvp_score"],
+            )
+            for row in self.document["rounds"]
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of an idempotent request, table size is bounded by pruning on every write.
+
+    Keys are picked by clients, so they're unique per player and origin of the submission only.
+    """
+
+    key = models.CharField(max_length=128)
+    player = models.CharField(max_length=150, default="")
+    origin = models.CharField(max_length=32, default="")
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = "idempotency_key"
+        verbose_name = _("Idempotency key")
+        verbose_name_plural = _("Idempotency keys")
+        unique_together = ("key", "player", "origin")
+
+    def __str__(self):
+        return self.key
+
+    @classmethod
+    def store(cls, key, status_code, response, player="", origin=""):
+        obj = cls.objects.create(key=key, player=player, origin=origin, status_code=status_code, response=response)
+        expired = timezone.now() - timedelta(seconds=settings.RANKIE_IDEMPOTENCY_KEY_TTL)
+        cls.objects.filter(Q(created__lt=expired) | Q(pk__lte=obj.pk - settings.RANKIE_IDEMPOTENCY_KEY_LIMIT)).delete()
+        return obj
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class GameResultCursorPagination(CursorPagination):
+    # Primary key is unique and indexed, hence cursor stays stable and cheap while new results keep coming
+    ordering = "-id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
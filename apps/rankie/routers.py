@@ -0,0 +1,67 @@
+"""Routing of reads to an optional `replica` database.
+
+Reads go to the replica only when they're allowed for the current context, i.e. a read-only request (see
+`ReplicaMiddleware`), everything else (management commands, workers, scheduled jobs) keeps using the primary. Reads
+within a transaction of the primary and any read after a write use the primary, so registration in `core.py` always
+sees its own locks and writes. Writes are told by the statements executed on the primary, the router is also asked
+for the database of unsaved instances that are never written.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = "replica"
+
+replica_reads = ContextVar("replica_reads", default=False)
+
+
+def has_replica():
+    return REPLICA in connections.databases
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Allow (or forbid) reads from the replica within the block."""
+
+    token = replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def track_writes(execute, sql, params, many, context):
+    # Read your writes: the rest of the context reads from the primary
+    if replica_reads.get() and sql.lstrip()[:6].upper() != "SELECT":
+        replica_reads.set(False)
+    return execute(sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    """`connection_created` receiver tracking writes of the primary.
+
+    Connections are opened lazily, possibly within a `connection.execute_wrapper()` block, the tracking is inserted as
+    the outermost wrapper so that the block doesn't pop it on exit.
+    """
+
+    if connection.alias == DEFAULT_DB_ALIAS and track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, track_writes)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not replica_reads.get() or not has_replica() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        # Related objects are read from the database their instance came from
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica holds the same rows as the primary
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}
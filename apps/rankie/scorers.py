@@ -1,21 +1,44 @@
 import re
 import ast
 import operator as op
+import threading
 
 from abc import ABC, abstractmethod
 from pydoc import locate
 from typing import Dict, Callable
 from collections.abc import Iterable
 
+from cachetools import TTLCache
+
 from apps.rankie.models import Game, Round, League, GameRule, Standing, GameResult, RoundResult
+from apps.rankie.metrics import SCORER_CACHE
+
+# Scorers are stateless, so they are built once per version of the rule and its game (parser regex comes from the
+# game); TTL only bounds how long the versions nobody asks for anymore are kept
+SCORERS = TTLCache(maxsize=256, ttl=300)
+SCORERS_LOCK = threading.Lock()
 
 
 def get_scorer(obj) -> "BaseScorer":
     """Helper function for creating scorer instance."""
 
     if isinstance(obj, GameRule):
-        parser_regex = obj.py_kwargs.pop("parser_regex", obj.game.parser_regex)
-        return locate(obj.py_class)(parser_regex=parser_regex, **obj.py_kwargs)  # noqa
+        key = (obj.pk, obj.updated, obj.game.updated)
+        if obj.pk is not None:
+            with SCORERS_LOCK:
+                scorer = SCORERS.get(key)
+            SCORER_CACHE.inc(result="miss" if scorer is None else "hit")
+            if scorer is not None:
+                return scorer
+
+        # Rule's kwargs are copied, the instance might be used again
+        py_kwargs = dict(obj.py_kwargs or {})
+        parser_regex = py_kwargs.pop("parser_regex") if "parser_regex" in py_kwargs else obj.game.parser_regex
+        scorer = locate(obj.py_class)(parser_regex=parser_regex, **py_kwargs)  # noqa
+        if obj.pk is not None:
+            with SCORERS_LOCK:
+                SCORERS[key] = scorer
+        return scorer
     elif isinstance(obj, League):
         return get_scorer(obj.rule)
     elif isinstance(obj, Round):
@@ -28,6 +51,10 @@ def get_scorer(obj) -> "BaseScorer":
         raise TypeError(f"Object of type {type(obj)} is not supported")
 
 
+class UnparsableResult(ValueError):
+    """Game result text doesn't match the patterns of the scorer."""
+
+
 class BaseScorer(ABC):
     def __init__(self, parser_regex: str, aggregator: Callable[[Iterable[float]], float] = sum):
         self.pattern = re.compile(parser_regex)
@@ -35,6 +62,8 @@ class BaseScorer(ABC):
 
     def parse_game_result(self, result: GameResult):
         match = self.pattern.search(result.text)
+        if match is None:
+            raise UnparsableResult("Game result doesn't match the parser regex of the game")
         groups = match.groupdict()
         for group in Game.RE_GROUPS:
             if group not in groups:
@@ -81,7 +110,10 @@ class ExpressionScorer(BaseScorer):
 
     def get_round_score(self, result: GameResult) -> float:
         raw_score = self.parse_game_result(result)[Game.RE_SCORE_GROUP]
-        variables = self.vars_regex_pattern.search(raw_score).groupdict()
+        match = self.vars_regex_pattern.search(raw_score)
+        if match is None:
+            raise UnparsableResult("Score of the game result doesn't match the variables regex of the rule")
+        variables = match.groupdict()
         variables = {
             k: float(v) if v.replace(".", "", 1).isdigit() else self.not_numeric_default for k, v in variables.items()
         }
@@ -12,3 +12,19 @@ class GameResultModelSerializer(serializers.ModelSerializer):
     class Meta:
         model = GameResult
         fields = "__all__"
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """Sparse fieldsets support, only given fields are kept when provided."""
+
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class GameSerializer(serializers.ModelSerializer):
+    detect_regex = serializers.CharField(source="get_detect_regex", read_only=True)
+
+    class Meta:
+        model = Game
+        fields = ("label", "name", "url", "detect_regex", "updated")
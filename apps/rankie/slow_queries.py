@@ -0,0 +1,91 @@
+"""Slow query log: every query is timed, a sample of those above the threshold is logged with its EXPLAIN plan.
+
+The wrapper is installed on every new database connection when `RANKIE_SLOW_QUERY_MS` is set, records go to the
+`apps.rankie.slow_queries` logger as JSON (see `LOGGING` for the rotating file they're written to).
+"""
+import sys
+import json
+import time
+import random
+import logging
+
+from django.db import transaction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+# Modules of execute wrappers, which might run around this one
+WRAPPER_MODULES = (__name__, "apps.rankie.routers", "apps.rankie.metrics")
+
+
+def get_caller():
+    """Return `module.function:line` of the innermost project frame, the view or core function running the query."""
+
+    frame = sys._getframe()
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("apps.") and module not in WRAPPER_MODULES:
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    def __init__(self, connection, threshold_ms, sample_rate=1.0):
+        self.connection = connection
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= self.threshold_ms and random.random() < self.sample_rate:
+            self.log(sql, params, many, elapsed_ms)
+        return result
+
+    def log(self, sql, params, many, elapsed_ms):
+        record = {
+            "duration_ms": round(elapsed_ms, 3),
+            "alias": self.connection.alias,
+            "caller": get_caller(),
+            "sql": sql,
+            # Batches of executemany are neither kept nor explained
+            "params": None if many else [str(param) for param in params or ()],
+            "plan": None if many else self.explain(sql, params),
+        }
+        logger.warning(json.dumps(record, default=str), extra={"query": record})
+
+    def explain(self, sql, params):
+        if not sql.lstrip().upper().startswith(EXPLAINABLE) or self.connection.needs_rollback:
+            return None
+        self.explaining = True
+        try:
+            # Savepoint keeps the transaction usable if EXPLAIN fails (PostgreSQL aborts the whole transaction)
+            with transaction.atomic(using=self.connection.alias):
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"{self.connection.ops.explain_query_prefix()} {sql}", params)
+                    return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+        except Exception as exc:  # noqa
+            return f"EXPLAIN failed: {exc}"
+        finally:
+            self.explaining = False
+
+
+def install(sender, connection, **kwargs):
+    """`connection_created` receiver installing the slow query log on the connection.
+
+    The log is inserted as the outermost wrapper, `connection.execute_wrapper()` blocks that are open meanwhile pop
+    the last one on exit.
+    """
+
+    if settings.RANKIE_SLOW_QUERY_MS is None:
+        return
+    if not any(isinstance(wrapper, SlowQueryLog) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.insert(
+            0, SlowQueryLog(connection, settings.RANKIE_SLOW_QUERY_MS, settings.RANKIE_SLOW_QUERY_SAMPLE_RATE)
+        )
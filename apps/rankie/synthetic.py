@@ -0,0 +1,235 @@
+"""Synthetic leagues for benchmarks, profiling and seeding.
+
+Rows are created with chunked `bulk_create` and kept consistent with what `register_game_result` would produce: rounds
+have their mvp and statistics, standings have scores aggregated by sum, mvp counts and ranks in tie-break order.
+"""
+import os
+import tempfile
+
+from datetime import timedelta
+from operator import itemgetter
+from collections import defaultdict
+
+from django.db import connection
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from .models import Game, Round, League, GameRule, Standing, GameResult, RoundResult
+
+User = get_user_model()
+
+
+def wordle_text(template):
+    tries, cum_weights = ["1", "2", "3", "4", "5", "6", "X"], [1, 6, 26, 56, 81, 93, 100]
+
+    def make_text(round_label, rng):
+        value = rng.choices(tries, cum_weights=cum_weights)[0]
+        return template.format(round=round_label, value=value), 0 if value == "X" else 6 / int(value)
+
+    return make_text
+
+
+def reversle_text(round_label, rng):
+    seconds = f"{rng.lognormvariate(4.2, 0.5):.2f}"
+    return f"Reversle #{round_label} {seconds}s", 300 / float(seconds) if float(seconds) else 0
+
+
+# Games with the parser regexes used in production and rules scoring them, `text` makes result text and its score
+GAMES = {
+    "wordle_eng": {
+        "game": {
+            "name": "Wordle",
+            "url": "https://www.nytimes.com/games/wordle/index.html",
+            "parser_regex": r"(?P<game>Wordle) (?P<round>[0-9]+) (?P<score>[\s\S]*)",
+            "detect_regex": r"^Wordle",
+        },
+        "rule": {
+            "name": "Default",
+            "py_class": "apps.rankie.scorers.ExpressionScorer",
+            "py_kwargs": {"vars_regex": "(?P<value>[0-9X]+)/(?P<total>[0-9]+)", "expression": "{total} / {value}"},
+        },
+        "text": wordle_text("Wordle {round} {value}/6"),
+    },
+    "wordle_ru": {
+        "game": {
+            "name": "Wordle (RU)",
+            "url": "https://wordle.belousov.one/",
+            "parser_regex": r"Игра (?P<game>[ A-zА-я\)\(]+) День #(?P<round>[0-9]+) (?P<score>[\s\S]*)",
+            "detect_regex": r"Wordle \(RU\)",
+        },
+        "rule": {
+            "name": "Default",
+            "py_class": "apps.rankie.scorers.ExpressionScorer",
+            "py_kwargs": {"vars_regex": "(?P<value>[0-9X]+)/(?P<total>[0-9]+)", "expression": "{total} / {value}"},
+        },
+        "text": wordle_text("Игра Wordle (RU) День #{round} {value}/6"),
+    },
+    "reversle_eng": {
+        "game": {
+            "name": "Reversle",
+            "url": "https://reversle.net/",
+            "parser_regex": r"(?P<game>\w+) #(?P<round>[0-9]+) (?P<score>[\s\S]*)",
+            "detect_regex": r"^Reversle",
+        },
+        "rule": {
+            "name": "Default",
+            "py_class": "apps.rankie.scorers.ExpressionScorer",
+            "py_kwargs": {"vars_regex": "(?P<value>[0-9.]+)s", "expression": "300 / {value}"},
+        },
+        "text": reversle_text,
+    },
+}
+DEFAULT_GAME = "wordle_eng"
+
+
+def get_or_create_game(label=DEFAULT_GAME):
+    spec = GAMES[label]
+    game, _ = Game.objects.get_or_create(label=label, defaults=spec["game"])
+    rule, _ = GameRule.objects.get_or_create(game=game, name=spec["rule"]["name"], defaults=spec["rule"])
+    return game, rule
+
+
+def make_result_text(round_label, rng, game_label=DEFAULT_GAME):
+    """Return result text of the round and its score."""
+
+    return GAMES[game_label]["text"](round_label, rng)
+
+
+def create_players(count, prefix="player", chunk_size=2000):
+    User.objects.bulk_create((User(username=f"{prefix}{i}") for i in range(count)), batch_size=chunk_size)
+    return list(User.objects.filter(username__startswith=prefix).order_by("pk"))
+
+
+def create_results(game, players, round_labels, rng, activity=None, chunk_size=2000):
+    """Create game results of the players in the rounds, a player skips a round with `1 - activity[player.pk]` chance.
+
+    Returns {(player id, round label): (game result id, score)}.
+    """
+
+    scores = {}
+    game_results = []
+    for round_label in round_labels:
+        for player in players:
+            if activity is not None and rng.random() >= activity[player.pk]:
+                continue
+            text, score = make_result_text(round_label, rng, game.label)
+            scores[(player.pk, text)] = (round_label, score)
+            game_results.append(
+                GameResult(player_id=player.pk, game_id=game.pk, origin=GameResult.ORIGIN.CUSTOM, text=text)
+            )
+    GameResult.objects.bulk_create(game_results, batch_size=chunk_size)
+
+    results = {}
+    # Primary keys are not returned by bulk insert on every backend, fetch them back
+    for pk, player_id, text in GameResult.objects.filter(game=game).values_list("pk", "player_id", "text").iterator():
+        if (player_id, text) in scores:
+            round_label, score = scores[(player_id, text)]
+            results[(player_id, round_label)] = (pk, score)
+    return results
+
+
+def create_league(rule, owner, label, players, round_labels, results, public=True, chunk_size=2000):
+    """Create the league with rounds, round results and standings built from already created game results.
+
+    Players' order stands for the order their results came in.
+    """
+
+    league = League.objects.create(
+        label=label,
+        name=label,
+        owner=owner,
+        rule=rule,
+        public=public,
+        start_dt=timezone.now() - timedelta(days=len(round_labels) + 1),
+    )
+    player_ids = [player.pk for player in players]
+
+    rounds = []
+    round_results = {}
+    scores = defaultdict(float)
+    mvp_counts = defaultdict(int)
+    for round_label in round_labels:
+        round_ = Round(league=league, label=round_label)
+        rounds.append(round_)
+        played = [(player_id, *results.get((player_id, round_label), (None, None))) for player_id in player_ids]
+        played = round_results[round_label] = [row for row in played if row[1] is not None]
+        if not played:
+            continue
+        # Statistics are set before insert, updating them afterwards costs more than the inserts themselves
+        round_.set_score_stats(score for _, _, score in played)
+        round_.mvp_id = max(played, key=itemgetter(2))[0]
+        mvp_counts[round_.mvp_id] += 1
+        for player_id, _, score in played:
+            scores[player_id] += score
+
+    Round.objects.bulk_create(rounds, batch_size=chunk_size)
+    # Primary keys are not returned by bulk insert on every backend
+    round_ids = dict(Round.objects.filter(league=league).values_list("label", "pk"))
+    RoundResult.objects.bulk_create(
+        (
+            RoundResult(round_id=round_ids[round_label], player_id=player_id, score=score, raw_id=game_result_id)
+            for round_label, played in round_results.items()
+            for player_id, game_result_id, score in played
+        ),
+        batch_size=chunk_size,
+    )
+
+    standings = [
+        Standing(league=league, player_id=player_id, score=scores.get(player_id), mvp_count=mvp_counts[player_id])
+        for player_id in player_ids
+    ]
+    # Same tie-break order as the registration uses; standings are created in this order, so `created` agrees
+    ranked = sorted(
+        (standing for standing in standings if standing.score is not None),
+        key=lambda standing: (-standing.score, -standing.mvp_count),
+    )
+    for rank, standing in enumerate(ranked, 1):
+        standing.rank = rank
+    Standing.objects.bulk_create(ranked + [s for s in standings if s.score is None], batch_size=chunk_size)
+    return league
+
+
+def create_synthetic_leagues(players, rounds, leagues_per_player, rng, chunk_size=2000):
+    """Create `leagues_per_player` leagues of the same game every player competes in, each with `rounds` rounds."""
+
+    game, rule = get_or_create_game()
+    players = create_players(players, chunk_size=chunk_size)
+    round_labels = [str(i) for i in range(1, rounds + 1)]
+    results = create_results(game, players, round_labels, rng, chunk_size=chunk_size)
+    return [
+        create_league(rule, players[0], f"league{i}", players, round_labels, results, chunk_size=chunk_size)
+        for i in range(leagues_per_player)
+    ]
+
+
+def create_game_results(game, player_ids, round_labels, rng, jitter=0):
+    """Create results of every player in the rounds and return them in the order they're played.
+
+    With jitter results of a round are mixed with the ones of the next `jitter` rounds, as if they were played at once.
+    """
+
+    last_pk = GameResult.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    keyed = []
+    for i, round_label in enumerate(round_labels):
+        for player_id in player_ids:
+            text, _ = make_result_text(round_label, rng, game.label)
+            game_result = GameResult(player_id=player_id, game_id=game.pk, origin=GameResult.ORIGIN.CUSTOM, text=text)
+            keyed.append((i + rng.random() * jitter, game_result))
+    GameResult.objects.bulk_create(game_result for _, game_result in keyed)
+    # Primary keys are not returned by bulk insert on every backend, results are fetched back in the same order
+    order = {(game_result.player_id, game_result.text): key for key, game_result in keyed}
+    return sorted(
+        GameResult.objects.filter(pk__gt=last_pk).select_related("player", "game"),
+        key=lambda game_result: order[(game_result.player_id, game_result.text)],
+    )
+
+
+def create_test_db(name):
+    """Create a throwaway database for benchmarks, returns the old name to pass to `destroy_test_db`.
+
+    SQLite one is a file rather than in-memory, so other threads and processes share it and wait for locks.
+    """
+
+    if connection.vendor == "sqlite" and not connection.settings_dict["TEST"]["NAME"]:
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.gettempdir(), f"{name}.sqlite3")
+    return connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
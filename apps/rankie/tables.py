@@ -22,6 +22,7 @@ class LeagueTable(tables.Table):
 
 
 class LeagueStandingTable(tables.Table):
+    rank = tables.Column(accessor="current_rank")
     mvp_count = tables.Column(verbose_name="MVPs", attrs={"td": {"class": "icon"}})
 
     class Meta:
@@ -38,15 +39,15 @@ class LeagueStandingTable(tables.Table):
 
 class LeagueRoundTable(tables.Table):
     mvp = tables.Column(verbose_name="MVP")
-    score = tables.Column(empty_values=())
+    score = tables.Column(accessor="mvp_score")
 
     class Meta:
         model = Round
         fields = ("label", "mvp", "score")
         orderable = False
 
-    def render_score(self, record):
-        return round(record.mvp_results[0].score, 3)
+    def render_score(self, value):
+        return round(value, 3)
 
     def render_label(self, record, value):
         return format_html(
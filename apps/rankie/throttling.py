@@ -0,0 +1,109 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .models import GameResult
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket throttle, rates are `<capacity>/<period>` strings, e.g. `30/min` allows bursts of 30 requests and
+    refills one token every 2 seconds.
+
+    Buckets are kept in `RANKIE_THROTTLE_CACHE` cache, local memory or database one for sharing limits between
+    processes. Read-modify-write of a bucket is not atomic, so concurrent requests might overshoot the limit slightly.
+    """
+
+    PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+    scope = None
+
+    def __init__(self):
+        self.cache = caches[settings.RANKIE_THROTTLE_CACHE]
+        self.capacity, self.refill_rate = self.parse_rate(settings.RANKIE_THROTTLE_RATES[self.scope])
+        self.wait_seconds = None
+
+    @classmethod
+    def parse_rate(cls, rate):
+        capacity, period = rate.split("/")
+        capacity = int(capacity)
+        return capacity, capacity / cls.PERIODS[period[0]]
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    # noinspection PyMethodMayBeStatic
+    def get_cost(self, request, view):
+        return 1
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        return self.consume(key, self.get_cost(request, view))
+
+    def consume(self, key, cost=1):
+        """Take `cost` tokens from the bucket of the key, returns whether it had enough of them."""
+
+        key = f"throttle_{self.scope}_{key}"
+        now = time.time()
+        tokens, timestamp = self.cache.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - timestamp) * self.refill_rate)
+        # Bucket is full again once it's expired
+        timeout = self.capacity / self.refill_rate
+
+        if tokens < cost:
+            self.wait_seconds = (cost - tokens) / self.refill_rate
+            self.cache.set(key, (tokens, now), timeout)
+            return False
+
+        self.cache.set(key, (tokens - cost, now), timeout)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class SubmissionPlayerThrottle(TokenBucketThrottle):
+    """Limit game results submissions of a single player."""
+
+    scope = "player"
+
+    def get_cache_key(self, request, view):
+        if view.action == "register":
+            return (
+                GameResult.objects.filter(pk=view.kwargs[view.lookup_field])
+                .values_list("player__username", flat=True)
+                .first()
+            )
+        if isinstance(request.data, dict):
+            return request.data.get("player")
+        # Items of batches are charged one by one, see `allow_item`
+        return None
+
+    def allow_item(self, item):
+        """Charge a single item of a batch to the bucket of its player."""
+
+        player = item.get("player") if isinstance(item, dict) else None
+        return not player or self.consume(player)
+
+
+class SubmissionOriginThrottle(TokenBucketThrottle):
+    """Limit game results submissions coming from a single client, the authenticated user or the client address.
+
+    The `origin` field of submissions is told by the client itself, so it doesn't pick the bucket.
+    """
+
+    scope = "origin"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f"user_{request.user.pk}"
+        return self.get_ident(request)
+
+    def get_cost(self, request, view):
+        if isinstance(request.data, list):
+            return max(len(request.data), 1)
+        return 1
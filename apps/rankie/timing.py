@@ -0,0 +1,50 @@
+import time
+import logging
+
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Spans:
+    """Wall-clock timing of the phases of an operation, logged as a single logfmt record once the operation is done.
+
+    Spans of the same name (and scope) accumulate, scoped spans and tags are prefixed with the scope, e.g.
+    `league.3.rank_shift_ms`. Nothing is measured when the logger is disabled for INFO.
+    """
+
+    def __init__(self, operation, **tags):
+        self.operation = operation
+        self.enabled = logger.isEnabledFor(logging.INFO)
+        self.fields = dict(tags)
+        self.started = time.perf_counter()
+
+    @staticmethod
+    def get_key(name, scope):
+        return f"{scope}.{name}" if scope else name
+
+    def tag(self, scope=None, **tags):
+        if self.enabled:
+            for name, value in tags.items():
+                self.fields[self.get_key(name, scope)] = value
+
+    @contextmanager
+    def span(self, name, scope=None):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            key = self.get_key(f"{name}_ms", scope)
+            self.fields[key] = self.fields.get(key, 0) + (time.perf_counter() - started) * 1000
+
+    def emit(self):
+        if not self.enabled:
+            return
+        fields = {"op": self.operation, "total_ms": (time.perf_counter() - self.started) * 1000, **self.fields}
+        message = " ".join(
+            f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in fields.items()
+        )
+        logger.info(message, extra={"timing": fields})
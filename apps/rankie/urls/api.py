@@ -6,6 +6,8 @@ import apps.rankie.views as views
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
 router.register(r"gameresults", views.GameResultViewSet, basename="gameresults")
+router.register(r"games", views.GameViewSet, basename="games")
+router.register(r"leagues", views.LeagueViewSet, basename="leagues")
 
 # The API URLs are now determined automatically by the router.
 app_name = "rankie"
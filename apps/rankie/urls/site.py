@@ -8,6 +8,7 @@ urlpatterns = [
     path("", views.index, name="home"),
     path("", views.index, name="profile-detail"),
     path("", views.index, name="send-result"),
+    path("metrics", views.metrics, name="metrics"),
     path("leagues/", views.LeagueListView.as_view(), name="league-list"),
     path("leagues/<slug:label>/", views.LeagueDetailedView.as_view(), name="league-detail"),
     path("leagues/<slug:label>/standings/", views.LeagueStandingsView.as_view(), name="league-standings"),
@@ -1,36 +1,406 @@
+import re
+import logging
+
+from hashlib import md5
+
 import django_tables2 as tables
 
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import status, viewsets
-from django.db.models import F, Q, Prefetch
+from django.db.models import F, Q, OuterRef, Subquery
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.contrib.auth import get_user_model
 from django.views.generic import DetailView
 from django_filters.views import FilterView
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.decorators import action
+from rest_framework.exceptions import Throttled
+from django.views.decorators.http import condition
+from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth.decorators import login_required
 
 from .core import register_game_result
-from .models import Round, League, Standing, GameResult, LeagueEvent, RoundResult
+from .models import (
+    Game,
+    Round,
+    League,
+    Standing,
+    GameResult,
+    LeagueEvent,
+    RoundResult,
+    LeagueSummary,
+    IdempotencyKey,
+    StandingSnapshot,
+)
 from .tables import LeagueTable, LeagueEventTable, LeagueRoundTable, RoundResultTable, LeagueStandingTable
-from .filters import LeagueFilter
-from .serializers import GameResultModelSerializer
+from .exports import EXPORTS, CONTENT_TYPES, EXPORT_FORMATS, iter_export, iter_ndjson
+from .filters import LeagueFilter, GameResultFilter
+from .metrics import REGISTRY, SUBMISSIONS
+from .scorers import UnparsableResult
+from .pagination import GameResultCursorPagination
+from .throttling import SubmissionOriginThrottle, SubmissionPlayerThrottle
+from .serializers import GameSerializer, GameResultModelSerializer
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_OUTCOMES = {
+    status.HTTP_201_CREATED: "created",
+    status.HTTP_400_BAD_REQUEST: "invalid",
+    status.HTTP_409_CONFLICT: "duplicate",
+    status.HTTP_429_TOO_MANY_REQUESTS: "throttled",
+    status.HTTP_503_SERVICE_UNAVAILABLE: "retry",
+}
 
 
 def index(request):
     return render(request, "rankie/index.html")
 
 
+def metrics(request):
+    token = settings.RANKIE_METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 class GameResultViewSet(viewsets.ModelViewSet):
-    queryset = GameResult.objects.all()
+    # Sparse fieldsets: `?fields=id,player,text`, lists and exports leave out heavy result text by default
+    LIST_FIELDS = ("id", "player", "game", "origin", "created")
+    # Related fields are exported by their slugs
+    EXPORT_LOOKUPS = {"player": "player__username", "game": "game__label"}
+    ALREADY_REGISTERED = {"code": "already_registered", "detail": "Game result is already registered"}
+    SUBMIT_FAILED = {"code": "error", "detail": "Game result couldn't be registered"}
+    RETRY_LATER = {"code": "retry", "detail": "Game result couldn't be registered at the moment, retry later"}
+    SUBMIT_ATTEMPTS = 3
+    # See `ReplicaMiddleware`, actions writing on safe requests turn it off
+    replica_reads = True
+    SUBMIT_BATCH_LIMIT = 100
+
+    queryset = GameResult.objects.select_related("player", "game")
     serializer_class = GameResultModelSerializer
+    pagination_class = GameResultCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = GameResultFilter
+
+    def get_throttles(self):
+        if self.action in ("create", "register", "submit", "submit_batch"):
+            return [SubmissionPlayerThrottle(), SubmissionOriginThrottle()]
+        return super().get_throttles()
+
+    def get_fields(self):
+        all_fields = [field.name for field in GameResult._meta.fields]
+        if "fields" in self.request.query_params:
+            fields = self.request.query_params["fields"].split(",")
+            return [field for field in all_fields if field in fields] or list(self.LIST_FIELDS)
+        if self.action in ("list", "export"):
+            return list(self.LIST_FIELDS)
+        return None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_fields()
+        if fields is not None and "text" not in fields:
+            queryset = queryset.defer("text")
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    @action(methods=["GET"], detail=False)
+    def export(self, request, *args, **kwargs):
+        """Stream filtered results as newline delimited json without loading the whole table into memory."""
+
+        fields = self.get_fields()
+        rows = (
+            self.filter_queryset(GameResult.objects.all())
+            .order_by("id")
+            .values_list(*[self.EXPORT_LOOKUPS.get(field, field) for field in fields])
+            .iterator(chunk_size=2000)
+        )
+        response = StreamingHttpResponse(
+            iter_ndjson(dict(zip(fields, row)) for row in rows), content_type="application/x-ndjson"
+        )
+        response["Content-Disposition"] = 'attachment; filename="gameresults.ndjson"'
+        return response
 
-    @action(methods=["GET"], detail=True)
+    # Registration writes on a safe request, the result is read from the primary
+    @action(methods=["GET"], detail=True, replica_reads=False)
     def register(self, request, *args, **kwargs):
         game_result = self.get_object()
-        register_game_result(game_result)
-        return Response(status=status.HTTP_200_OK)
+        registrations = register_game_result(game_result)
+        return Response(registrations, status=status.HTTP_200_OK)
+
+    @action(methods=["POST"], detail=False)
+    def submit(self, request, *args, **kwargs):
+        """Create and register game result within a single transaction.
+
+        Requests with the same `Idempotency-Key` header get the stored response back without doing the work twice.
+        """
+
+        status_code, data, replayed = self.perform_submit(request.data, request.headers.get("Idempotency-Key"))
+        self.count_submission(request.data, status_code, replayed)
+        return Response(data, status=status_code, headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+    @action(methods=["POST"], detail=False, url_path="submit/batch")
+    def submit_batch(self, request, *args, **kwargs):
+        """Submit a list of game results, each one is processed as a separate idempotent submit.
+
+        Every item carries its own `idempotency_key`, items are processed in order and get their own status.
+        """
+
+        if not self.is_valid_batch(request.data):
+            return Response(
+                {"code": "invalid", "detail": f"Expected a list of at most {self.get_batch_limit()} game results"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = []
+        player_throttle = SubmissionPlayerThrottle()
+        for item in request.data:
+            key = item.pop("idempotency_key", None) if isinstance(item, dict) else None
+            if player_throttle.allow_item(item):
+                try:
+                    status_code, data, replayed = self.perform_submit(item, key)
+                except Exception:  # noqa
+                    # Item's transaction is rolled back, the rest of the batch is processed anyway
+                    logger.exception(f"Failed to submit game result of batch, idempotency key: {key}")
+                    status_code, data, replayed = status.HTTP_500_INTERNAL_SERVER_ERROR, self.SUBMIT_FAILED, False
+            else:
+                # Player is throttled the same way as by a single submit, the client retries the item later
+                throttled = Throttled(player_throttle.wait())
+                data = {"code": throttled.default_code, "detail": throttled.detail, "wait": throttled.wait}
+                status_code, replayed = status.HTTP_429_TOO_MANY_REQUESTS, False
+            self.count_submission(item, status_code, replayed)
+            results.append({"idempotency_key": key, "status": status_code, "replayed": replayed, "data": data})
+        return Response(results, status=status.HTTP_200_OK)
+
+    def get_batch_limit(self):
+        # Batch costs a token of the client's bucket per item, a larger one would never pass
+        (origin_capacity, _) = SubmissionOriginThrottle.parse_rate(settings.RANKIE_THROTTLE_RATES["origin"])
+        return min(self.SUBMIT_BATCH_LIMIT, origin_capacity)
+
+    def is_valid_batch(self, data):
+        return isinstance(data, list) and len(data) <= self.get_batch_limit()
+
+    def check_throttles(self, request):
+        # Invalid batches are rejected without being charged
+        if self.action == "submit_batch" and not self.is_valid_batch(request.data):
+            return
+        super().check_throttles(request)
+
+    def throttled(self, request, wait):
+        if self.action in ("submit", "submit_batch"):
+            items = request.data if isinstance(request.data, list) else [request.data]
+            for item in items:
+                self.count_submission(item, status.HTTP_429_TOO_MANY_REQUESTS)
+        super().throttled(request, wait)
+
+    @staticmethod
+    def count_submission(data, status_code, replayed=False):
+        origin = data.get("origin") if isinstance(data, dict) else None
+        outcome = "replayed" if replayed else SUBMISSION_OUTCOMES.get(status_code, "error")
+        SUBMISSIONS.inc(origin=origin if origin in GameResult.ORIGIN.values else "unknown", outcome=outcome)
+
+    def perform_submit(self, data, key=None):
+        """Return status code, response data and whether the response is replayed by idempotency key.
+
+        Keys are scoped by the player and origin of the submission, different clients may pick the same key.
+        """
+
+        scope = {field: str(data.get(field) or "") if isinstance(data, dict) else "" for field in ("player", "origin")}
+        if key and (stored := IdempotencyKey.objects.filter(key=key, **scope).first()):
+            return stored.status_code, stored.response, True
+
+        serializer = self.get_serializer(data=data)
+        if not serializer.is_valid():
+            errors = serializer.errors.get(api_settings.NON_FIELD_ERRORS_KEY, [])
+            if any(error.code == "unique" for error in errors):
+                return status.HTTP_409_CONFLICT, self.ALREADY_REGISTERED, False
+            return status.HTTP_400_BAD_REQUEST, {"code": "invalid", "detail": serializer.errors}, False
+
+        values = serializer.validated_data
+        if not re.search(values["game"].parser_regex, values["text"]):
+            return status.HTTP_400_BAD_REQUEST, self.get_unparsable_data("Game result doesn't match the game"), False
+
+        for _ in range(self.SUBMIT_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    game_result = GameResult.objects.create(**values)
+                    data = {"id": game_result.id, "registrations": register_game_result(game_result)}
+                    if key:
+                        IdempotencyKey.store(key, status.HTTP_201_CREATED, data, **scope)
+            except UnparsableResult as exc:
+                # Scorer of some league parses the result its own way, nothing is saved
+                return status.HTTP_400_BAD_REQUEST, self.get_unparsable_data(str(exc)), False
+            except IntegrityError:
+                # Concurrent request with the same key or result has won the race
+                if key and (stored := IdempotencyKey.objects.filter(key=key, **scope).first()):
+                    return stored.status_code, stored.response, True
+                if GameResult.objects.filter(
+                    player=values["player"], game=values["game"], text=values["text"]
+                ).exists():
+                    return status.HTTP_409_CONFLICT, self.ALREADY_REGISTERED, False
+                # Round created by a concurrent registration of another result, registration is retried
+                continue
+            return status.HTTP_201_CREATED, data, False
+
+        return status.HTTP_503_SERVICE_UNAVAILABLE, self.RETRY_LATER, False
+
+    @staticmethod
+    def get_unparsable_data(detail):
+        return {"code": "unparsable", "detail": detail}
+
+
+class GameViewSet(viewsets.ReadOnlyModelViewSet):
+    """Games with their detection patterns, clients sync them to tell the game from the result text locally."""
+
+    queryset = Game.objects.order_by("id")
+    serializer_class = GameSerializer
+    lookup_field = "label"
+
+
+class LeagueViewSet(viewsets.GenericViewSet):
+    queryset = League.objects.all()
+    lookup_field = "label"
+
+    def get_queryset(self):
+        """Public leagues and the ones the user plays in or owns, others aren't found."""
+
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.filter(public=True)
+        joined = Standing.objects.filter(player=user).values("league_id")
+        return queryset.filter(Q(public=True) | Q(owner=user) | Q(pk__in=joined))
+
+    @action(methods=["GET"], detail=True, url_path=f"export/(?P<kind>{'|'.join(EXPORTS)})")
+    def export(self, request, kind, *args, **kwargs):
+        """Stream standings, rounds or round results of the league as `?output=csv|ndjson`, `&gzip=1` compresses it."""
+
+        return self.get_export_response(kind, self.get_object())
+
+    @action(methods=["GET"], detail=False, url_path=f"export/(?P<kind>{'|'.join(EXPORTS)})")
+    def export_all(self, request, kind, *args, **kwargs):
+        """Stream standings, rounds or round results of all the leagues visible to the user."""
+
+        return self.get_export_response(kind, leagues=self.get_queryset())
+
+    @action(methods=["GET"], detail=True, url_path="rank-history")
+    def rank_history(self, request, *args, **kwargs):
+        """Rank and score of every player after each round, read from standing snapshots (one row per round)."""
+
+        league = self.get_object()
+        snapshots = sorted(
+            StandingSnapshot.objects.filter(league=league).values_list("round__label", "player_ids", "ranks", "scores"),
+            key=lambda snapshot: Round.get_label_key(snapshot[0]),
+        )
+        history = {}
+        for i, (round_label, *arrays) in enumerate(snapshots):
+            snapshot = StandingSnapshot(player_ids=arrays[0], ranks=arrays[1], scores=arrays[2])
+            for player_id, rank, score in snapshot.get_rows():
+                ranks, scores = history.setdefault(player_id, ([None] * len(snapshots), [None] * len(snapshots)))
+                ranks[i], scores[i] = rank, score
+
+        usernames = dict(User.objects.filter(pk__in=history).values_list("pk", "username"))
+        return Response(
+            {
+                "rounds": [snapshot[0] for snapshot in snapshots],
+                "players": [
+                    {"username": usernames.get(player_id), "ranks": ranks, "scores": scores}
+                    for player_id, (ranks, scores) in history.items()
+                ],
+            }
+        )
+
+    def get_export_response(self, kind, league=None, leagues=None):
+        fmt = self.request.query_params.get("output", "csv")
+        if fmt not in EXPORT_FORMATS:
+            return Response(
+                {"detail": f"Output must be one of {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        gzip = self.request.query_params.get("gzip") in ("1", "true")
+
+        # Compressed export is a .gz file to download, not an encoding clients should transparently undo
+        chunks = iter_export(kind, fmt, league, gzip, leagues=leagues)
+        response = StreamingHttpResponse(chunks, content_type="application/gzip" if gzip else CONTENT_TYPES[fmt])
+        filename = f"{league.label if league else 'leagues'}-{kind}.{fmt}{'.gz' if gzip else ''}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+def get_league_state(request, label, **kwargs):
+    """Fetch everything the league pages depend on with a single query, memoized on the request.
+
+    Any registration or join/leave writes a new league event, so the latest event id together with the latest standing
+    update time changes whenever the rendered pages might.
+    """
+
+    if not hasattr(request, "_league_state"):
+        request._league_state = (
+            League.objects.filter(label=label)
+            .annotate(
+                last_event_id=Subquery(
+                    LeagueEvent.objects.filter(league=OuterRef("pk")).order_by("-id").values("id")[:1]
+                ),
+                last_event_created=Subquery(
+                    LeagueEvent.objects.filter(league=OuterRef("pk")).order_by("-id").values("created")[:1]
+                ),
+                last_standing_updated=Subquery(
+                    Standing.objects.filter(league=OuterRef("pk")).order_by("-updated").values("updated")[:1]
+                ),
+            )
+            .values("id", "updated", "last_event_id", "last_event_created", "last_standing_updated")
+            .first()
+        )
+    return request._league_state
+
+
+def league_etag(request, label, **kwargs):
+    state = get_league_state(request, label)
+    if state is None:
+        return None
+    parts = (
+        state["id"],
+        state["updated"],
+        state["last_event_id"],
+        state["last_standing_updated"],
+        request.user.pk,
+    )
+    return md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def league_last_modified(request, label, **kwargs):
+    state = get_league_state(request, label)
+    if state is None:
+        return None
+    return max(
+        dt for dt in (state["updated"], state["last_event_created"], state["last_standing_updated"]) if dt is not None
+    )
+
+
+class LeagueConditionalMixin:
+    """Answer with 304 Not Modified when nothing has changed in the league since the client's last visit."""
+
+    conditional_response = True
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.conditional_response:
+            return super().dispatch(request, *args, **kwargs)
+
+        view = condition(etag_func=league_etag, last_modified_func=league_last_modified)(super().dispatch)
+        response = view(request, *args, **kwargs)
+        # Pages are user specific, so make every cache revalidate them against the etag
+        patch_cache_control(response, no_cache=True)
+        return response
 
 
 # noinspection PyMethodMayBeStatic
@@ -46,36 +416,47 @@ class LeagueListView(tables.SingleTableMixin, FilterView):
 
 
 @method_decorator(login_required, name="dispatch")
-class LeagueDetailedView(tables.MultiTableMixin, DetailView):
+class LeagueDetailedView(LeagueConditionalMixin, tables.MultiTableMixin, DetailView):
     template_name = "rankie/league/detail.html"
-    model = League
+    queryset = League.objects.select_related("rule__game", "owner", "summary")
     slug_field = "label"
     slug_url_kwarg = "label"
     table_pagination = False
 
+    @cached_property
+    def own_standing(self):
+        own = self.object.standings.select_related("player").filter(player=self.request.user).first()
+        if own is not None:
+            own.league = self.object
+            own.current_rank = own.get_rank()
+        return own
+
+    def get_summary(self):
+        try:
+            return self.object.summary
+        except LeagueSummary.DoesNotExist:
+            # Leagues unchanged since summaries were introduced, it's stored by the next change
+            return LeagueSummary.build(self.object)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["is_player"] = self.own_standing is not None
+        return context
+
     def get_tables(self):
-        league = self.get_object()
+        summary = self.get_summary()
+        standings = summary.get_standings()
+        if self.own_standing is not None and all(s.player_id != self.request.user.pk for s in standings):
+            standings.append(self.own_standing)
         return [
-            LeagueStandingTable(
-                Standing.objects.filter(league=league)
-                .filter(Q(rank__in=[1, 2, 3]) | Q(player=self.request.user))
-                .select_related("player")
-                .order_by(F("rank").asc(nulls_last=True))
-            ),
-            LeagueEventTable(LeagueEvent.objects.filter(league=league).order_by("-created")[:5]),
-            LeagueRoundTable(
-                Round.objects.filter(league=league)
-                .select_related("mvp")
-                .prefetch_related(
-                    Prefetch("round_results", RoundResult.objects.order_by("-score"), to_attr="mvp_results")
-                )
-                .order_by("-label")[:4]
-            ),
+            LeagueStandingTable(standings),
+            LeagueEventTable(summary.get_events()),
+            LeagueRoundTable(summary.get_rounds()),
         ]
 
 
 @method_decorator(login_required, name="dispatch")
-class LeagueStandingsView(tables.SingleTableMixin, DetailView):
+class LeagueStandingsView(LeagueConditionalMixin, tables.SingleTableMixin, DetailView):
     template_name = "rankie/league/standings.html"
     model = League
     slug_field = "label"
@@ -85,11 +466,11 @@ class LeagueStandingsView(tables.SingleTableMixin, DetailView):
 
     def get_table_data(self):
         league = self.get_object()
-        return league.standings.select_related("player").order_by(F("rank").asc(nulls_last=True))
+        return league.standings.with_rank().select_related("player").order_by(F("current_rank").asc(nulls_last=True))
 
 
 @method_decorator(login_required, name="dispatch")
-class LeagueRoundsView(tables.SingleTableMixin, DetailView):
+class LeagueRoundsView(LeagueConditionalMixin, tables.SingleTableMixin, DetailView):
     template_name = "rankie/league/rounds.html"
     model = League
     slug_field = "label"
@@ -99,11 +480,7 @@ class LeagueRoundsView(tables.SingleTableMixin, DetailView):
 
     def get_table_data(self):
         league = self.get_object()
-        return (
-            league.rounds.select_related("mvp")
-            .prefetch_related(Prefetch("round_results", RoundResult.objects.order_by("-score"), to_attr="mvp_results"))
-            .order_by("-label")
-        )
+        return league.rounds.select_related("mvp").order_by("-label")
 
 
 # noinspection PyMethodMayBeStatic
@@ -129,7 +506,7 @@ class LeagueRoundResultsView(tables.SingleTableMixin, DetailView):
 
 
 @method_decorator(login_required, name="dispatch")
-class LeagueEventsView(tables.SingleTableMixin, DetailView):
+class LeagueEventsView(LeagueConditionalMixin, tables.SingleTableMixin, DetailView):
     template_name = "rankie/league/events.html"
     model = League
     slug_field = "label"
@@ -144,6 +521,10 @@ class LeagueEventsView(tables.SingleTableMixin, DetailView):
 
 @method_decorator(login_required, name="dispatch")
 class JoinLeagueView(LeagueDetailedView):
+    conditional_response = False
+    # Membership is checked right before it's changed, a lagging replica would get it wrong
+    replica_reads = False
+
     def get_object(self, **kwargs):
         obj = super().get_object()
         if self.request.user in obj.players.all():
@@ -153,27 +534,42 @@ class JoinLeagueView(LeagueDetailedView):
             obj.players.add(self.request.user)
             obj.events.create(ev_type=LeagueEvent.EV_TYPE.NEW_PLAYER, context={"username": self.request.user.username})
             obj.save()
+            LeagueSummary.rebuild(obj)
 
         return obj
 
 
 @method_decorator(login_required, name="dispatch")
 class LeaveLeagueView(LeagueDetailedView):
+    conditional_response = False
+    # Membership is checked right before it's changed, a lagging replica would get it wrong
+    replica_reads = False
+
     def get_object(self, **kwargs):
         obj = super().get_object()
         if self.request.user not in obj.players.all():
             return obj
 
         with transaction.atomic():
+            # Ranks behind the player move up by one, registrations shifting ranks lock the league the same way
+            League.objects.select_for_update().filter(pk=obj.pk).exists()
+            left_rank = (
+                Standing.objects.filter(league=obj, player=self.request.user).values_list("rank", flat=True).first()
+            )
             obj.players.remove(self.request.user)
+            if left_rank is not None:
+                Standing.objects.filter(league=obj, rank__gt=left_rank).update(rank=F("rank") - 1)
             obj.events.create(ev_type=LeagueEvent.EV_TYPE.PLAYER_LEFT, context={"username": self.request.user.username})
             obj.save()
+            LeagueSummary.rebuild(obj)
 
         return obj
 
 
 @method_decorator(login_required, name="dispatch")
 class RefreshLeagueView(LeagueDetailedView):
+    conditional_response = False
+
     def get_object(self, **kwargs):
         obj = super().get_object()
         return obj
@@ -181,4 +577,4 @@ class RefreshLeagueView(LeagueDetailedView):
 
 @method_decorator(login_required, name="dispatch")
 class EditLeagueView(LeagueDetailedView):
-    pass
+    conditional_response = False
@@ -0,0 +1,172 @@
+"""Partitioned registration of game results by a pool of worker processes.
+
+Every league is owned by a single worker, picked by league id modulo the number of workers. A result is split into
+a task per worker owning some of the player's leagues, every worker takes its tasks in order, so results of a league
+are registered in the order they're submitted, while unrelated leagues are registered in parallel and don't compete
+for the same locks. Submitted results must be committed, workers read them with their own connections.
+
+Partitions of a result are registered independently, the ones failed in a worker are retried once the workers are done,
+so a result isn't left registered in only some of its leagues unless it fails again, then it's reported.
+"""
+import time
+import queue
+import random
+import signal
+import logging
+import multiprocessing
+
+from collections import defaultdict
+
+from django.db import OperationalError, connections
+
+from .core import register_game_result
+from .models import League, Standing, GameResult
+
+logger = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = 5
+
+
+def get_partition(league_id, workers):
+    return league_id % workers
+
+
+def get_tasks(game_results, workers):
+    """Return {worker: [(game result id, league ids)]} of the results in the given order."""
+
+    game_results = list(game_results)
+    leagues = defaultdict(list)
+    for player_id, game_id, league_id in (
+        Standing.objects.filter(
+            league__in=League.objects.active(),
+            player__in={game_result.player_id for game_result in game_results},
+            league__rule__game__in={game_result.game_id for game_result in game_results},
+        )
+        .order_by("league_id")
+        .values_list("player_id", "league__rule__game_id", "league_id")
+    ):
+        leagues[(player_id, game_id)].append(league_id)
+
+    tasks = defaultdict(list)
+    for game_result in game_results:
+        partitions = defaultdict(list)
+        for league_id in leagues[(game_result.player_id, game_result.game_id)]:
+            partitions[get_partition(league_id, workers)].append(league_id)
+        for worker, league_ids in partitions.items():
+            tasks[worker].append((game_result.pk, league_ids))
+    return tasks
+
+
+def register(game_result, league_ids, attempts=RETRY_ATTEMPTS):
+    """Register the result, retrying the ones failed on locks (deadlock, lock timeout, busy SQLite)."""
+
+    for attempt in range(1, attempts + 1):
+        try:
+            return register_game_result(game_result, league_ids=league_ids)
+        except OperationalError:
+            if attempt == attempts:
+                raise
+            time.sleep(random.random() * 0.01 * 2**attempt)
+
+
+def register_task(task):
+    """Register the (game result id, league ids) task, returns whether it succeeded."""
+
+    game_result_id, league_ids = task
+    try:
+        game_result = GameResult.objects.select_related("player", "game").get(pk=game_result_id)
+        register(game_result, league_ids)
+    except Exception:  # noqa
+        logger.exception(f"Failed to register game result {game_result_id} in leagues {league_ids}")
+        return False
+    return True
+
+
+def work(tasks, stats):
+    """Register tasks of the queue until the stop sentinel, then report the registered task count and failed tasks."""
+
+    # Interrupted parent stops the pool itself and the queue is drained first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    registered, failed = 0, []
+    try:
+        while (task := tasks.get()) is not None:
+            if register_task(task):
+                registered += 1
+            else:
+                failed.append(task)
+    finally:
+        connections.close_all()
+        stats.put((registered, failed))
+
+
+class RegistrationPool:
+    """Pool of registration worker processes, use it as a context manager to wait for all the submitted results."""
+
+    def __init__(self, workers):
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+        self.workers = workers
+        # Forked workers inherit configured Django, but must not share the connections of the parent
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        self.stats = context.Queue()
+        self.queues = [context.Queue() for _ in range(workers)]
+        self.processes = [context.Process(target=work, args=(tasks, self.stats), daemon=True) for tasks in self.queues]
+        for process in self.processes:
+            process.start()
+        self.closed = False
+        self.result = None
+        # (game result id, league ids) tasks failed even when retried, the rest of their results' leagues is registered
+        self.failed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, game_results):
+        """Queue registration of the results, returns the number of tasks they're split into."""
+
+        if self.closed:
+            raise RuntimeError("Pool is closed")
+        tasks = get_tasks(game_results, self.workers)
+        for worker, worker_tasks in tasks.items():
+            for task in worker_tasks:
+                self.queues[worker].put(task)
+        return sum(len(worker_tasks) for worker_tasks in tasks.values())
+
+    def close(self):
+        """Wait for the queued tasks to be registered and stop the workers, returns (registered, failed) task counts.
+
+        Tasks failed in the workers are retried one by one afterwards, without the competition for locks. They're
+        registered later than the following results of their leagues then, the way late results are.
+        """
+
+        if self.closed:
+            return self.result
+        self.closed = True
+        for tasks in self.queues:
+            tasks.put(None)
+        # Stats are read before joining, a process doesn't exit until its queued data is consumed
+        reported = []
+        while len(reported) < len(self.processes):
+            try:
+                reported.append(self.stats.get(timeout=1))
+            except queue.Empty:
+                if not any(process.is_alive() for process in self.processes):
+                    break
+        for process in self.processes:
+            process.join()
+        lost = len(self.processes) - len(reported)
+        if lost:
+            logger.error(f"{lost} registration worker(s) exited without reporting, their tasks might be lost")
+        registered = sum(registered for registered, _ in reported)
+        # Failed tasks of a worker are in their submission order, tasks of different workers don't share leagues
+        for task in (task for _, failed in reported for task in failed):
+            if register_task(task):
+                registered += 1
+            else:
+                self.failed.append(task)
+        self.result = registered, len(self.failed)
+        return self.result
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+
+from urllib.parse import urljoin
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class RankieClient:
+    """Shared async client of Rankie API.
+
+    Keeps a pool of keep-alive connections and bounds the number of requests in flight, so bursts of messages neither
+    open a new TCP/TLS connection per message nor flood the API.
+    """
+
+    def __init__(self, game_results_url, timeout=10.0, max_connections=20, max_concurrency=20):
+        self.submit_url = urljoin(game_results_url, "submit/")
+        self.submit_batch_url = urljoin(game_results_url, "submit/batch/")
+        self.games_url = urljoin(game_results_url, "../games/")
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def submit(self, username, game_label, text, idempotency_key) -> httpx.Response:
+        data = {"player": username, "game": game_label, "origin": "TG_BOT", "text": text}
+        async with self.semaphore:
+            return await self.client.post(self.submit_url, json=data, headers={"Idempotency-Key": idempotency_key})
+
+    async def get_games(self) -> httpx.Response:
+        async with self.semaphore:
+            return await self.client.get(self.games_url)
+
+    async def submit_batch(self, messages) -> httpx.Response:
+        data = [
+            {
+                "idempotency_key": message.idempotency_key,
+                "player": message.username,
+                "game": message.game_label,
+                "origin": "TG_BOT",
+                "text": message.text,
+            }
+            for message in messages
+        ]
+        async with self.semaphore:
+            return await self.client.post(self.submit_batch_url, json=data)
+
+    @staticmethod
+    def format_result(status_code, data):
+        if status_code == 201:
+            return format_registrations(data["registrations"])
+        reason = "API error"
+        if status_code == 409:
+            reason = "already registered"
+        elif status_code == 400:
+            reason = "invalid game result"
+        return f"Failed to send game result: {reason}"
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def format_registrations(registrations):
+    lines = ["Game result was successfully sent and registered"]
+    for registration in registrations:
+        line = f"{registration['league']}: round {registration['round']} score {registration['score']:g}"
+        line += f", rank #{registration['rank']}"
+        if registration["mvp"]:
+            line += ", round MVP"
+        if registration["new_leader"]:
+            line += ", new league leader!"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+async def submit_game_result(client: RankieClient, username, game_label, text, idempotency_key) -> str:
+    """Send game result to Rankie API and return the reply for the user."""
+
+    try:
+        response = await client.submit(username, game_label, text, idempotency_key)
+    except httpx.HTTPError as exc:
+        logger.error(f"Request failed: {exc!r}")
+        return "Failed to send game result: API error"
+
+    if response.status_code not in (201, 400, 409):
+        logger.error(f"Status code: {response.status_code}, Text: {response.text}")
+    return client.format_result(response.status_code, response.json() if response.status_code == 201 else None)
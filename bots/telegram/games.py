@@ -0,0 +1,96 @@
+import re
+import json
+import asyncio
+import logging
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Named groups of game patterns would clash once patterns are joined into a single one
+NAMED_GROUP_RE = re.compile(r"\(\?P<\w+>")
+
+
+class GameMatcher:
+    """Tells the game from the result text with the patterns synced from Rankie API.
+
+    All game patterns are compiled into a single alternation, so unknown texts are rejected locally by one regex search.
+    Patterns failing to compile on their own are skipped, one bad pattern doesn't stop the others from matching.
+    Patterns are refreshed once their TTL expires; the last known ones are kept in a local file and used while the API
+    is unavailable.
+    """
+
+    CACHE_KEY = "games"
+
+    def __init__(self, client, ttl=300, path=None):
+        self.client = client
+        self.path = path
+        self.cache = TTLCache(maxsize=1, ttl=ttl)
+        self.lock = asyncio.Lock()
+        self.labels = []
+        self.pattern = None
+        if path is not None:
+            self.load()
+
+    @staticmethod
+    def compile(games):
+        labels, alternatives = [], []
+        for game in games:
+            # Wrapped the way it's joined, so inline flags in the middle of a pattern fail here too
+            alternative = f"(?P<g{len(labels)}>{NAMED_GROUP_RE.sub('(?:', game['detect_regex'])})"
+            try:
+                re.compile(alternative)
+            except re.error as exc:
+                logger.error(f"Skipping pattern of game {game['label']!r}: {exc!r}")
+                continue
+            labels.append(game["label"])
+            alternatives.append(alternative)
+        return labels, re.compile("|".join(alternatives)) if alternatives else None
+
+    def set_games(self, games):
+        self.labels, self.pattern = self.compile(games)
+        self.cache[self.CACHE_KEY] = games
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.labels, self.pattern = self.compile(json.load(f))
+        except (OSError, ValueError, re.error) as exc:
+            logger.warning(f"Failed to load cached games: {exc!r}")
+
+    async def refresh(self):
+        try:
+            response = await self.client.get_games()
+            response.raise_for_status()
+            games = response.json()
+            self.set_games(games)
+        except Exception as exc:  # noqa
+            logger.error(f"Failed to refresh games: {exc!r}")
+            # Keep using the last known patterns until the next refresh instead of retrying on every message
+            self.cache[self.CACHE_KEY] = None
+            return
+
+        if self.path is not None:
+            await asyncio.to_thread(self.dump, games)
+
+    def dump(self, games):
+        with open(self.path, "w") as f:
+            json.dump(games, f)
+
+    async def detect(self, text):
+        """Return label of the game the text is result of, or None if it doesn't match any game."""
+
+        if self.CACHE_KEY not in self.cache:
+            async with self.lock:
+                # Only one refresh at a time, others wait for it and use its result
+                if self.CACHE_KEY not in self.cache:
+                    await self.refresh()
+        return self.match(text)
+
+    def match(self, text):
+        if self.pattern is None:
+            return None
+        match = self.pattern.search(text)
+        if match is None:
+            return None
+        return self.labels[int(match.lastgroup[1:])]
@@ -0,0 +1,105 @@
+"""Local load test of the bot's submissions against a stub Rankie API.
+
+Compares the former blocking `requests` calls made from the async handler with the shared async client:
+
+    python bots/telegram/loadtest.py --messages 500 --latency 0.05
+"""
+import json
+import time
+import asyncio
+import argparse
+import threading
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from client import RankieClient, submit_game_result
+
+REGISTRATION = {
+    "league": "stub",
+    "round": "1",
+    "score": 1,
+    "standing_score": 1,
+    "rank": 1,
+    "prev_rank": None,
+    "mvp": False,
+    "new_leader": False,
+}
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_POST(self):  # noqa: N802
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        body = json.dumps({"id": 1, "registrations": [REGISTRATION]}).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_api(latency):
+    handler = type("Handler", (StubAPIHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/gameresults/"
+
+
+async def blocking_submit(url, username, text, idempotency_key):
+    """Former handler behaviour: blocking call without session made from a coroutine."""
+
+    data = {"player": username, "game": "wordle_eng", "origin": "TG_BOT", "text": text}
+    response = requests.post(url + "submit/", json=data, headers={"Idempotency-Key": idempotency_key})
+    return response.status_code
+
+
+async def run_blocking(url, messages):
+    await asyncio.gather(*(blocking_submit(url, f"user{i}", f"Wordle {i} 3/6", f"key{i}") for i in range(messages)))
+
+
+async def run_async(url, messages, concurrency):
+    client = RankieClient(url, max_connections=concurrency, max_concurrency=concurrency)
+    try:
+        await asyncio.gather(
+            *(
+                submit_game_result(client, f"user{i}", "wordle_eng", f"Wordle {i} 3/6", f"key{i}")
+                for i in range(messages)
+            )
+        )
+    finally:
+        await client.aclose()
+
+
+def measure(name, coroutine, messages):
+    start = time.perf_counter()
+    asyncio.run(coroutine)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {messages} messages in {elapsed:.2f}s, {messages / elapsed:.1f} messages/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub API response latency, seconds")
+    parser.add_argument("--concurrency", type=int, default=20, help="Async client requests in flight")
+    args = parser.parse_args()
+
+    server, url = start_stub_api(args.latency)
+    try:
+        measure("blocking", run_blocking(url, args.messages), args.messages)
+        measure("async", run_async(url, args.messages, args.concurrency), args.messages)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,82 @@
 import os
+import asyncio
 import logging
 
-from urllib.parse import urljoin
-
-import requests
-
+from games import GameMatcher
+from spool import Spool, SpoolDeliverer
+from client import RankieClient
 from telegram import Update
-from telegram.ext import ContextTypes, MessageHandler, ApplicationBuilder, filters
+from ratelimit import UserRateLimiter
+from telegram.ext import Application, ContextTypes, MessageHandler, ApplicationBuilder, filters
 
 PORT = int(os.environ["PORT"])
 BOT_TOKEN = os.environ["BOT_TOKEN"]
 APPNAME = os.environ["APPNAME"]
 RANKIE_GAME_RESULTS_URL = os.environ.get("RANKIE_GAME_RESULTS_URL")
+RANKIE_API_TIMEOUT = float(os.environ.get("RANKIE_API_TIMEOUT", 10))
+RANKIE_API_MAX_CONNECTIONS = int(os.environ.get("RANKIE_API_MAX_CONNECTIONS", 20))
+RANKIE_API_MAX_CONCURRENCY = int(os.environ.get("RANKIE_API_MAX_CONCURRENCY", 20))
+# Number of updates processed at once, by default telegram handles them one by one
+BOT_CONCURRENT_UPDATES = int(os.environ.get("BOT_CONCURRENT_UPDATES", 64))
+# Accepted messages are kept in a local SQLite spool until they are delivered to Rankie API
+SPOOL_PATH = os.environ.get("SPOOL_PATH", "spool.sqlite3")
+SPOOL_BATCH_SIZE = int(os.environ.get("SPOOL_BATCH_SIZE", 50))
+SPOOL_INTERVAL = float(os.environ.get("SPOOL_INTERVAL", 1))
+# Message failed this many times is moved to the dead letters of the spool
+SPOOL_MAX_ATTEMPTS = int(os.environ.get("SPOOL_MAX_ATTEMPTS", 30))
+# Game patterns are synced from Rankie API and kept locally to detect games while the API is down
+GAMES_TTL = float(os.environ.get("GAMES_TTL", 300))
+GAMES_CACHE_PATH = os.environ.get("GAMES_CACHE_PATH", "games.json")
+# Results a single user may send per minute, keep it in line with Rankie API player throttle rate
+USER_RATE_LIMIT = int(os.environ.get("USER_RATE_LIMIT", 30))
 
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger()
 
 
+class RankieApplication(Application):
+    async def shutdown(self):
+        task = self.bot_data.pop("deliverer_task", None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await super().shutdown()
+        client = self.bot_data.pop("rankie", None)
+        if client is not None:
+            await client.aclose()
+        spool = self.bot_data.pop("spool", None)
+        if spool is not None:
+            spool.close()
+
+
+async def post_init(app: Application):
+    app.bot_data["rankie"] = RankieClient(
+        RANKIE_GAME_RESULTS_URL,
+        timeout=RANKIE_API_TIMEOUT,
+        max_connections=RANKIE_API_MAX_CONNECTIONS,
+        max_concurrency=RANKIE_API_MAX_CONCURRENCY,
+    )
+    app.bot_data["spool"] = Spool(SPOOL_PATH)
+    app.bot_data["games"] = GameMatcher(app.bot_data["rankie"], ttl=GAMES_TTL, path=GAMES_CACHE_PATH)
+    await app.bot_data["games"].refresh()
+    app.bot_data["limiter"] = UserRateLimiter(capacity=USER_RATE_LIMIT, period=60)
+
+    async def reply(chat_id, text):
+        await app.bot.send_message(chat_id=chat_id, text=text)
+
+    deliverer = SpoolDeliverer(
+        app.bot_data["spool"],
+        app.bot_data["rankie"],
+        reply,
+        batch_size=SPOOL_BATCH_SIZE,
+        interval=SPOOL_INTERVAL,
+        max_attempts=SPOOL_MAX_ATTEMPTS,
+    )
+    app.bot_data["deliverer"] = deliverer
+    # Not an application task on purpose: those are awaited on stop, while delivery runs until shutdown
+    app.bot_data["deliverer_task"] = asyncio.create_task(deliverer.run())
+
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.warning('Update "%s" caused error "%s"', update, context.error)
     chat_id = update.message.chat_id
@@ -30,46 +90,32 @@ async def send_game_result(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     message = update.message.text
     username = update.message.from_user.username
+    # Telegram redelivers the same message on webhook retries, so it identifies the submission
+    idempotency_key = f"tg:{chat_id}:{update.message.message_id}"
 
-    if message.startswith("Wordle"):
-        game_label = "wordle_eng"
-    elif "Wordle (RU)" in message:
-        game_label = "wordle_ru"
-    elif message.startswith("Reversle"):
-        game_label = "reversle_eng"
-    elif message.startswith("nerdlegame"):
-        game_label = "nerdle"
-    else:
+    game_label = await context.bot_data["games"].detect(message)
+    if game_label is None:
         await context.bot.send_message(chat_id=chat_id, text="Sorry, I can't guess the game name")
         return
 
-    data = {"player": username, "game": game_label, "origin": "TG_BOT", "text": message}
-    response = requests.post(RANKIE_GAME_RESULTS_URL, json=data)
-
-    if response.status_code != 201:
-        logger.error(f"Status code: {response.status_code}, Text: {response.text}")
-        reason = "API error"
-        if response.text and "must make a unique set" in response.text:
-            reason = "already registered"
-
-        await context.bot.send_message(chat_id=chat_id, text=f"Failed to send game result: {reason}")
-        return
-
-    game_result_id = response.json()["id"]
-    register_url = urljoin(RANKIE_GAME_RESULTS_URL, str(game_result_id) + "/register/")
-    response = requests.get(register_url)
-
-    if response.status_code != 200:
-        logger.error(f"Status code: {response.status_code}, Text: {response.text}")
-        reason = "API error"
-        await context.bot.send_message(chat_id=chat_id, text=f"Failed to register game result: {reason}")
+    if not context.bot_data["limiter"].acquire(username):
+        await context.bot.send_message(chat_id=chat_id, text="Too many results, please slow down")
         return
 
-    await context.bot.send_message(chat_id=chat_id, text="Game result was successfully sent and registered")
+    # Reply is sent by the deliverer once Rankie API has registered the result
+    await asyncio.to_thread(context.bot_data["spool"].put, idempotency_key, chat_id, username, game_label, message)
+    context.bot_data["deliverer"].notify()
 
 
 def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .application_class(RankieApplication)
+        .token(BOT_TOKEN)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .build()
+    )
     app.add_error_handler(error_handler)
     app.add_handler(
         MessageHandler(
@@ -0,0 +1,26 @@
+import time
+
+from cachetools import TTLCache
+
+
+class UserRateLimiter:
+    """Token bucket per user, rejects message floods before they are spooled.
+
+    Mirrors the per-player throttle of Rankie API, so users get an immediate answer instead of queued results failing
+    with 429 later. Buckets of users who were quiet long enough to refill them are dropped from memory.
+    """
+
+    def __init__(self, capacity=10, period=60.0, maxsize=10000):
+        self.capacity = capacity
+        self.refill_rate = capacity / period
+        self.buckets = TTLCache(maxsize=maxsize, ttl=period)
+
+    def acquire(self, username) -> bool:
+        now = time.monotonic()
+        tokens, timestamp = self.buckets.get(username, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - timestamp) * self.refill_rate)
+        if tokens < 1:
+            self.buckets[username] = (tokens, now)
+            return False
+        self.buckets[username] = (tokens - 1, now)
+        return True
@@ -0,0 +1,244 @@
+import time
+import random
+import asyncio
+import logging
+import sqlite3
+import threading
+
+from dataclasses import dataclass
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SpooledMessage:
+    id: int
+    idempotency_key: str
+    chat_id: int
+    username: str
+    game_label: str
+    text: str
+    attempts: int
+
+
+class Spool:
+    """Durable local queue of accepted messages backed by SQLite.
+
+    Messages stay in the spool until Rankie API gives a final answer for them, so nothing is lost when the API is slow
+    or down, or when the bot restarts.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                chat_id INTEGER NOT NULL,
+                username TEXT NOT NULL,
+                game_label TEXT NOT NULL,
+                text TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS spool_username_idx ON spool (username, id)")
+        # Messages given up on are kept aside for inspection
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spool_dead (
+                id INTEGER PRIMARY KEY,
+                idempotency_key TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                username TEXT NOT NULL,
+                game_label TEXT NOT NULL,
+                text TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                created REAL NOT NULL,
+                failed REAL NOT NULL
+            )
+            """
+        )
+
+    def put(self, idempotency_key, chat_id, username, game_label, text):
+        now = time.time()
+        with self.lock:
+            # Redelivered telegram updates have the same key and are spooled once
+            self.conn.execute(
+                "INSERT OR IGNORE INTO spool (idempotency_key, chat_id, username, game_label, text, next_attempt_at, "
+                "created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (idempotency_key, chat_id, username, game_label, text, now, now),
+            )
+
+    def due(self, limit) -> list[SpooledMessage]:
+        """Return the oldest message of every user if it is due for delivery.
+
+        Only the head of each user's queue is returned, so user's messages are delivered in the order they came.
+        """
+
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, idempotency_key, chat_id, username, game_label, text, attempts FROM spool "
+                "WHERE id IN (SELECT MIN(id) FROM spool GROUP BY username) AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        return [SpooledMessage(*row) for row in rows]
+
+    def done(self, ids):
+        with self.lock:
+            self.conn.executemany("DELETE FROM spool WHERE id = ?", [(pk,) for pk in ids])
+
+    def retry(self, message_id, delay, failed=True):
+        """Reschedule the message, failed attempts are counted while postponed ones (e.g. throttled) are not."""
+
+        with self.lock:
+            self.conn.execute(
+                "UPDATE spool SET attempts = attempts + ?, next_attempt_at = ? WHERE id = ?",
+                (int(failed), time.time() + delay, message_id),
+            )
+
+    def bury(self, message_id, reason):
+        """Move the message to the dead letters, the user's next message becomes the head of their queue."""
+
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO spool_dead (id, idempotency_key, chat_id, username, game_label, text, "
+                "attempts, reason, created, failed) SELECT id, idempotency_key, chat_id, username, game_label, text, "
+                "attempts + 1, ?, created, ? FROM spool WHERE id = ?",
+                (reason, time.time(), message_id),
+            )
+            self.conn.execute("DELETE FROM spool WHERE id = ?", (message_id,))
+            self.conn.execute("COMMIT")
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class SpoolDeliverer:
+    """Background task delivering spooled messages to Rankie API in batches.
+
+    Failed batches are retried with exponential backoff and jitter, so after an outage the API receives batches at a
+    steady pace instead of every retry at once. Message failed `max_attempts` times is moved to the dead letters.
+    """
+
+    def __init__(
+        self,
+        spool,
+        client,
+        reply,
+        batch_size=50,
+        interval=1.0,
+        backoff_base=2.0,
+        backoff_max=300.0,
+        max_attempts=30,
+    ):
+        self.spool = spool
+        self.client = client
+        self.reply = reply
+        self.batch_size = batch_size
+        self.interval = interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_attempts = max_attempts
+        self.wakeup = asyncio.Event()
+
+    def notify(self):
+        self.wakeup.set()
+
+    def get_backoff(self, attempts, retry_after=None):
+        delay = min(self.backoff_max, self.backoff_base * 2**attempts)
+        delay = random.uniform(delay / 2, delay)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            try:
+                while await self.deliver_batch():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa
+                logger.exception("Spool delivery failed")
+
+    async def deliver_batch(self) -> bool:
+        """Deliver one batch of due messages, returns whether there was anything to deliver."""
+
+        messages = await asyncio.to_thread(self.spool.due, self.batch_size)
+        if not messages:
+            return False
+
+        try:
+            response = await self.client.submit_batch(messages)
+        except httpx.HTTPError as exc:
+            logger.warning(f"Batch delivery failed: {exc!r}")
+            await self.postpone(messages, reason=repr(exc))
+            return False
+
+        if response.status_code != 200:
+            logger.warning(f"Batch delivery failed, status code: {response.status_code}, Text: {response.text}")
+            retry_after = response.headers.get("Retry-After")
+            await self.postpone(
+                messages, float(retry_after) if retry_after else None, reason=f"status code {response.status_code}"
+            )
+            return False
+
+        delivered = []
+        for message, result in zip(messages, response.json()):
+            if result["status"] == 429:
+                # Throttled player's message stays at the head of their queue, it's not a failed attempt
+                delay = self.get_backoff(0, result["data"].get("wait"))
+                await asyncio.to_thread(self.spool.retry, message.id, delay, False)
+            elif result["status"] >= 500:
+                logger.warning(f"Message {message.idempotency_key} delivery failed: {result['data']}")
+                await self.retry(message, reason=f"status code {result['status']}")
+            else:
+                delivered.append((message, result))
+        await asyncio.to_thread(self.spool.done, [message.id for message, _ in delivered])
+        for message, result in delivered:
+            await self.notify_user(message.chat_id, self.client.format_result(result["status"], result["data"]))
+        return True
+
+    async def postpone(self, messages, retry_after=None, reason=None):
+        for message in messages:
+            await self.retry(message, retry_after, reason)
+            if message.attempts == 0:
+                await self.notify_user(
+                    message.chat_id, "Rankie is not available at the moment, your result will be registered later"
+                )
+
+    async def retry(self, message, retry_after=None, reason=None):
+        if message.attempts + 1 < self.max_attempts:
+            await asyncio.to_thread(self.spool.retry, message.id, self.get_backoff(message.attempts, retry_after))
+            return
+        logger.error(f"Message {message.idempotency_key} is given up after {self.max_attempts} attempts: {reason}")
+        await asyncio.to_thread(self.spool.bury, message.id, reason or "unknown")
+        await self.notify_user(message.chat_id, "Failed to send game result: API error")
+
+    async def notify_user(self, chat_id, text):
+        # Delivery state is already saved, failed reply must not stop other messages
+        try:
+            await self.reply(chat_id, text)
+        except Exception:  # noqa
+            logger.exception(f"Failed to reply to chat {chat_id}")
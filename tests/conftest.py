@@ -1,8 +1,45 @@
 import pytest
 
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework.test import APIClient
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from apps.rankie.scorers import SCORERS
 
 
 @pytest.fixture
 def api_client():
     return APIClient()
+
+
+@pytest.fixture(autouse=True)
+def throttle_cache():
+    yield
+    caches[settings.RANKIE_THROTTLE_CACHE].clear()
+
+
+@pytest.fixture(autouse=True)
+def scorers_cache():
+    yield
+    SCORERS.clear()
+
+
+@pytest.fixture
+def reconnecting_db(transactional_db):
+    """New primary connection that's only opened by the first query, `close()` disconnects it for real.
+
+    In-memory test database of SQLite ignores `close()`, the shared cache keeps the data while the original connection
+    stays open.
+    """
+
+    original = connections[DEFAULT_DB_ALIAS]
+    connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    connection.close = lambda: BaseDatabaseWrapper.close(connection)
+    connections[DEFAULT_DB_ALIAS] = connection
+    try:
+        yield connection
+    finally:
+        connections[DEFAULT_DB_ALIAS] = original
+        connection.close()
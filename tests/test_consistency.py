@@ -0,0 +1,81 @@
+import random
+
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+
+from apps.rankie.core import register_game_result
+from apps.rankie.models import Round, League, Standing, GameResult
+from apps.rankie.synthetic import make_result_text, create_synthetic_leagues
+from apps.rankie.consistency import check_league, check_leagues
+
+
+@pytest.mark.parametrize("rank_mode", [League.RANK_MODE.STORED, League.RANK_MODE.SHIFTED])
+def test_registrations_keep_leagues_consistent(db, rank_mode):
+    rng = random.Random(0)
+    leagues = create_synthetic_leagues(players=20, rounds=3, leagues_per_player=2, rng=rng)
+    League.objects.update(rank_mode=rank_mode)
+    assert check_leagues() == []
+
+    game = leagues[0].rule.game
+    player_ids = list(Standing.objects.filter(league=leagues[0]).values_list("player_id", flat=True))
+    # Wordle scores tie a lot, so do mvp counts of players with the same score
+    jobs = [(player_id, str(round_label)) for player_id in player_ids for round_label in range(4, 8)]
+    rng.shuffle(jobs)
+    for player_id, round_label in jobs:
+        text, _ = make_result_text(round_label, rng)
+        register_game_result(
+            GameResult.objects.create(player_id=player_id, game=game, origin=GameResult.ORIGIN.CUSTOM, text=text)
+        )
+
+    assert check_leagues() == []
+
+
+def test_check_league_reports_violations(db):
+    (league,) = create_synthetic_leagues(players=4, rounds=2, leagues_per_player=1, rng=random.Random(0))
+    first, second = Standing.objects.filter(league=league).order_by("rank")[:2]
+    first.rank, second.rank = second.rank, second.rank
+    first.save()
+    first.mvp_count += 1
+    Standing.objects.filter(pk=first.pk).update(mvp_count=first.mvp_count)
+    Round.objects.filter(league=league, label="1").update(result_count=0)
+
+    violations = check_league(league)
+
+    assert f"league {league.label}: round 1: result_count 0 != 4" in violations
+    assert any(f"player {first.player_id}: mvp_count" in violation for violation in violations)
+    assert any("aren't 1..4" in violation for violation in violations)
+
+
+def test_check_league_reports_tie_broken_by_join_time(db):
+    (league,) = create_synthetic_leagues(players=4, rounds=2, leagues_per_player=1, rng=random.Random(0))
+    earlier, later = Standing.objects.filter(league=league, rank__lte=2).order_by("created", "pk")
+    Standing.objects.filter(pk__in=[earlier.pk, later.pk]).update(score=100, mvp_count=1)
+    Standing.objects.filter(pk=later.pk).update(rank=1)
+    Standing.objects.filter(pk=earlier.pk).update(rank=2)
+
+    violations = check_league(league)
+
+    assert any(violation.startswith(f"league {league.label}: rank 1 (score 100") for violation in violations)
+    Standing.objects.filter(pk=later.pk).update(rank=2)
+    Standing.objects.filter(pk=earlier.pk).update(rank=1)
+    assert not any("is behind" in violation for violation in check_league(league))
+
+
+def test_stress_registration(transactional_db):
+    stdout = StringIO()
+    call_command(
+        "stress_registration",
+        "--in-place",
+        "--threads=1",
+        "--players=4",
+        "--leagues-per-player=2",
+        "--rounds=1",
+        "--new-rounds=2",
+        stdout=stdout,
+    )
+
+    assert "Registered 8 of 8 results" in stdout.getvalue()
+    assert "2 league(s) are consistent" in stdout.getvalue()
@@ -0,0 +1,97 @@
+import csv
+import gzip
+import json
+
+from io import StringIO
+from datetime import timedelta
+
+import pytest
+
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from django.core.management import call_command
+
+from apps.rankie.core import register_game_result
+from apps.rankie.models import Game, League, GameRule, GameResult
+
+
+@pytest.fixture
+def league(db, django_user_model):
+    game = baker.make(Game, label="game", parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>[\s\S]*)")
+    rule = baker.make(
+        GameRule,
+        game=game,
+        py_class="apps.rankie.scorers.ExpressionScorer",
+        py_kwargs={"vars_regex": "(?P<value>[0-9]+)", "expression": "{value}"},
+    )
+    league = baker.make(League, label="league", rule=rule, start_dt=(timezone.now() - timedelta(days=1)), public=True)
+    players = [baker.make(django_user_model, username=f"player{i}") for i in range(0, 2)]
+    league.players.add(*players)
+    for player, score in zip(players, (3, 5)):
+        register_game_result(baker.make(GameResult, player=player, game=game, text=f"game 1 {score}"))
+    return league
+
+
+def content(response):
+    return b"".join(response.streaming_content)
+
+
+def test_export_standings_csv(api_client, league):
+    response = api_client.get(reverse("api:leagues-export", args=[league.label, "standings"]))
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "text/csv"
+    rows = list(csv.DictReader(StringIO(content(response).decode())))
+    assert [(row["rank"], row["player"], row["score"]) for row in rows] == [
+        ("1", "player1", "5.0"),
+        ("2", "player0", "3.0"),
+    ]
+
+
+def test_export_round_results_ndjson_gzip(api_client, league):
+    url = reverse("api:leagues-export-all", args=["round_results"])
+    response = api_client.get(url, {"output": "ndjson", "gzip": "1"})
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/gzip" and not response.has_header("Content-Encoding")
+    rows = [json.loads(line) for line in gzip.decompress(content(response)).decode().splitlines()]
+    assert [(row["league"], row["round"], row["player"]) for row in rows] == [
+        ("league", "1", "player1"),
+        ("league", "1", "player0"),
+    ]
+
+
+def test_export_unknown_output(api_client, league):
+    response = api_client.get(reverse("api:leagues-export", args=[league.label, "rounds"]), {"output": "xml"})
+
+    assert response.status_code == 400
+
+
+def test_export_private_league(api_client, league, django_user_model):
+    private = baker.make(League, label="private", rule=league.rule, start_dt=league.start_dt)
+    player = baker.make(django_user_model, username="player2")
+    private.players.add(player)
+    register_game_result(baker.make(GameResult, player=player, game=league.rule.game, text="game 1 4"))
+    url = reverse("api:leagues-export", args=[private.label, "standings"])
+    all_url = reverse("api:leagues-export-all", args=["standings"])
+
+    assert api_client.get(url).status_code == 404
+    rows = list(csv.DictReader(StringIO(content(api_client.get(all_url)).decode())))
+    assert {row["league"] for row in rows} == {"league"}
+
+    # Players and the owner see the league
+    for user in (player, private.owner):
+        api_client.force_authenticate(user)
+        assert api_client.get(url).status_code == 200
+        rows = list(csv.DictReader(StringIO(content(api_client.get(all_url)).decode())))
+        assert {row["league"] for row in rows} == {"league", "private"}
+
+
+def test_export_leagues_command(tmp_path, league):
+    path = tmp_path / "rounds.ndjson"
+    call_command("export_leagues", "rounds", "--league", league.label, "--format", "ndjson", "--output", str(path))
+
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(rows) == 1
+    assert rows[0]["mvp"] == "player1" and rows[0]["result_count"] == 2
@@ -1,10 +1,18 @@
+import json
+
+from datetime import timedelta
+
 import pytest
 
+from django.db import IntegrityError
+from django.utils import timezone
 from model_bakery import baker
 from rest_framework import status
 from rest_framework.reverse import reverse
 
-from apps.rankie.models import GameResult
+from apps.rankie import views
+from apps.rankie.core import register_game_result
+from apps.rankie.models import GameResult, RoundResult, IdempotencyKey
 
 
 @pytest.fixture
@@ -37,3 +45,283 @@ def test_post_game_result(api_client, user, game):
     api_client.login(username=user.username, password=user.password)
     response = api_client.post(url, data, format="json")
     assert response.status_code == status.HTTP_201_CREATED
+
+
+@pytest.fixture
+def listed_game_results(db, user, game):
+    other_game = baker.make("rankie.Game")
+    results = baker.make("rankie.GameResult", _quantity=5, player=user, game=game, origin=GameResult.ORIGIN.TG_BOT)
+    results += baker.make("rankie.GameResult", _quantity=3, player=user, game=other_game)
+    return results
+
+
+def test_list_game_results_paginated(api_client, listed_game_results):
+    url = reverse("api:gameresults-list")
+    response = api_client.get(url, {"page_size": 3})
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["id"] for item in response.data["results"]] == [result.id for result in listed_game_results[::-1][:3]]
+    assert "text" not in response.data["results"][0]
+
+    response = api_client.get(response.data["next"])
+    assert [item["id"] for item in response.data["results"]] == [result.id for result in listed_game_results[::-1][3:6]]
+
+
+def test_list_game_results_filters_and_fields(api_client, game, listed_game_results):
+    url = reverse("api:gameresults-list")
+    response = api_client.get(url, {"game": game.label, "origin": GameResult.ORIGIN.TG_BOT, "fields": "id,text"})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["results"]) == 5
+    assert set(response.data["results"][0]) == {"id", "text"}
+
+
+def test_export_game_results_ndjson(api_client, game, listed_game_results):
+    url = reverse("api:gameresults-export")
+    response = api_client.get(url, {"game": game.label})
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+    assert [row["id"] for row in rows] == [result.id for result in listed_game_results[:5]]
+    assert rows[0]["game"] == game.label
+    assert "text" not in rows[0]
+
+
+@pytest.fixture
+def league(db, user):
+    game = baker.make("rankie.Game", parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>[\s\S]*)")
+    rule = baker.make("rankie.GameRule", game=game, py_class="apps.rankie.scorers.SimpleScorer", py_kwargs={})
+    league = baker.make("rankie.League", rule=rule, start_dt=timezone.now() - timedelta(days=1))
+    league.players.add(user)
+    return league
+
+
+def test_submit_game_result(api_client, user, league):
+    url = reverse("api:gameresults-submit")
+    data = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT", "text": "game 1 1"}
+
+    response = api_client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="key")
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data["registrations"] == [
+        {
+            "league": league.label,
+            "round": "1",
+            "score": 1,
+            "standing_score": 1,
+            "rank": 1,
+            "prev_rank": None,
+            "mvp": True,
+            "new_leader": False,
+        }
+    ]
+
+    replayed = api_client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="key")
+    assert replayed.status_code == status.HTTP_201_CREATED
+    assert replayed["Idempotent-Replayed"] == "true"
+    assert replayed.json() == response.json()
+    assert GameResult.objects.count() == 1
+    assert RoundResult.objects.count() == 1
+
+    duplicate = api_client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="another_key")
+    assert duplicate.status_code == status.HTTP_409_CONFLICT
+    assert duplicate.data["code"] == "already_registered"
+
+
+@pytest.mark.parametrize(
+    "text, rule_kwargs",
+    [
+        ("unparsable", {}),
+        # Rule parses the score with its own pattern
+        ("game 1 x", {"vars_regex": "(?P<value>[0-9]+)", "expression": "{value}"}),
+    ],
+)
+def test_submit_unparsable_game_result(api_client, user, league, text, rule_kwargs):
+    if rule_kwargs:
+        league.rule.py_class = "apps.rankie.scorers.ExpressionScorer"
+        league.rule.py_kwargs = rule_kwargs
+        league.rule.save()
+    url = reverse("api:gameresults-submit")
+    data = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT", "text": text}
+
+    response = api_client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["code"] == "unparsable"
+    assert not GameResult.objects.exists()
+
+
+def test_submit_retries_concurrently_created_round(api_client, user, league, monkeypatch):
+    attempts = []
+
+    def register(game_result):
+        attempts.append(game_result.text)
+        if len(attempts) == 1:
+            raise IntegrityError("UNIQUE constraint failed: round.label, round.league_id")
+        return register_game_result(game_result)
+
+    monkeypatch.setattr(views, "register_game_result", register)
+    url = reverse("api:gameresults-submit")
+    data = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT", "text": "game 1 1"}
+
+    response = api_client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+    assert attempts == ["game 1 1", "game 1 1"]
+    assert RoundResult.objects.filter(raw__text="game 1 1").count() == 1
+
+    # Race that doesn't go away is left to the client
+    attempts.clear()
+    monkeypatch.setattr(views.GameResultViewSet, "SUBMIT_ATTEMPTS", 1)
+    response = api_client.post(url, {**data, "text": "game 2 1"}, format="json")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.data["code"] == "retry"
+
+
+def test_idempotency_keys_are_scoped_by_player(api_client, user, league):
+    other_player = baker.make("authx.User")
+    league.players.add(other_player)
+    url = reverse("api:gameresults-submit")
+    data = {"game": league.rule.game.label, "origin": "TG_BOT", "text": "game 1 1"}
+
+    for player in (user, other_player):
+        response = api_client.post(url, {**data, "player": player.username}, format="json", HTTP_IDEMPOTENCY_KEY="1")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert not response.has_header("Idempotent-Replayed")
+
+    assert GameResult.objects.count() == 2
+    assert set(IdempotencyKey.objects.values_list("key", "player", "origin")) == {
+        ("1", user.username, "TG_BOT"),
+        ("1", other_player.username, "TG_BOT"),
+    }
+
+
+def test_idempotency_keys_are_bounded(db, settings):
+    settings.RANKIE_IDEMPOTENCY_KEY_LIMIT = 2
+    for i in range(0, 5):
+        IdempotencyKey.store(f"key{i}", status.HTTP_201_CREATED, {})
+    assert list(IdempotencyKey.objects.order_by("pk").values_list("key", flat=True)) == ["key3", "key4"]
+
+
+def test_submit_game_results_batch(api_client, user, league):
+    url = reverse("api:gameresults-submit-batch")
+    item = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT", "text": "game 1 1"}
+    data = [
+        {**item, "idempotency_key": "key1"},
+        {**item, "idempotency_key": "key1"},
+        {**item, "idempotency_key": "key2"},
+        {**item, "text": "game 2 1", "player": "unknown", "idempotency_key": "key3"},
+    ]
+
+    response = api_client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert [(result["status"], result["replayed"]) for result in response.data] == [
+        (status.HTTP_201_CREATED, False),
+        (status.HTTP_201_CREATED, True),
+        (status.HTTP_409_CONFLICT, False),
+        (status.HTTP_400_BAD_REQUEST, False),
+    ]
+    assert GameResult.objects.count() == 1
+
+
+def test_submit_game_result_throttled(api_client, settings, user, league):
+    settings.RANKIE_THROTTLE_RATES = {"player": "2/min", "origin": "100/min"}
+    url = reverse("api:gameresults-submit")
+    data = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT"}
+
+    for i in range(0, 2):
+        response = api_client.post(url, {**data, "text": f"game {i} 1"}, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+
+    response = api_client.post(url, {**data, "text": "game 2 1"}, format="json")
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert 0 < int(response["Retry-After"]) <= 30
+
+    other_player = baker.make("authx.User")
+    league.players.add(other_player)
+    response = api_client.post(url, {**data, "player": other_player.username, "text": "game 2 1"}, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+def test_submit_game_results_batch_throttled_per_player(api_client, settings, user, league):
+    settings.RANKIE_THROTTLE_RATES = {"player": "2/min", "origin": "100/min"}
+    other_player = baker.make("authx.User")
+    league.players.add(other_player)
+    url = reverse("api:gameresults-submit-batch")
+    item = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT"}
+    data = [{**item, "text": f"game {i} 1"} for i in range(0, 3)] + [
+        {**item, "player": other_player.username, "text": "game 1 1"}
+    ]
+
+    response = api_client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert [result["status"] for result in response.data] == [
+        status.HTTP_201_CREATED,
+        status.HTTP_201_CREATED,
+        status.HTTP_429_TOO_MANY_REQUESTS,
+        status.HTTP_201_CREATED,
+    ]
+    assert 0 < response.data[2]["data"]["wait"] <= 30
+
+
+def test_submit_origin_doesnt_pick_throttle_bucket(api_client, settings, user, league):
+    settings.RANKIE_THROTTLE_RATES = {"player": "100/min", "origin": "2/min"}
+    url = reverse("api:gameresults-submit")
+    data = {"game": league.rule.game.label, "player": user.username}
+
+    for i, origin in enumerate(["CUSTOM", "TG_BOT"]):
+        response = api_client.post(url, {**data, "origin": origin, "text": f"game {i} 1"}, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+
+    response = api_client.post(url, {**data, "origin": "TG_BOT", "text": "game 2 1"}, format="json")
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    # Authenticated client has a bucket of its own
+    api_client.force_authenticate(user)
+    response = api_client.post(url, {**data, "origin": "TG_BOT", "text": "game 2 1"}, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+def test_submit_batch_larger_than_throttle_capacity(api_client, settings, user, league):
+    settings.RANKIE_THROTTLE_RATES = {"player": "100/min", "origin": "2/min"}
+    url = reverse("api:gameresults-submit-batch")
+    item = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT"}
+
+    response = api_client.post(url, [{**item, "text": f"game {i} 1"} for i in range(0, 3)], format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["detail"] == "Expected a list of at most 2 game results"
+
+    # Rejected batch isn't charged
+    response = api_client.post(url, [{**item, "text": f"game {i} 1"} for i in range(0, 2)], format="json")
+    assert [result["status"] for result in response.data] == [status.HTTP_201_CREATED] * 2
+
+
+def test_submit_game_results_batch_unparsable_item(api_client, user, league):
+    url = reverse("api:gameresults-submit-batch")
+    item = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT"}
+    # Text the game pattern doesn't match can't be scored
+    data = [{**item, "text": "unparsable"}, {**item, "text": "game 1 1"}]
+
+    response = api_client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert [result["status"] for result in response.data] == [
+        status.HTTP_400_BAD_REQUEST,
+        status.HTTP_201_CREATED,
+    ]
+    assert response.data[0]["data"]["code"] == "unparsable"
+    assert list(GameResult.objects.values_list("text", flat=True)) == ["game 1 1"]
+
+
+def test_submit_game_results_batch_item_error(api_client, user, league, monkeypatch):
+    def register(game_result):
+        if game_result.text == "game 1 1":
+            raise RuntimeError("Unexpected")
+        return register_game_result(game_result)
+
+    monkeypatch.setattr(views, "register_game_result", register)
+    url = reverse("api:gameresults-submit-batch")
+    item = {"game": league.rule.game.label, "player": user.username, "origin": "TG_BOT"}
+    data = [{**item, "text": "game 1 1"}, {**item, "text": "game 2 1"}]
+
+    response = api_client.post(url, data, format="json")
+    assert [result["status"] for result in response.data] == [
+        status.HTTP_500_INTERNAL_SERVER_ERROR,
+        status.HTTP_201_CREATED,
+    ]
+    assert response.data[0]["data"]["code"] == "error"
+    assert list(GameResult.objects.values_list("text", flat=True)) == ["game 2 1"]
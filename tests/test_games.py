@@ -0,0 +1,17 @@
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+from apps.rankie.models import Game
+
+
+def test_list_games_detect_regex(api_client, db):
+    baker.make(Game, label="wordle_eng", parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>.*)")
+    baker.make(Game, label="wordle_ru", parser_regex=r"(?P<game>.*)", detect_regex=r"Wordle \(RU\)")
+
+    response = api_client.get(reverse("api:games-list"))
+    assert response.status_code == status.HTTP_200_OK
+    assert [(game["label"], game["detect_regex"]) for game in response.data] == [
+        ("wordle_eng", r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>.*)"),
+        ("wordle_ru", r"Wordle \(RU\)"),
+    ]
@@ -0,0 +1,61 @@
+import json
+
+from io import StringIO
+from datetime import timedelta
+
+import pytest
+
+from django.utils import timezone
+from model_bakery import baker
+from django.core.management import call_command
+
+from apps.rankie.models import Game, League, GameRule, Standing, GameResult
+
+
+@pytest.fixture
+def league(db):
+    game = baker.make(Game, label="game", parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>[\s\S]*)")
+    rule = baker.make(GameRule, game=game, py_class="apps.rankie.scorers.SimpleScorer", py_kwargs={})
+    return baker.make(League, rule=rule, start_dt=(timezone.now() - timedelta(days=1)))
+
+
+@pytest.fixture
+def players(db, league, django_user_model):
+    players = [baker.make(django_user_model, username=f"player{i}") for i in range(0, 2)]
+    league.players.add(*players)
+    return players
+
+
+def test_import_results_jsonl(tmp_path, league, players):
+    baker.make(GameResult, player=players[0], game=league.rule.game, text="game 1 1", origin="CUSTOM")
+    rows = [
+        {"player": "player0", "game": "game", "text": "game 1 1"},
+        {"player": "player0", "game": "game", "text": "game 2 1", "origin": "TG_BOT"},
+        {"player": "player1", "game": "game", "text": "game 2 1"},
+        {"player": "unknown", "game": "game", "text": "game 2 1"},
+        {"player": "player1", "game": "unknown", "text": "game 2 1"},
+    ]
+    path = tmp_path / "results.jsonl"
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\nnot a json\n")
+
+    call_command("import_results", str(path), chunk_size=2, stdout=StringIO())
+
+    assert GameResult.objects.count() == 3
+    assert GameResult.objects.filter(origin=GameResult.ORIGIN.TG_BOT).count() == 1
+    rejects = [json.loads(line) for line in (tmp_path / "results.jsonl.rejected.jsonl").read_text().splitlines()]
+    assert [reject["line"] for reject in rejects] == [4, 5, 6]
+    assert rejects[0]["reason"] == "unknown player 'unknown'"
+
+    # only new results are registered
+    standings = Standing.objects.filter(league=league).order_by("player__username")
+    assert [standing.score for standing in standings] == [1, 1]
+
+
+def test_import_results_csv(tmp_path, league, players):
+    path = tmp_path / "results.csv"
+    path.write_text('player,game,text\nplayer0,game,"game 1\n1"\nplayer1,game,game 1 1\n')
+
+    call_command("import_results", str(path), "--no-register", stdout=StringIO())
+
+    assert list(GameResult.objects.order_by("pk").values_list("text", flat=True)) == ["game 1\n1", "game 1 1"]
+    assert not Standing.objects.filter(score__isnull=False).exists()
@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+import pytest
+
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from apps.rankie.core import register_game_result
+from apps.rankie.models import Game, League, GameRule, Standing, GameResult, LeagueEvent, LeagueSummary
+
+
+@pytest.fixture
+def league(db):
+    game = baker.make(Game, label="game", parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>[\s\S]*)")
+    rule = baker.make(
+        GameRule,
+        game=game,
+        py_class="apps.rankie.scorers.ExpressionScorer",
+        py_kwargs={"vars_regex": "(?P<value>[0-9]+)", "expression": "{value}"},
+    )
+    return baker.make(League, label="league", rule=rule, start_dt=(timezone.now() - timedelta(days=1)))
+
+
+@pytest.fixture
+def players(league, django_user_model):
+    players = [baker.make(django_user_model, username=f"player{i}") for i in range(0, 5)]
+    league.players.add(*players)
+    for round_label in range(1, 7):
+        for i, player in enumerate(players):
+            text = f"game {round_label} {(i * 3 + round_label) % 5}"
+            register_game_result(baker.make(GameResult, player=player, game=league.rule.game, text=text))
+    return players
+
+
+def test_registration_rebuilds_summary(league, players):
+    document = LeagueSummary.objects.get(league=league).document
+
+    top = Standing.objects.filter(league=league).select_related("player").order_by("rank")[:3]
+    assert document["standings"] == [
+        {
+            "rank": standing.rank,
+            "player_id": standing.player_id,
+            "username": standing.player.username,
+            "score": standing.score,
+            "mvp_count": standing.mvp_count,
+        }
+        for standing in top
+    ]
+    assert [event["context"] for event in document["events"]] == list(
+        LeagueEvent.objects.filter(league=league).order_by("-id").values_list("context", flat=True)[:5]
+    )
+    assert [round_["label"] for round_ in document["rounds"]] == ["6", "5", "4", "3"]
+    assert all(round_["mvp"] and round_["mvp_score"] is not None for round_ in document["rounds"])
+
+
+def test_summary_of_derived_ranks(league, players):
+    stored = LeagueSummary.objects.get(league=league).document["standings"]
+    League.objects.filter(pk=league.pk).update(rank_mode=League.RANK_MODE.DERIVED)
+    Standing.objects.filter(league=league).update(rank=None)
+
+    derived = LeagueSummary.rebuild(League.objects.get(pk=league.pk)).document["standings"]
+
+    assert [row["rank"] for row in derived] == [1, 2, 3]
+    assert derived == stored
+
+
+def test_join_and_leave_rebuild_summary(client, league, players, django_user_model):
+    newcomer = baker.make(django_user_model)
+    client.force_login(newcomer)
+
+    client.get(reverse("site:league-join", args=[league.label]))
+    assert league.summary.document["events"][0]["ev_type"] == LeagueEvent.EV_TYPE.NEW_PLAYER
+
+    client.get(reverse("site:league-leave", args=[league.label]))
+    league.summary.refresh_from_db()
+    assert league.summary.document["events"][0]["ev_type"] == LeagueEvent.EV_TYPE.PLAYER_LEFT
+
+
+def test_detail_page_renders_summary(client, league, players, django_assert_max_num_queries):
+    last = Standing.objects.get(league=league, rank=5)
+    client.force_login(last.player)
+    # Page doesn't read the events themselves
+    LeagueEvent.objects.filter(league=league).delete()
+
+    # Session, user, league state for the etag, league with its summary, own standing
+    with django_assert_max_num_queries(5):
+        response = client.get(reverse("site:league-detail", args=[league.label]))
+
+    content = response.content.decode()
+    for row in league.summary.document["standings"] + [{"username": last.player.username}]:
+        assert f"@{row['username']}" in content
+    assert "earned" in content
+    assert "Leave" in content
+
+
+def test_detail_page_without_summary(client, league, players):
+    LeagueSummary.objects.all().delete()
+    client.force_login(players[0])
+
+    response = client.get(reverse("site:league-detail", args=[league.label]))
+
+    assert response.status_code == 200
+    assert not LeagueSummary.objects.exists()
@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+import pytest
+
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from apps.rankie.models import League, Standing, LeagueEvent
+
+
+@pytest.fixture
+def player(db, django_user_model):
+    return baker.make(django_user_model)
+
+
+@pytest.fixture
+def league(db, player):
+    league = baker.make(League, start_dt=(timezone.now() - timedelta(days=1)))
+    league.players.add(player)
+    return league
+
+
+@pytest.mark.parametrize("url_name", ["league-detail", "league-standings", "league-rounds", "league-events"])
+def test_league_pages_not_modified(client, player, league, url_name):
+    client.force_login(player)
+    url = reverse(f"site:{url_name}", args=[league.label])
+
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response["ETag"]
+    assert response.has_header("Last-Modified")
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    league.events.create(ev_type=LeagueEvent.EV_TYPE.NEW_PLAYER, context={"username": player.username})
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_league_page_etag_depends_on_user(client, django_user_model, player, league):
+    url = reverse("site:league-detail", args=[league.label])
+    client.force_login(player)
+    etag = client.get(url)["ETag"]
+
+    client.force_login(baker.make(django_user_model))
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+
+
+def test_join_league_is_not_conditional(client, django_user_model, league):
+    newcomer = baker.make(django_user_model)
+    client.force_login(newcomer)
+    etag = client.get(reverse("site:league-detail", args=[league.label]))["ETag"]
+
+    response = client.get(reverse("site:league-join", args=[league.label]), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert league.players.filter(pk=newcomer.pk).exists()
+
+
+@pytest.mark.parametrize("rank_mode", [League.RANK_MODE.STORED, League.RANK_MODE.SHIFTED])
+def test_leave_league_moves_ranks_up(client, django_user_model, rank_mode):
+    league = baker.make(League, start_dt=(timezone.now() - timedelta(days=1)), rank_mode=rank_mode)
+    players = baker.make(django_user_model, _quantity=4)
+    league.players.set(players)
+    for rank, player in enumerate(players[:3], 1):
+        Standing.objects.filter(league=league, player=player).update(rank=rank, score=10 - rank)
+    client.force_login(players[1])
+
+    client.get(reverse("site:league-leave", args=[league.label]))
+
+    assert list(Standing.objects.filter(league=league).order_by("player").values_list("player", "rank")) == [
+        (players[0].pk, 1),
+        (players[2].pk, 2),
+        (players[3].pk, None),
+    ]
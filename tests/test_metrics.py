@@ -0,0 +1,118 @@
+import os
+import json
+import time
+
+from datetime import timedelta
+
+import pytest
+
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+
+from apps.rankie.models import GameRule
+from apps.rankie.metrics import REGISTRY, Counter, Registry, Histogram
+from apps.rankie.scorers import get_scorer
+
+
+def get_sample(name, **labels):
+    labels = json.dumps([[key, value] for key, value in labels.items()])
+    return REGISTRY.collect().get((name, labels), 0)
+
+
+def test_registry_sums_samples_of_all_processes(tmp_path):
+    workers = [Registry(str(tmp_path), flush_interval=0) for _ in range(2)]
+    for i, registry in enumerate(workers, 1):
+        counter = Counter("requests_total", "Requests.", ["view"], registry=registry)
+        histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1), registry=registry)
+        counter.inc(i, view="home")
+        histogram.observe(0.5 * i)
+        registry.flush()
+
+    lines = workers[0].render().splitlines()
+    assert 'requests_total{view="home"} 3' in lines
+    assert [line for line in lines if line.startswith("latency_seconds")] == [
+        'latency_seconds_bucket{le="0.1"} 0',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 2',
+        "latency_seconds_sum 1.5",
+        "latency_seconds_count 2",
+    ]
+
+
+def test_registry_removes_files_of_stopped_workers(tmp_path):
+    (stopped, current) = [Registry(str(tmp_path), flush_interval=0, max_age=60) for _ in range(2)]
+    for registry in (stopped, current):
+        Counter("requests_total", "Requests.", registry=registry).inc()
+    stopped_path = tmp_path / stopped.filename
+    assert {path.name for path in tmp_path.iterdir()} == {stopped.filename, current.filename}
+
+    assert current.collect()[("requests_total", "[]")] == 2
+    os.utime(stopped_path, (time.time() - 61, time.time() - 61))
+    assert current.collect()[("requests_total", "[]")] == 1
+    assert not stopped_path.exists()
+
+
+@pytest.fixture
+def league(db, django_user_model):
+    player = baker.make(django_user_model, username="player")
+    game = baker.make("rankie.Game", label="game", parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>[\s\S]*)")
+    rule = baker.make("rankie.GameRule", game=game, py_class="apps.rankie.scorers.SimpleScorer", py_kwargs={})
+    league = baker.make("rankie.League", rule=rule, start_dt=timezone.now() - timedelta(days=1))
+    league.players.add(player)
+    return league
+
+
+def test_metrics_endpoint(client, api_client, league):
+    created = get_sample("rankie_submissions_total", origin="TG_BOT", outcome="created")
+    duplicates = get_sample("rankie_submissions_total", origin="TG_BOT", outcome="duplicate")
+    registrations = get_sample("rankie_registration_duration_seconds_count")
+
+    data = {"game": "game", "player": "player", "origin": "TG_BOT", "text": "game 1 1"}
+    for _ in range(2):
+        api_client.post(reverse("api:gameresults-submit"), data, format="json")
+
+    response = client.get(reverse("site:metrics"))
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain")
+    assert get_sample("rankie_submissions_total", origin="TG_BOT", outcome="created") == created + 1
+    assert get_sample("rankie_submissions_total", origin="TG_BOT", outcome="duplicate") == duplicates + 1
+    assert get_sample("rankie_registration_duration_seconds_count") == registrations + 1
+    lines = response.content.decode().splitlines()
+    assert any(line.startswith('rankie_request_db_queries_count{view="api:gameresults-submit"}') for line in lines)
+
+
+def test_metrics_endpoint_token(client, settings, db):
+    settings.RANKIE_METRICS_TOKEN = "secret"
+
+    assert client.get(reverse("site:metrics")).status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.get(reverse("site:metrics"), HTTP_AUTHORIZATION="Bearer secret")
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_scorer_cache(league):
+    rule = GameRule.objects.get(pk=league.rule_id)
+    rule.py_kwargs = {"parser_regex": r"(?P<game>\w+) #(?P<round>[0-9]+) (?P<score>[\s\S]*)"}
+    rule.save()
+    misses = get_sample("rankie_scorer_cache_total", result="miss")
+    hits = get_sample("rankie_scorer_cache_total", result="hit")
+
+    scorer = get_scorer(rule)
+    assert get_scorer(GameRule.objects.get(pk=rule.pk)) is scorer
+    # Kwargs of the rule are left as they are
+    assert "parser_regex" in rule.py_kwargs
+    assert scorer.pattern.pattern == rule.py_kwargs["parser_regex"]
+    assert get_sample("rankie_scorer_cache_total", result="miss") == misses + 1
+    assert get_sample("rankie_scorer_cache_total", result="hit") == hits + 1
+
+    rule.save()
+    assert get_scorer(rule) is not scorer
+
+    # Changes of the game's parser regex are picked up right away
+    rule.py_kwargs = {}
+    rule.save()
+    get_scorer(rule)
+    rule.game.parser_regex = r"(?P<game>\w+) round (?P<round>[0-9]+) (?P<score>[\s\S]*)"
+    rule.game.save()
+    assert get_scorer(GameRule.objects.get(pk=rule.pk)).pattern.pattern == rule.game.parser_regex
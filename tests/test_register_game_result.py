@@ -1,12 +1,35 @@
+import logging
+
+from io import StringIO
 from datetime import timedelta
 
 import pytest
 
+from django.db import connection
 from django.utils import timezone
 from model_bakery import baker
-
-from apps.rankie.core import register_game_result, get_league_queryset_for_standings_update
-from apps.rankie.models import Game, Round, League, GameRule, Standing, GameResult, RoundResult
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+
+from apps.rankie.core import (
+    fetch_standings,
+    fetch_round_results,
+    register_game_result,
+    get_league_queryset_for_standings_update,
+)
+from apps.rankie.models import (
+    Game,
+    Round,
+    League,
+    GameRule,
+    Standing,
+    GameResult,
+    LeagueEvent,
+    RoundResult,
+    StandingSnapshot,
+)
+from apps.rankie.scorers import SimpleScorer
 
 
 @pytest.fixture
@@ -37,15 +60,20 @@ def test_get_league_queryset_for_standings_update(django_user_model, db, django_
         # for testing correct order in fetched standings
         Standing.objects.filter(player=another_player, league=league).update(score=1)
 
-    with django_assert_max_num_queries(5):
-        active_leagues = get_league_queryset_for_standings_update(player, game)
-        assert len(active_leagues) == 2
-        for league in active_leagues:
-            assert len(league.fetched_rounds) == 5
-            assert len(league.fetched_standings) == 2
-            assert league.fetched_standings[-1].player == player
-            for round in league.fetched_rounds:
-                assert len(round.fetched_round_results) == 2
+    with django_assert_max_num_queries(4):
+        active_leagues = list(get_league_queryset_for_standings_update(player, game))
+        curr_round_ids = [league.fetched_rounds[0].pk for league in active_leagues]
+        round_results = fetch_round_results(player, [league.pk for league in active_leagues], curr_round_ids)
+        standings = fetch_standings(player, active_leagues)
+
+    assert len(active_leagues) == 2
+    for league in active_leagues:
+        assert len(league.fetched_rounds) == 5
+        assert len(standings[league.pk]) == 2
+        assert standings[league.pk][-1].player_id == player.pk
+        # Other players' results are fetched in the current round only
+        for round in league.fetched_rounds:
+            assert len(round_results[round.pk]) == (2 if round.pk in curr_round_ids else 1)
 
 
 def test_standing_on_adding_player(db, django_user_model, league):
@@ -143,6 +171,38 @@ def test_register_multi_player_single_results(db, django_user_model, league):
     assert standing2.mvp_count == 0
 
 
+def test_register_round_stats(db, django_user_model, league):
+    players = [baker.make(django_user_model) for _ in range(0, 3)]
+    league.rule.py_class = "apps.rankie.scorers.ExpressionScorer"
+    league.rule.py_kwargs = {"vars_regex": "(?P<value>[0-9]+)", "expression": "{value}"}
+    league.rule.save()
+    league.players.add(*players)
+
+    for player, score in zip(players, [2, 6, 1]):
+        register_game_result(baker.make(GameResult, player=player, game=league.rule.game, text=f"game 1 {score}"))
+
+    round = Round.objects.get(league=league, label="1")
+    assert round.mvp == players[1]
+    assert round.mvp_score == 6
+    assert round.result_count == 3
+    assert round.avg_score == 3
+    assert round.median_score == 2
+
+
+def test_backfill_round_stats(db, django_user_model, league):
+    round = baker.make(Round, league=league)
+    for score in [1, 2, 6]:
+        baker.make(RoundResult, round=round, score=score)
+    empty_round = baker.make(Round, league=league)
+
+    call_command("backfill_round_stats", stdout=StringIO())
+
+    round.refresh_from_db()
+    assert (round.mvp_score, round.avg_score, round.median_score, round.result_count) == (6, 3, 2, 3)
+    empty_round.refresh_from_db()
+    assert (empty_round.mvp_score, empty_round.result_count) == (None, 0)
+
+
 def test_register_same_score_diff_rounds(db, django_user_model, league):
     players = [baker.make(django_user_model, id=i) for i in range(0, 4)]
     league.players.add(*players)
@@ -224,3 +284,162 @@ def test_register_multi_player_multi_results(db, django_user_model, league):
         {"rank": 3, "player": 0, "score": 2.0, "mvp_count": 2},
         {"rank": 4, "player": 2, "score": 2.0, "mvp_count": 0},
     ]
+
+
+def test_register_parses_once_per_rule(db, django_user_model, league, monkeypatch):
+    other_rule = baker.make(GameRule, game=league.rule.game, py_class="apps.rankie.scorers.SimpleScorer", py_kwargs={})
+    leagues = [league] + [
+        baker.make(League, rule=rule, start_dt=league.start_dt) for rule in (league.rule, league.rule, other_rule)
+    ]
+    player = baker.make(django_user_model)
+    for league_ in leagues:
+        league_.players.add(player)
+
+    parsed = []
+    parse_game_result = SimpleScorer.parse_game_result
+    monkeypatch.setattr(
+        SimpleScorer, "parse_game_result", lambda self, result: parsed.append(self) or parse_game_result(self, result)
+    )
+    registrations = register_game_result(baker.make(GameResult, player=player, game=league.rule.game, text="g 1 1"))
+
+    assert len(registrations) == 4
+    # Round label of every rule, the round score of the simple scorer doesn't need parsing
+    assert len(parsed) == 2
+    assert RoundResult.objects.filter(player=player, round__label="1").count() == 4
+
+
+def test_register_game_result_timing(league, django_user_model, caplog):
+    player = baker.make(django_user_model)
+    league.players.add(player)
+    game_result = baker.make(GameResult, player=player, game=league.rule.game, text="game 1 1")
+
+    with caplog.at_level(logging.INFO, logger="apps.rankie.timing"):
+        register_game_result(game_result)
+
+    (record,) = [record for record in caplog.records if record.name == "apps.rankie.timing"]
+    assert record.timing["op"] == "register_game_result"
+    assert record.timing["leagues"] == 1
+    assert record.timing[f"league.{league.pk}.players"] == 1
+    for span in ("fetch_ms", f"league.{league.pk}.parse_score_ms", f"league.{league.pk}.rank_shift_ms"):
+        assert record.timing[span] >= 0
+    assert f"game_result={game_result.pk}" in record.getMessage()
+
+
+def test_register_derived_ranks(db, django_user_model, league):
+    derived = baker.make(League, rule=league.rule, start_dt=league.start_dt, rank_mode=League.RANK_MODE.DERIVED)
+    players = baker.make(django_user_model, _quantity=4)
+    for league_ in (league, derived):
+        league_.players.set(players)
+
+    registrations = []
+    for round_label, scores in (("1", [3, 1, 2, 1]), ("2", [1, 4, 1, 5])):
+        for player, score in zip(players, scores):
+            text = f"game {round_label} {score}"
+            game_result = baker.make(GameResult, player=player, game=league.rule.game, text=text)
+            registrations.append(
+                {registration["league"]: registration for registration in register_game_result(game_result)}
+            )
+
+    # Registration reports the same ranks, derived ones are never stored
+    for registration in registrations:
+        assert {**registration[league.label], "league": derived.label} == registration[derived.label]
+    assert not Standing.objects.filter(league=derived, rank__isnull=False).exists()
+    expected = list(Standing.objects.filter(league=league).order_by("player").values_list("player", "rank"))
+    ranked = Standing.objects.with_rank().filter(league=derived).order_by("player")
+    assert [(standing.player_id, standing.current_rank) for standing in ranked] == expected
+    assert [(standing.player_id, standing.get_rank()) for standing in ranked] == expected
+    assert [snapshot.get_rows() for snapshot in derived.standing_snapshots.order_by("round__label")] == [
+        snapshot.get_rows() for snapshot in league.standing_snapshots.order_by("round__label")
+    ]
+
+    # Others' standings are read unlocked and merged in the rank order
+    fetched = fetch_standings(players[1], [league, derived])
+    assert [standing.player_id for standing in fetched[derived.pk]] == [
+        standing.player_id for standing in fetched[league.pk]
+    ]
+
+    # Only the player's standing is written, though the player overtakes the others in a new round
+    others = Standing.objects.filter(league=derived).exclude(player=players[0])
+    updated_before = dict(others.values_list("pk", "updated"))
+    game_result = baker.make(GameResult, player=players[0], game=league.rule.game, text="game 3 9")
+    assert [registration["rank"] for registration in register_game_result(game_result)] == [1, 1]
+    assert dict(others.values_list("pk", "updated")) == updated_before
+
+
+def test_register_shifted_ranks(db, django_user_model, league):
+    league.rule.py_class = "apps.rankie.scorers.ExpressionScorer"
+    league.rule.py_kwargs = {"vars_regex": "(?P<value>[0-9]+)", "expression": "{value}"}
+    league.rule.save()
+    shifted = baker.make(League, rule=league.rule, start_dt=league.start_dt, rank_mode=League.RANK_MODE.SHIFTED)
+    players = baker.make(django_user_model, _quantity=5)
+    for league_ in (league, shifted):
+        league_.players.set(players)
+
+    for round_label, scores in (("1", [3, 1, 2, 1, 2]), ("2", [1, 4, 1, 5, 2]), ("3", [2, 2, 6, 1, 1])):
+        for player, score in zip(players, scores):
+            text = f"game {round_label} {score}"
+            game_result = baker.make(GameResult, player=player, game=league.rule.game, text=text)
+            registrations = {registration["league"]: registration for registration in register_game_result(game_result)}
+            assert {**registrations[league.label], "league": shifted.label} == registrations[shifted.label]
+
+    assert list(Standing.objects.filter(league=shifted).order_by("player").values_list("player", "rank")) == list(
+        Standing.objects.filter(league=league).order_by("player").values_list("player", "rank")
+    )
+    assert [snapshot.get_rows() for snapshot in shifted.standing_snapshots.order_by("round__label")] == [
+        snapshot.get_rows() for snapshot in league.standing_snapshots.order_by("round__label")
+    ]
+    # Other standings aren't loaded, they're shifted in the database
+    fetched = fetch_standings(players[0], [league, shifted])
+    assert len(fetched[league.pk]) == 5
+    assert [standing.player_id for standing in fetched[shifted.pk]] == [players[0].pk]
+
+
+def test_register_shifted_ranks_snapshot(db, django_user_model, league):
+    league.rule.py_class = "apps.rankie.scorers.ExpressionScorer"
+    league.rule.py_kwargs = {"vars_regex": "(?P<value>[0-9]+)", "expression": "{value}"}
+    league.rule.save()
+    shifted = baker.make(League, rule=league.rule, start_dt=league.start_dt, rank_mode=League.RANK_MODE.SHIFTED)
+    players = baker.make(django_user_model, _quantity=6)
+    shifted.players.set(players)
+
+    def register(player, text):
+        game_result = baker.make(GameResult, player=player, game=league.rule.game, text=text)
+        with CaptureQueriesContext(connection) as queries:
+            register_game_result(game_result)
+        ranked = Standing.objects.filter(league=shifted, rank__isnull=False).order_by("rank")
+        snapshot = StandingSnapshot.objects.filter(league=shifted).order_by("-updated", "-pk").first()
+        assert snapshot.get_rows() == list(ranked.values_list("player_id", "rank", "score"))
+        return [query["sql"] for query in queries]
+
+    for player, score in zip(players[:5], [3, 9, 2, 6, 1]):
+        register(player, f"game 1 {score}")
+
+    # Only the changed ranks are read for the snapshot, the rest comes from the previous one
+    assert not [sql for sql in register(players[5], "game 2 4") if '"rank" IS NOT NULL' in sql]
+
+    # Ranks shifted by leaving aren't in the previous snapshot, the whole league is read
+    left_rank = Standing.objects.get(league=shifted, player=players[1]).rank
+    shifted.players.remove(players[1])
+    Standing.objects.filter(league=shifted, rank__gt=left_rank).update(rank=F("rank") - 1)
+    shifted.events.create(ev_type=LeagueEvent.EV_TYPE.PLAYER_LEFT)
+    assert [sql for sql in register(players[0], "game 2 5") if '"rank" IS NOT NULL' in sql]
+    register(players[4], "game 3 7")
+
+
+def test_register_shifted_ranks_after_mvp_left(db, django_user_model, league):
+    league.rule.py_class = "apps.rankie.scorers.ExpressionScorer"
+    league.rule.py_kwargs = {"vars_regex": "(?P<value>[0-9]+)", "expression": "{value}"}
+    league.rule.save()
+    shifted = baker.make(League, rule=league.rule, start_dt=league.start_dt, rank_mode=League.RANK_MODE.SHIFTED)
+    (mvp, runner_up, player) = baker.make(django_user_model, _quantity=3)
+    shifted.players.set([mvp, runner_up, player])
+    for other, score in ((mvp, 5), (runner_up, 1)):
+        register_game_result(baker.make(GameResult, player=other, game=league.rule.game, text=f"game 1 {score}"))
+
+    shifted.players.remove(mvp)
+    (registration,) = register_game_result(
+        baker.make(GameResult, player=player, game=league.rule.game, text="game 1 6")
+    )
+
+    assert registration["mvp"] and registration["rank"] == 1
+    assert Round.objects.get(league=shifted, label="1").mvp == player
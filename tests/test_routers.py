@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+import pytest
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from apps.rankie.core import register_game_result
+from apps.rankie.views import JoinLeagueView
+from apps.rankie.models import Game, League, GameRule, Standing, GameResult
+from apps.rankie.routers import REPLICA, use_replica
+from apps.rankie.middleware import ReplicaMiddleware
+
+
+def replicate():
+    """Copy the primary into the replica, as the replication would."""
+
+    for alias in (DEFAULT_DB_ALIAS, REPLICA):
+        connections[alias].ensure_connection()
+    connections[DEFAULT_DB_ALIAS].connection.backup(connections[REPLICA].connection)
+
+
+@pytest.fixture
+def replica(transactional_db, tmp_path):
+    # Second SQLite file stands for the replica, queries have to run outside of test transactions to be routed
+    connections.databases[REPLICA] = {**connections.databases[DEFAULT_DB_ALIAS], "NAME": str(tmp_path / "replica")}
+    try:
+        yield
+    finally:
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+
+@pytest.fixture
+def league(replica, django_user_model, client):
+    game = baker.make(Game, parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>[\s\S]*)")
+    rule = baker.make(GameRule, game=game, py_class="apps.rankie.scorers.SimpleScorer", py_kwargs={})
+    league = baker.make(League, name="replicated", rule=rule, start_dt=timezone.now() - timedelta(days=1))
+    player = baker.make(django_user_model)
+    league.players.add(player)
+    client.force_login(player)
+    replicate()
+    # Lagging replica doesn't have the rename yet
+    League.objects.filter(pk=league.pk).update(name="renamed")
+    return league
+
+
+def test_read_only_requests_read_replica(client, league):
+    response = client.get(reverse("site:league-detail", args=[league.label]))
+
+    assert "replicated" in response.content.decode()
+    assert ReplicaMiddleware.COOKIE not in response.cookies
+
+
+def test_writing_client_is_pinned_to_primary(client, league, django_user_model):
+    newcomer = baker.make(django_user_model)
+    replicate()
+    client.force_login(newcomer)
+
+    response = client.get(reverse("site:league-join", args=[league.label]))
+    assert response.status_code == 200
+    assert "renamed" in response.content.decode()
+    assert ReplicaMiddleware.COOKIE in response.cookies
+
+    # Replica hasn't got the new player yet, the next page is read from the primary
+    response = client.get(reverse("site:league-standings", args=[league.label]))
+    assert newcomer.username in response.content.decode()
+
+
+@pytest.fixture
+def newcomer_clients(league, django_user_model):
+    clients = [Client() for _ in range(2)]
+    for newcomer_client in clients:
+        newcomer_client.force_login(baker.make(django_user_model))
+    replicate()
+    return clients
+
+
+def test_writing_clients_are_pinned_over_persistent_connection(newcomer_clients, reconnecting_db, league, monkeypatch):
+    # Writes of a view that isn't declared as writing are told by the statements
+    monkeypatch.delattr(JoinLeagueView, "replica_reads")
+
+    # Connection is opened by the first request and stays open for the next one
+    for newcomer_client in newcomer_clients:
+        response = newcomer_client.get(reverse("site:league-join", args=[league.label]))
+        assert ReplicaMiddleware.COOKIE in response.cookies
+
+    assert league.players.count() == 3
+
+
+def test_registration_uses_primary(league):
+    player = league.players.get()
+    # Replica doesn't know about the new league yet
+    joined = baker.make(League, rule=league.rule, start_dt=league.start_dt)
+    joined.players.add(player)
+    game_result = baker.make(GameResult, player=player, game=league.rule.game, text="game 1 1")
+
+    with use_replica():
+        assert League.objects.get(pk=league.pk).name == "replicated"
+        registrations = register_game_result(game_result)
+
+    assert {registration["league"] for registration in registrations} == {league.label, joined.label}
+    assert Standing.objects.get(league=joined, player=player).rank == 1
+
+
+def test_registering_api_action_reads_primary(api_client, league):
+    player = league.players.get()
+    # Replica doesn't have the new result yet
+    game_result = baker.make(GameResult, player=player, game=league.rule.game, text="game 1 1")
+
+    response = api_client.get(reverse("api:gameresults-register", args=[game_result.pk]))
+
+    assert response.status_code == 200
+    assert response.data[0]["league"] == league.label
+    assert ReplicaMiddleware.COOKIE in response.cookies
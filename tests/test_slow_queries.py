@@ -0,0 +1,78 @@
+import logging
+
+import pytest
+
+from django.db import connection
+from django.urls import reverse
+from model_bakery import baker
+
+from apps.rankie import slow_queries
+from apps.rankie.core import register_game_result
+from apps.rankie.models import Game, League, GameRule, GameResult
+from apps.rankie.metrics import QueryCounter
+from apps.rankie.slow_queries import SlowQueryLog, install
+
+
+@pytest.fixture
+def slow_query_records(monkeypatch, caplog):
+    # The logger writes to its own file only, records are routed to caplog instead
+    monkeypatch.setattr(slow_queries.logger, "handlers", [])
+    monkeypatch.setattr(slow_queries.logger, "propagate", True)
+    with caplog.at_level(logging.WARNING, logger=slow_queries.__name__):
+        yield lambda: [record.query for record in caplog.records if record.name == slow_queries.__name__]
+
+
+def test_slow_queries_are_logged_with_plan(db, django_user_model, slow_query_records):
+    game = baker.make(Game, parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>[\s\S]*)")
+    rule = baker.make(GameRule, game=game, py_class="apps.rankie.scorers.SimpleScorer", py_kwargs={})
+    league = baker.make(League, rule=rule)
+    player = baker.make(django_user_model)
+    league.players.add(player)
+    game_result = baker.make(GameResult, player=player, game=game, text="game 1 1")
+
+    with connection.execute_wrapper(SlowQueryLog(connection, threshold_ms=0)):
+        register_game_result(game_result)
+
+    records = slow_query_records()
+    assert records
+    select = next(record for record in records if record["sql"].startswith("SELECT"))
+    assert select["caller"].startswith("apps.rankie.core.register_game_result:")
+    assert select["duration_ms"] >= 0
+    assert select["plan"] and not select["plan"].startswith("EXPLAIN failed")
+    # Savepoints and transaction control aren't explained
+    assert all(record["plan"] is None for record in records if record["sql"].startswith("SAVEPOINT"))
+
+
+def test_slow_queries_are_sampled(db, slow_query_records):
+    with connection.execute_wrapper(SlowQueryLog(connection, threshold_ms=0, sample_rate=0)):
+        League.objects.count()
+    with connection.execute_wrapper(SlowQueryLog(connection, threshold_ms=60 * 1000)):
+        League.objects.count()
+
+    assert slow_query_records() == []
+
+
+def test_install_once(db, settings):
+    settings.RANKIE_SLOW_QUERY_MS = 100
+    install(sender=None, connection=connection)
+    install(sender=None, connection=connection)
+
+    assert len([wrapper for wrapper in connection.execute_wrappers if isinstance(wrapper, SlowQueryLog)]) == 1
+
+
+@pytest.fixture
+def user_client(transactional_db, client, django_user_model):
+    client.force_login(baker.make(django_user_model))
+    return client
+
+
+def test_wrappers_survive_reconnects_within_requests(user_client, reconnecting_db, settings):
+    settings.RANKIE_SLOW_QUERY_MS = 100
+
+    for _ in range(3):
+        # Connection is opened lazily by the request, as after `CONN_MAX_AGE = 0` closed it
+        assert user_client.get(reverse("site:league-list")).status_code == 200
+        reconnecting_db.close()
+
+    assert not any(isinstance(wrapper, QueryCounter) for wrapper in reconnecting_db.execute_wrappers)
+    assert len([wrapper for wrapper in reconnecting_db.execute_wrappers if isinstance(wrapper, SlowQueryLog)]) == 1
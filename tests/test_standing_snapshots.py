@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+import pytest
+
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from apps.rankie.core import register_game_result
+from apps.rankie.models import Game, League, GameRule, GameResult, StandingSnapshot
+
+
+@pytest.fixture
+def league(db):
+    game = baker.make(Game, label="game", parser_regex=r"(?P<game>\w+) (?P<round>[0-9]+) (?P<score>[\s\S]*)")
+    rule = baker.make(
+        GameRule,
+        game=game,
+        py_class="apps.rankie.scorers.ExpressionScorer",
+        py_kwargs={"vars_regex": "(?P<value>[0-9]+)", "expression": "{value}"},
+    )
+    return baker.make(League, label="league", rule=rule, start_dt=(timezone.now() - timedelta(days=1)), public=True)
+
+
+@pytest.fixture
+def players(league, django_user_model):
+    players = [baker.make(django_user_model, username=f"player{i}") for i in range(0, 3)]
+    league.players.add(*players)
+    return players
+
+
+def register(player, league, text):
+    return register_game_result(baker.make(GameResult, player=player, game=league.rule.game, text=text))
+
+
+def test_snapshot_is_replaced_on_registration(league, players):
+    register(players[0], league, "game 1 3")
+    register(players[1], league, "game 1 5")
+
+    snapshot = StandingSnapshot.objects.get(round__label="1")
+    assert snapshot.get_rows() == [(players[1].pk, 1, 5.0), (players[0].pk, 2, 3.0)]
+
+    register(players[2], league, "game 2 4")
+
+    assert StandingSnapshot.objects.count() == 2
+    snapshot = StandingSnapshot.objects.get(round__label="2")
+    assert snapshot.get_rows() == [(players[1].pk, 1, 5.0), (players[2].pk, 2, 4.0), (players[0].pk, 3, 3.0)]
+
+
+def test_rank_history_private_league(api_client, league, players):
+    League.objects.filter(pk=league.pk).update(public=False)
+    url = reverse("api:leagues-rank-history", args=[league.label])
+
+    assert api_client.get(url).status_code == 404
+    api_client.force_authenticate(players[0])
+    assert api_client.get(url).status_code == 200
+
+
+def test_rank_history(api_client, league, players, django_assert_max_num_queries):
+    register(players[0], league, "game 1 3")
+    register(players[1], league, "game 1 5")
+    register(players[0], league, "game 2 4")
+
+    with django_assert_max_num_queries(3):
+        response = api_client.get(reverse("api:leagues-rank-history", args=[league.label]))
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "rounds": ["1", "2"],
+        "players": [
+            {"username": "player1", "ranks": [1, 2], "scores": [5.0, 5.0]},
+            {"username": "player0", "ranks": [2, 1], "scores": [3.0, 7.0]},
+        ],
+    }
+
+
+def test_late_result_replays_snapshots_since_its_round(league, players):
+    register(players[0], league, "game 1 5")
+    register(players[1], league, "game 1 3")
+    register(players[1], league, "game 2 10")
+    register(players[0], league, "game 2 1")
+
+    # Late result of the first round doesn't see the standings of the second one
+    register(players[2], league, "game 1 4")
+
+    snapshots = StandingSnapshot.objects.order_by("round__label")
+    assert [snapshot.get_rows() for snapshot in snapshots] == [
+        [(players[0].pk, 1, 5.0), (players[2].pk, 2, 4.0), (players[1].pk, 3, 3.0)],
+        [(players[1].pk, 1, 13.0), (players[0].pk, 2, 6.0), (players[2].pk, 3, 4.0)],
+    ]
+
+
+def test_late_result_compares_round_numbers(api_client, league, players):
+    register(players[0], league, "game 999 5")
+    register(players[1], league, "game 1000 3")
+
+    # Round 999 is before round 1000, though its label is greater as a string
+    register(players[2], league, "game 999 4")
+
+    snapshots = {snapshot.round.label: snapshot.get_rows() for snapshot in StandingSnapshot.objects.all()}
+    assert snapshots["1000"] == [(players[0].pk, 1, 5.0), (players[2].pk, 2, 4.0), (players[1].pk, 3, 3.0)]
+    response = api_client.get(reverse("api:leagues-rank-history", args=[league.label]))
+    assert response.json()["rounds"] == ["999", "1000"]
@@ -0,0 +1,102 @@
+import re
+import json
+import random
+
+from io import StringIO
+
+import pytest
+
+from django.db.models import Sum, Count
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from apps.rankie.models import Game, Round, League, Standing, GameResult, RoundResult
+from apps.rankie.synthetic import create_synthetic_leagues
+from apps.rankie.management.commands.loadtest_submissions import Command as LoadTestCommand
+
+
+def test_synthetic_leagues_are_consistent(db):
+    leagues = create_synthetic_leagues(players=6, rounds=4, leagues_per_player=2, rng=random.Random(0))
+
+    assert len(leagues) == 2
+    for league in leagues:
+        standings = list(Standing.objects.filter(league=league).order_by("rank"))
+        assert [standing.rank for standing in standings] == list(range(1, 7))
+        assert [standing.score for standing in standings] == sorted((s.score for s in standings), reverse=True)
+
+        scores = dict(
+            RoundResult.objects.filter(round__league=league)
+            .values("player")
+            .annotate(s=Sum("score"))
+            .values_list("player", "s")
+        )
+        mvp_counts = dict(
+            Round.objects.filter(league=league).values("mvp").annotate(c=Count("pk")).values_list("mvp", "c")
+        )
+        for standing in standings:
+            assert standing.score == scores[standing.player_id]
+            assert standing.mvp_count == mvp_counts.get(standing.player_id, 0)
+        for round_ in Round.objects.filter(league=league):
+            assert round_.result_count == 6
+            assert round_.mvp_score == max(round_.round_results.values_list("score", flat=True))
+
+
+def test_benchmark_registration(db, tmp_path):
+    path = tmp_path / "results.json"
+    call_command(
+        "benchmark_registration",
+        "--in-place",
+        "--players=3",
+        "--rounds=2",
+        "--leagues-per-player=1,2",
+        "--samples=4",
+        "--memory-samples=1",
+        f"--output={path}",
+    )
+
+    results = json.loads(path.read_text())["results"]
+    assert [(result["leagues_per_player"], result["samples"]) for result in results] == [(1, 4), (2, 4)]
+    # The last sample is registered when 3 rounds exist, every league has 3 standings
+    assert [result["rows_locked"]["max"] for result in results] == [3 + 3, 2 * (3 + 3)]
+
+
+def dump_seeded_standings():
+    return list(
+        Standing.objects.order_by("league__label", "rank", "player__username").values_list(
+            "league__label", "player__username", "rank", "score", "mvp_count"
+        )
+    )
+
+
+def test_seed_rankie_is_deterministic(db):
+    call_command("seed_rankie", "--scale=0.2", "--seed=1", "--rounds=5", stdout=StringIO())
+    seeded = dump_seeded_standings()
+
+    assert League.objects.count() == 5
+    assert GameResult.objects.count() == RoundResult.objects.values("raw").distinct().count()
+    with pytest.raises(CommandError):
+        call_command("seed_rankie", "--scale=0.2", stdout=StringIO())
+
+    call_command("flush", interactive=False, verbosity=0)
+    call_command("seed_rankie", "--scale=0.2", "--seed=1", "--rounds=5", stdout=StringIO())
+    assert dump_seeded_standings() == seeded
+
+
+def test_loadtest_schedule_submits_next_rounds_in_turn(db):
+    call_command("seed_rankie", "--scale=0.05", "--seed=1", "--rounds=5", stdout=StringIO())
+    command = LoadTestCommand(stdout=StringIO())
+    rng = random.Random(0)
+    users = command.get_virtual_users(4, rng)
+
+    schedule = command.get_schedule(users, rate=100, duration=1, rng=rng)
+
+    # Seeded results have no timing spread, Poisson arrivals are used
+    assert command.get_interarrivals() is None
+    assert [offset for offset, *_ in schedule] == sorted(offset for offset, *_ in schedule)
+    # Seeded rounds are 100-104, every user submits round 105 before anyone goes on with 106
+    first = [(username, game_label) for _, username, game_label, _ in schedule[: len(users)]]
+    assert sorted(first) == sorted(users)
+    parsers = {game.label: re.compile(game.parser_regex) for game in Game.objects.all()}
+    rounds = [parsers[game_label].search(text).group(Game.RE_ROUND_GROUP) for _, _, game_label, text in schedule]
+    assert set(rounds[: len(users)]) == {"105"}
+    assert set(rounds[len(users) : 2 * len(users)]) <= {"106"}
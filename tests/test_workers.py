@@ -0,0 +1,104 @@
+import random
+import sqlite3
+import multiprocessing
+
+import pytest
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.rankie import workers
+from apps.rankie.core import register_game_result
+from apps.rankie.models import Standing, RoundResult
+from apps.rankie.workers import RegistrationPool, get_tasks
+from apps.rankie.synthetic import create_game_results, create_synthetic_leagues
+
+
+def test_register_game_result_in_given_leagues(db):
+    leagues = create_synthetic_leagues(players=3, rounds=1, leagues_per_player=3, rng=random.Random(0))
+    player_ids = list(Standing.objects.filter(league=leagues[0]).values_list("player_id", flat=True))
+    (game_result, *_) = create_game_results(leagues[0].rule.game, player_ids, ["2"], random.Random(0))
+
+    registrations = register_game_result(game_result, league_ids=[leagues[0].pk, leagues[2].pk])
+
+    assert {registration["league"] for registration in registrations} == {leagues[0].label, leagues[2].label}
+    assert set(RoundResult.objects.filter(raw=game_result).values_list("round__league", flat=True)) == {
+        leagues[0].pk,
+        leagues[2].pk,
+    }
+
+
+def test_tasks_are_partitioned_by_league(db):
+    leagues = create_synthetic_leagues(players=3, rounds=1, leagues_per_player=3, rng=random.Random(0))
+    player_ids = list(Standing.objects.filter(league=leagues[0]).values_list("player_id", flat=True))
+    game_results = create_game_results(leagues[0].rule.game, player_ids, ["2", "3"], random.Random(0))
+    league_ids = sorted(league.pk for league in leagues)
+
+    tasks = get_tasks(game_results, workers=2)
+
+    assert set(tasks) == {0, 1}
+    for worker, worker_tasks in tasks.items():
+        # Every worker gets every result in order, but only for the leagues it owns
+        assert [game_result_id for game_result_id, _ in worker_tasks] == [
+            game_result.pk for game_result in game_results
+        ]
+        for _, task_league_ids in worker_tasks:
+            assert task_league_ids == [league_id for league_id in league_ids if league_id % 2 == worker]
+
+
+@pytest.fixture
+def file_db(transactional_db, tmp_path):
+    """Switch the primary to a file copy of the test database, forked workers can't reach the in-memory one."""
+
+    def switch():
+        path = str(tmp_path / "workers.sqlite3")
+        original.ensure_connection()
+        with sqlite3.connect(path) as target:
+            original.connection.backup(target)
+        connections[DEFAULT_DB_ALIAS] = original.__class__({**original.settings_dict, "NAME": path}, DEFAULT_DB_ALIAS)
+
+    original = connections[DEFAULT_DB_ALIAS]
+    try:
+        yield switch
+    finally:
+        connections[DEFAULT_DB_ALIAS].close()
+        connections[DEFAULT_DB_ALIAS] = original
+
+
+def test_pool_close_drains_queued_tasks(file_db):
+    leagues = create_synthetic_leagues(players=3, rounds=1, leagues_per_player=3, rng=random.Random(0))
+    player_ids = list(Standing.objects.filter(league=leagues[0]).values_list("player_id", flat=True))
+    game_results = create_game_results(leagues[0].rule.game, player_ids, ["2", "3"], random.Random(0))
+    file_db()
+
+    pool = RegistrationPool(workers=2)
+    submitted = pool.submit(game_results)
+    assert pool.close() == (submitted, 0)
+    assert pool.close() == (submitted, 0)
+
+    # Every result is registered in all of the player's leagues
+    assert RoundResult.objects.filter(raw__in=game_results).count() == len(game_results) * len(leagues)
+
+
+def test_pool_close_retries_failed_partitions(file_db, monkeypatch):
+    leagues = create_synthetic_leagues(players=3, rounds=1, leagues_per_player=3, rng=random.Random(0))
+    player_ids = list(Standing.objects.filter(league=leagues[0]).values_list("player_id", flat=True))
+    game_results = create_game_results(leagues[0].rule.game, player_ids, ["2", "3"], random.Random(0))
+    file_db()
+
+    def register_in_worker(game_result, league_ids=None):
+        # One partition of the first result fails in the worker, the other one is registered
+        if (
+            multiprocessing.parent_process() is not None
+            and game_result.pk == game_results[0].pk
+            and 1 in {league_id % 2 for league_id in league_ids}
+        ):
+            raise RuntimeError("Worker failed")
+        return register_game_result(game_result, league_ids=league_ids)
+
+    monkeypatch.setattr(workers, "register_game_result", register_in_worker)
+    pool = RegistrationPool(workers=2)
+    submitted = pool.submit(game_results)
+    assert pool.close() == (submitted, 0)
+
+    assert pool.failed == []
+    assert RoundResult.objects.filter(raw__in=game_results).count() == len(game_results) * len(leagues)
@@ -10,6 +10,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 import os
+import tempfile
 
 from pathlib import Path
 from distutils.util import strtobool
@@ -59,11 +60,14 @@ INSTALLED_APPS = [
     "social_django",
     "apps.rankie.apps.RankieConfig",
     "rest_framework",
+    "django_filters",
     "django_tables2",
     "bootstrap4",
 ]
 
 MIDDLEWARE = [
+    "apps.rankie.middleware.MetricsMiddleware",
+    "apps.rankie.middleware.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # Simplified static file serving
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -107,6 +111,16 @@ DATABASES = {
         "PORT": os.environ.get("DB_PORT"),
     }
 }
+# Optional read replica of the default database serving read-only requests, tests read the default one instead
+if os.environ.get("DB_REPLICA_NAME"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.environ.get("DB_REPLICA_NAME"),
+        "HOST": os.environ.get("DB_REPLICA_HOST", DATABASES["default"]["HOST"]),
+        "PORT": os.environ.get("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["apps.rankie.routers.ReplicaRouter"]
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -172,6 +186,51 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Caches
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Database cache shares throttling buckets between processes, requires `manage.py createcachetable`
+    "throttle": {
+        "BACKEND": {
+            "locmem": "django.core.cache.backends.locmem.LocMemCache",
+            "db": "django.core.cache.backends.db.DatabaseCache",
+        }[os.environ.get("RANKIE_THROTTLE_BACKEND", "locmem")],
+        "LOCATION": "rankie_throttle",
+    },
+}
+
+# Token bucket rates of game results submissions: burst capacity per period (s, min, hour, day)
+RANKIE_THROTTLE_CACHE = "throttle"
+RANKIE_THROTTLE_RATES = {
+    "player": os.environ.get("RANKIE_THROTTLE_PLAYER_RATE", "30/min"),
+    "origin": os.environ.get("RANKIE_THROTTLE_ORIGIN_RATE", "600/min"),
+}
+
+# Responses of submitted game results are replayed for retried requests with the same Idempotency-Key header.
+# Keys are kept for a day, but no more than a given number of the most recent ones.
+RANKIE_IDEMPOTENCY_KEY_TTL = int(os.environ.get("RANKIE_IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+RANKIE_IDEMPOTENCY_KEY_LIMIT = int(os.environ.get("RANKIE_IDEMPOTENCY_KEY_LIMIT", 10000))
+
+# Metrics of every worker process are dumped into the directory and summed up by `/metrics`, empty keeps them in memory.
+# Files of workers that haven't flushed for the max age (seconds) are removed.
+RANKIE_METRICS_DIR = os.environ.get("RANKIE_METRICS_DIR", os.path.join(tempfile.gettempdir(), "rankie_metrics")) or None
+RANKIE_METRICS_FLUSH_INTERVAL = float(os.environ.get("RANKIE_METRICS_FLUSH_INTERVAL", 5))
+RANKIE_METRICS_MAX_AGE = float(os.environ.get("RANKIE_METRICS_MAX_AGE", 24 * 60 * 60))
+# Bearer token required to read metrics, open if not set
+RANKIE_METRICS_TOKEN = os.environ.get("RANKIE_METRICS_TOKEN")
+
+# Queries running longer than the threshold (ms) are logged with their EXPLAIN plan to `slow_queries.log`, empty or 0
+# turns it off. Only a share of them is captured, EXPLAIN takes another round trip to the database.
+RANKIE_SLOW_QUERY_MS = float(os.environ.get("RANKIE_SLOW_QUERY_MS", 500) or 0) or None
+RANKIE_SLOW_QUERY_SAMPLE_RATE = float(os.environ.get("RANKIE_SLOW_QUERY_SAMPLE_RATE", 0.1))
+
+# Clients are pinned to the primary database for a while after a write, long enough for the replica to catch up
+RANKIE_REPLICA_PIN_SECONDS = int(os.environ.get("RANKIE_REPLICA_PIN_SECONDS", 5))
+
 DJANGO_TABLES2_TEMPLATE = "django_tables2/bootstrap4.html"
 
 LOGGING = {
@@ -201,6 +260,14 @@ LOGGING = {
             "filters": ["require_debug_false"],
             "formatter": "verbose",
         },
+        "slow_queries": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": RUN_DIR / "slow_queries.log",
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "delay": True,
+            "formatter": "verbose",
+        },
     },
     "root": {
         "handlers": ["console", "file"],
@@ -216,5 +283,14 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        # Phase timing of results registration, set to WARNING to turn it off
+        "apps.rankie.timing": {
+            "level": os.getenv("RANKIE_TIMING_LOG_LEVEL", "INFO"),
+        },
+        "apps.rankie.slow_queries": {
+            "handlers": ["slow_queries"],
+            "level": "WARNING",
+            "propagate": False,
+        },
     },
 }